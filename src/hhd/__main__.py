@@ -1,6 +1,7 @@
 import argparse
 import fcntl
 import logging
+import math
 import os
 import signal
 import subprocess
@@ -31,12 +32,13 @@ from .plugins.settings import (
     get_settings_hash,
     load_blacklist_yaml,
     load_profile_yaml,
+    ConfigWriter,
+    get_file_key,
+    get_file_keys,
     load_state_yaml,
     merge_settings,
     parse_defaults,
     save_blacklist_yaml,
-    save_profile_yaml,
-    save_state_yaml,
     validate_config,
 )
 from .utils import (
@@ -66,6 +68,7 @@ SLEEP_MIN_T = 8
 class EmitHolder(Emitter):
     def __init__(self, condition: Condition, ctx, info) -> None:
         self._events = []
+        self._woken = False
         self._condition = condition
         super().__init__(ctx=ctx, info=info)
 
@@ -87,7 +90,24 @@ class EmitHolder(Emitter):
 
     def has_events(self):
         with self._condition:
-            return bool(self._events)
+            return bool(self._events) or self._woken
+
+    def wake(self):
+        """Wakes up the main loop to update all plugins, without an event."""
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def woken(self):
+        with self._condition:
+            woken = self._woken
+            self._woken = False
+            return woken
+
+    def set_capabilities(self, cid, cap):
+        super().set_capabilities(cid, cap)
+        # Plugins (e.g., RGB) read the capabilities when updating
+        self.wake()
 
 
 def notifier(ev: TEvent, cond: Condition):
@@ -158,6 +178,7 @@ def main():
 
     # HTTP data
     https = None
+    writer = None
     prev_http_cfg = None
     updated = False
     last_event = None
@@ -296,22 +317,50 @@ def main():
 
         # Monitor config files for changes
         should_initialize = TEvent()
+        files_changed = TEvent()
+        # Keys of the config files after the last check, see `get_file_keys()`
+        cfg_dirs = []
+        cfg_keys = {}
         initial_run = True
         reset = False
         should_exit = TEvent()
-        signal.signal(signal.SIGPOLL, notifier(should_initialize, cond))
+        # Writes the state and profiles in the background
+        writer = ConfigWriter(lambda fn: fix_perms(fn, ctx))
+        signal.signal(signal.SIGPOLL, notifier(files_changed, cond))
         signal.signal(signal.SIGINT, notifier(should_exit, cond))
         signal.signal(signal.SIGTERM, notifier(should_exit, cond))
 
         # Get wakeup count for sleep detection
         wakeup_count = get_wakeup_count()
 
+        # Plugins only update when there are events, the configuration
+        # changed, or their timer is due (see `HHDPlugin.next_wake()`)
+        wake_at = [0.0] * len(sorted_plugins)
+        # Plugins may change the configuration while updating, in which case
+        # all plugins are updated after POLL_DELAY to pick up the changes
+        update_all_at = 0.0
+
         while not should_exit.is_set():
             #
             # Configuration
             #
 
+            # Our own writes also trigger the directory notifications, so
+            # only reload if a file changed and it was not written by us
+            if files_changed.is_set():
+                files_changed.clear()
+                writer.wait()
+                keys = get_file_keys(cfg_dirs)
+                for fn in set(keys) | set(cfg_keys):
+                    key = keys.get(fn, None)
+                    if key != cfg_keys.get(fn, None) and not writer.wrote(fn, key):
+                        logger.info(f"File '{fn}' changed.")
+                        should_initialize.set()
+                        break
+                cfg_keys = keys
+
             # Initialize if files changed
+            update_all = should_initialize.is_set() or initial_run
             if should_initialize.is_set() or initial_run:
                 # wait a bit to allow other processes to save files
                 if not initial_run:
@@ -339,6 +388,13 @@ def main():
                     settings["hhd"] = tmp
                 shash = get_settings_hash(settings)
 
+                # Write the pending changes before reloading the files, unless
+                # the settings are reset
+                if reset:
+                    writer.cancel()
+                else:
+                    writer.flush()
+
                 # State
                 if reset:
                     logger.warning(f"Resetting settings.")
@@ -350,6 +406,8 @@ def main():
                     if not new_conf:
                         if conf.conf:
                             logger.warning(f"Using previous configuration.")
+                            # Settings changed, so revalidate all of it
+                            conf.mark_dirty()
                         else:
                             logger.info(f"Using default configuration.")
                             conf = get_default_state(settings)
@@ -446,6 +504,9 @@ def main():
                             os.close(fd)
                         continue
                     cfg_fds.append(fd)
+                cfg_dirs = [expanduser(fn, ctx) for fn in cfg_fns]
+                files_changed.clear()
+                cfg_keys = get_file_keys(cfg_dirs)
 
                 should_initialize.clear()
                 logger.info(f"Initialization Complete!")
@@ -505,6 +566,7 @@ def main():
             set_log_plugin("main")
             settings_changed = False
             events = emit.get_events()
+            woken = emit.woken()
 
             new_wakeup_count = get_wakeup_count()
             curr = time.time()
@@ -539,6 +601,7 @@ def main():
                     logger.info(f"AC status is: {new_status}")
                     ac_status = new_status
                     info["ac"] = ac_status
+                    update_all = True
 
             for ev in events:
                 match ev["type"]:
@@ -559,11 +622,12 @@ def main():
                             with lock:
                                 if ev["name"] in profiles:
                                     del profiles[ev["name"]]
+                            writer.cancel(join(profile_dir, ev["name"] + ".yml"))
                     case "apply":
                         if ev["name"] in profiles:
-                            conf.update(profiles[ev["name"]].conf)
+                            conf.update(profiles[ev["name"]].data)
                     case "state":
-                        conf.update(ev["config"].conf)
+                        conf.update(ev["config"].data)
                     case "special":
                         if ev["event"] == "restart_dev":
                             should_exit.set()
@@ -611,8 +675,19 @@ def main():
                 conf = Config([parse_defaults(settings), conf.conf])
                 conf.updated = True
 
+            now = time.monotonic()
+            update_all = (
+                update_all
+                or woken
+                or bool(events)
+                or settings_changed
+                or conf.updated
+                or now >= update_all_at
+            )
+
             # Validate config
-            validate_config(conf, settings, validator)
+            if update_all:
+                validate_config(conf, settings, validator)
 
             #
             # Plugin event loop
@@ -625,55 +700,65 @@ def main():
                     p.notify(events)
                     update_log_plugins()
 
+            # Plugins with a due timer or all of them
+            due = [i for i, t in enumerate(wake_at) if update_all or t <= now]
+            version = conf.version
+
             # Run prepare loop
-            for p in reversed(sorted_plugins):
+            for i in reversed(due):
+                p = sorted_plugins[i]
                 set_log_plugin(getattr(p, "log") if hasattr(p, "log") else "ukwn")
                 p.prepare(conf)
                 update_log_plugins()
 
             # Run update loop
-            for p in sorted_plugins:
+            for i in due:
+                p = sorted_plugins[i]
                 set_log_plugin(getattr(p, "log") if hasattr(p, "log") else "ukwn")
                 p.update(conf)
+                t = p.next_wake()
+                wake_at[i] = t if t is not None else math.inf
                 update_log_plugins()
             set_log_plugin("ukwn")
 
+            if conf.version != version:
+                update_all_at = now + POLL_DELAY
+            elif update_all:
+                update_all_at = math.inf
+
             # Notify that events were applied
-            # Before saving to reduce delay (yaml files take 100ms :( )
-            if https:
+            if https and due:
                 https.update(settings, conf, info, profiles, emit, locales, ctx)
 
             #
             # Save loop
             #
 
-            has_new = should_initialize.is_set()
-            saved = False
             # Save existing profiles if open
-            if save_state_yaml(state_fn, settings, conf, shash):
-                fix_perms(state_fn, ctx)
-                saved = True
+            if writer.save_state(state_fn, settings, conf, shash):
                 conf.updated = False
             for name, prof in profiles.items():
                 fn = join(profile_dir, name + ".yml")
-                if save_profile_yaml(fn, settings, prof, shash):
-                    fix_perms(fn, ctx)
-                    saved = True
+                if writer.save_profile(fn, settings, prof, shash):
                     prof.updated = False
-            for prof in os.listdir(profile_dir):
-                if prof.startswith("_") or not prof.endswith(".yml"):
-                    continue
-                name = prof[:-4]
-                if name not in profiles:
-                    fn = join(profile_dir, prof)
-                    try:
-                        new_fn = fn + ".bak"
-                        os.rename(fn, new_fn)
-                        saved = True
-                    except Exception as e:
-                        logger.error(
-                            f"Failed removing profile {name} at:\n{fn}\nWith error:\n{e}"
-                        )
+            # Profiles are only removed by events
+            if update_all:
+                for prof in os.listdir(profile_dir):
+                    if prof.startswith("_") or not prof.endswith(".yml"):
+                        continue
+                    name = prof[:-4]
+                    if name not in profiles:
+                        fn = join(profile_dir, prof)
+                        try:
+                            new_fn = fn + ".bak"
+                            os.rename(fn, new_fn)
+                            # Not a change to reload for
+                            cfg_keys.pop(fn, None)
+                            cfg_keys[new_fn] = get_file_key(new_fn)
+                        except Exception as e:
+                            logger.error(
+                                f"Failed removing profile {name} at:\n{fn}\nWith error:\n{e}"
+                            )
 
             # Causes unnecessary writes, is not used anyway.
             # # Add template config
@@ -686,10 +771,6 @@ def main():
             #     fix_perms(join(profile_dir, "_template.yml"), ctx)
             #     saved = True
 
-            if not has_new and saved:
-                # We triggered the interrupt, clear
-                should_initialize.clear()
-
             upd_stable = conf.get("hhd.settings.update_stable", False)
             upd_beta = conf.get("hhd.settings.update_beta", False)
 
@@ -698,6 +779,8 @@ def main():
                 conf["hhd.settings.update_stable"] = False
                 conf["hhd.settings.update_beta"] = False
 
+                # Finish writing before dropping privileges
+                writer.flush()
                 switch_priviledge(ctx, False)
                 try:
                     logger.info(f"Updating Handheld Daemon.")
@@ -786,9 +869,13 @@ def main():
                     not should_exit.is_set()
                     and not settings_changed
                     and not should_initialize.is_set()
+                    and not files_changed.is_set()
                     and not emit.has_events()
                 ):
-                    cond.wait(timeout=POLL_DELAY)
+                    # Wake up at least every POLL_DELAY to detect sleep
+                    # and AC changes
+                    timeout = min(*wake_at, update_all_at) - time.monotonic()
+                    cond.wait(timeout=min(max(timeout, 0), POLL_DELAY))
 
             # Check reset
             if conf["hhd.settings.reset"].to(bool):
@@ -799,6 +886,10 @@ def main():
         set_log_plugin("main")
         logger.info(f"Received interrupt or updated. Stopping plugins and exiting.")
     finally:
+        if writer:
+            set_log_plugin("main")
+            logger.info("Saving state and profiles.")
+            writer.close()
         for fd in cfg_fds:
             try:
                 os.close(fd)
@@ -0,0 +1,391 @@
+import logging
+import os
+import re
+import time
+import tracemalloc
+from typing import Any, Callable, NamedTuple, Sequence
+
+from hhd.controller import Consumer, Event, Multiplexer, Producer, Reactor
+from hhd.controller.lib.stats import Histogram
+from hhd.controller.lib.trace import ReplayPolicy, ReplayProducer, TracePlayer
+from hhd.controller.lib.uhid import UhidDevice
+from hhd.controller.physical.evdev import B as EC
+from hhd.controller.physical.evdev import GenericGamepadEvdev
+from hhd.controller.physical.imu import CombinedImu
+from hhd.controller.virtual.dualsense import Dualsense
+
+logger = logging.getLogger(__name__)
+
+
+class BenchConfig(NamedTuple):
+    producers: list[Producer]
+    multiplexer: dict[str, Any]
+    freq_max: float
+
+
+def _xinput(vid: int = 0x045E, pid: int = 0x028E, **kwargs):
+    return GenericGamepadEvdev(
+        vid=[vid],
+        pid=[pid],
+        capabilities={EC("EV_KEY"): [EC("BTN_A")]},
+        **kwargs,
+    )
+
+
+def generic_config():
+    return BenchConfig(
+        [_xinput(), CombinedImu(400)],
+        {"trigger": "analog_to_discrete", "dpad": "analog_to_discrete"},
+        400,
+    )
+
+
+def ally_config():
+    from hhd.device.rog_ally.base import (
+        ALLY_MAPPINGS,
+        ALLY_PID,
+        ALLY_X_PID,
+        ASUS_VID,
+        LIMIT_DEFAULTS,
+        AllyHidraw,
+    )
+
+    return BenchConfig(
+        [
+            _xinput(postprocess={}),
+            CombinedImu(400, ALLY_MAPPINGS, gyro_scale="0.000266"),
+            GenericGamepadEvdev(
+                vid=[ASUS_VID],
+                pid=[ALLY_PID, ALLY_X_PID],
+                capabilities={EC("EV_KEY"): [EC("KEY_F23")]},
+                btn_map={EC("KEY_F17"): "extra_l1", EC("KEY_F18"): "extra_r1"},
+            ),
+            AllyHidraw(
+                vid=[ASUS_VID],
+                pid=[ALLY_PID, ALLY_X_PID],
+                usage_page=[0xFF31],
+                usage=[0x0080],
+                rgb_boot=False,
+                rgb_charging=False,
+                kconf=LIMIT_DEFAULTS(False),
+            ),
+        ],
+        {
+            "trigger": "analog_to_discrete",
+            "dpad": "analog_to_discrete",
+            "share_to_qam": True,
+            "qam_no_release": True,
+        },
+        400,
+    )
+
+
+def legion_go_config():
+    from hhd.device.legion_go.tablet.const import (
+        LGO_RAW_INTERFACE_AXIS_MAP,
+        LGO_RAW_INTERFACE_BTN_MAP,
+        LGO_RAW_INTERFACE_CONFIG_MAP,
+        LGO_TOUCHPAD_AXIS_MAP,
+        LGO_TOUCHPAD_BUTTON_MAP,
+    )
+    from hhd.device.legion_go.tablet.base import LEN_PIDS, LEN_VID
+    from hhd.device.legion_go.tablet.hid import LegionHidraw
+
+    return BenchConfig(
+        [
+            _xinput(0x17EF, 0x6182),
+            GenericGamepadEvdev(
+                vid=[0x17EF],
+                pid=[0x6182],
+                name=[re.compile(".+Touchpad")],
+                capabilities={EC("EV_KEY"): [EC("BTN_MOUSE")]},
+                btn_map=LGO_TOUCHPAD_BUTTON_MAP,
+                axis_map=LGO_TOUCHPAD_AXIS_MAP,
+                aspect_ratio=1,
+            ),
+            LegionHidraw(
+                vid=[LEN_VID],
+                pid=list(LEN_PIDS),
+                usage_page=[0xFFA0],
+                usage=[0x0001],
+                report_size=64,
+                axis_map=LGO_RAW_INTERFACE_AXIS_MAP,
+                btn_map=LGO_RAW_INTERFACE_BTN_MAP,
+                config_map=LGO_RAW_INTERFACE_CONFIG_MAP,
+            ).with_settings(gyro="right", reset=False),
+            GenericGamepadEvdev(
+                vid=[LEN_VID],
+                pid=list(LEN_PIDS),
+                name=[re.compile(".+Keyboard")],
+            ),
+        ],
+        {
+            "trigger": "analog_to_discrete",
+            "dpad": "both",
+            "led": "main_to_sides",
+            "status": "both_to_main",
+            "share_to_qam": True,
+            "imu": "right_to_main",
+        },
+        500,
+    )
+
+
+def oxp_config():
+    from hhd.device.oxp.base import (
+        KBD_PID,
+        KBD_VID,
+        X1_MINI_PAGE,
+        X1_MINI_PID,
+        X1_MINI_USAGE,
+        X1_MINI_VID,
+        XFLY_PAGE,
+        XFLY_PID,
+        XFLY_USAGE,
+        XFLY_VID,
+    )
+    from hhd.device.oxp.const import BTN_MAPPINGS_NONTURBO
+    from hhd.device.oxp.hid_v1 import OxpHidraw
+    from hhd.device.oxp.hid_v2 import OxpHidrawV2
+
+    return BenchConfig(
+        [
+            _xinput(),
+            CombinedImu(400),
+            GenericGamepadEvdev(
+                vid=[KBD_VID], pid=[KBD_PID], btn_map=BTN_MAPPINGS_NONTURBO
+            ),
+            OxpHidraw(
+                vid=[X1_MINI_VID],
+                pid=[X1_MINI_PID],
+                usage_page=[X1_MINI_PAGE],
+                usage=[X1_MINI_USAGE],
+                turbo=False,
+            ),
+            OxpHidrawV2(
+                vid=[XFLY_VID],
+                pid=[XFLY_PID],
+                usage_page=[XFLY_PAGE],
+                usage=[XFLY_USAGE],
+                turbo=False,
+            ),
+        ],
+        {
+            "trigger": "analog_to_discrete",
+            "dpad": "analog_to_discrete",
+            "share_to_qam": True,
+            "qam_no_release": True,
+        },
+        400,
+    )
+
+
+def gpd_config():
+    from hhd.device.gpd.win.base import (
+        TOUCHPAD_PID,
+        TOUCHPAD_PID_2,
+        TOUCHPAD_VID,
+        TOUCHPAD_VID_2,
+    )
+    from hhd.device.gpd.win.const import (
+        GPD_TOUCHPAD_AXIS_MAP,
+        GPD_TOUCHPAD_BUTTON_MAP,
+    )
+
+    return BenchConfig(
+        [
+            _xinput(),
+            CombinedImu(400),
+            GenericGamepadEvdev(
+                vid=[TOUCHPAD_VID, TOUCHPAD_VID_2],
+                pid=[TOUCHPAD_PID, TOUCHPAD_PID_2],
+                name=[re.compile(".+Touchpad")],
+                capabilities={EC("EV_KEY"): [EC("BTN_MOUSE")]},
+                btn_map=GPD_TOUCHPAD_BUTTON_MAP,
+                axis_map=GPD_TOUCHPAD_AXIS_MAP,
+                aspect_ratio=1.333,
+            ),
+        ],
+        {
+            "trigger": "analog_to_discrete",
+            "dpad": "analog_to_discrete",
+            "qam_hold": "hhd",
+        },
+        400,
+    )
+
+
+CONFIGS: dict[str, Callable[[], BenchConfig]] = {
+    "generic": generic_config,
+    "ally": ally_config,
+    "legion_go": legion_go_config,
+    "oxp": oxp_config,
+    "gpd": gpd_config,
+}
+
+
+class NullUhidDevice(UhidDevice):
+    """Writes the reports of the virtual controller to `/dev/null`, so that
+    the cost of the write syscall is still measured."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.reports = 0
+
+    def send_event(self, event: bytes):
+        if not self.fd:
+            self.fd = os.open("/dev/null", os.O_WRONLY)
+        os.write(self.fd, event)
+
+    def send_input_report(self, data: bytes):
+        self.reports += 1
+        super().send_input_report(data)
+
+    def read_event(self):
+        return None
+
+
+class NullDualsense(Dualsense):
+    def create_device(self, name: bytes) -> UhidDevice:
+        return NullUhidDevice(
+            vid=0, pid=0, name=name, report_descriptor=b"", unique_name=b"bench"
+        )
+
+
+class NullSink(Consumer):
+    def __init__(self) -> None:
+        self.events = 0
+
+    def consume(self, events: Sequence[Event]):
+        self.events += len(events)
+
+
+def run(
+    fn: str,
+    config: str,
+    realtime: bool = False,
+    sink: str = "dualsense",
+    allocs: bool = False,
+) -> dict[str, Any]:
+    """Replays trace `fn` through the producers of `config`, the multiplexer
+    and `sink`, and returns the throughput, the latency of each report
+    and, with `allocs`, the memory allocated while producing each report."""
+    conf = CONFIGS[config]()
+    player = TracePlayer(fn)
+    reactor = Reactor(ReplayPolicy(player, conf.freq_max, realtime))
+    recorded = {s.cls for s in player.streams}
+
+    devs = []
+    out = NullDualsense() if sink == "dualsense" else NullSink()
+    try:
+        for p in conf.producers:
+            if type(p).__name__ not in recorded:
+                continue
+            d = ReplayProducer(player, p)
+            reactor.prepare(d)
+            devs.append(d)
+        for s in player.unbound():
+            logger.warning(
+                f"Stream {s.id} ({s.kind} '{s.cls}', "
+                + f"'{s.info.get('name', s.info.get('path', ''))}') was not replayed, "
+                + "no producer of the config matches it."
+            )
+        multiplexer = Multiplexer(**conf.multiplexer)
+        if isinstance(out, Dualsense):
+            out.open()
+
+        latency = Histogram()
+        iterations = 0
+        events = 0
+        alloc = 0
+        if allocs:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        while not player.done:
+            ready = reactor.poll()
+            t = time.perf_counter_ns()
+            if allocs:
+                tracemalloc.reset_peak()
+                mem = tracemalloc.get_traced_memory()[0]
+
+            evs = reactor.produce(ready)
+            events += len(evs)
+            evs = multiplexer.process(evs)
+            out.consume(evs)
+            for d in devs:
+                d.consume(evs)
+
+            if allocs:
+                alloc += tracemalloc.get_traced_memory()[1] - mem
+            latency.record(time.perf_counter_ns() - t)
+            iterations += 1
+        elapsed = time.perf_counter() - start
+        reports = getattr(out.dev, "reports", 0) if isinstance(out, Dualsense) else 0
+    finally:
+        if allocs:
+            tracemalloc.stop()
+        for d in reversed(devs):
+            d.close(True)
+        if isinstance(out, Dualsense):
+            out.close(True)
+        reactor.close()
+        player.close()
+
+    res = {
+        "config": config,
+        "producers": [type(d.producer).__name__ for d in devs],
+        "records": len(player.records),
+        "iterations": iterations,
+        "events": events,
+        "elapsed": round(elapsed, 3),
+        "events_per_s": round(events / elapsed, 1) if elapsed else 0,
+        "reports_per_s": round(iterations / elapsed, 1) if elapsed else 0,
+        "latency": latency.snapshot(),
+    }
+    if isinstance(out, Dualsense):
+        res["reports"] = reports
+    if allocs:
+        res["alloc_bytes_per_report"] = round(alloc / max(iterations, 1), 1)
+    return res
+
+
+def bench(args: list[str]):
+    """Usage: `bench <config> <trace> [realtime] [allocs] [null]`."""
+    if len(args) < 2 or args[0] not in CONFIGS:
+        print(f"Usage: bench <{'|'.join(CONFIGS)}> <trace> [realtime] [allocs] [null]")
+        return
+
+    res = run(
+        args[1],
+        args[0],
+        realtime="realtime" in args,
+        sink="null" if "null" in args else "dualsense",
+        allocs="allocs" in args,
+    )
+    lat = res.pop("latency")
+    for k, v in res.items():
+        print(f"{k + ':':<24s}{v}")
+    print(
+        f"{'latency (us):':<24s}"
+        + ", ".join(f"{k[:-3]} {v}" for k, v in lat.items() if k.endswith("_us"))
+    )
+
+
+def trace_info(args: list[str]):
+    """Prints the streams of a trace."""
+    from hhd.controller.lib.trace import read_trace
+
+    if not args:
+        print("Usage: trace <trace>")
+        return
+    streams, records = read_trace(args[0])
+    duration = records[-1][0] / 1e9 if records else 0
+    print(f"Trace '{args[0]}': {len(records)} reads over {duration:.1f}s")
+    for s in streams:
+        data = [r for r in records if r[1] == s.id]
+        size = sum(len(r[2]) for r in data)
+        print(
+            f" - {s.id}: {s.kind} '{s.cls}' ({s.info.get('name', s.info.get('path', ''))}), "
+            + f"{len(data)} reads, {size} bytes"
+        )
@@ -10,7 +10,7 @@ def main():
         "command",
         nargs="+",
         default=[],
-        help="Supported commands: `evdev`, `hidraw`, `gamescope`",
+        help="Supported commands: `evdev`, `hidraw`, `gamescope`, `stats`, `bench`, `trace`",
     )
     args = parser.parse_args()
 
@@ -32,6 +32,18 @@ def main():
                 from .gs import gamescope_debug
 
                 gamescope_debug(cmds[1:])
+            case "stats":
+                from .stats import stats
+
+                stats(cmds[1:])
+            case "bench":
+                from .bench import bench
+
+                bench(cmds[1:])
+            case "trace":
+                from .bench import trace_info
+
+                trace_info(cmds[1:])
             case _:
                 print(f"Command `{cmds[0]}` not supported.")
     except KeyboardInterrupt:
@@ -0,0 +1,65 @@
+import json
+import time
+
+from hhd.http.ctl import SOCKET_UNIX, UnixConnection
+
+STAGE_COLUMNS = ("count", "mean_us", "p50_us", "p90_us", "p99_us", "p99.9_us")
+
+
+def _get_stats(reset: bool = False):
+    con = UnixConnection(SOCKET_UNIX)
+    con.request("GET", f"/api/v1/stats{'?reset' if reset else ''}")
+    res = con.getresponse()
+    if res.status != 200:
+        raise RuntimeError(f"Failed to get stats with status: {res.status}")
+    return json.loads(res.read())
+
+
+def _print_stats(data):
+    if not data["enabled"]:
+        print("Stats are disabled. Start hhd with `HHD_STATS=1` to enable them.")
+        return
+    if not data["pipelines"]:
+        print("No controller loops are running.")
+        return
+
+    for name, p in data["pipelines"].items():
+        print(
+            f"Controller loop '{name}' ({p['elapsed']:.1f}s): "
+            + f"{p['wakeups_per_s']:.1f} wakeups/s, {p['timeouts']} timeouts, "
+            + f"{p['coalesced']} coalesced events, {p['overruns']} overruns"
+        )
+        print(
+            f"  {'stage (us)':<24s}"
+            + "".join(f"{c.replace('_us', ''):>10s}" for c in (*STAGE_COLUMNS, "max"))
+        )
+        for stage, h in p["stages"].items():
+            print(
+                f"  {stage:<24s}"
+                + "".join(f"{h[c]:>10}" for c in (*STAGE_COLUMNS, "max_us"))
+            )
+        print(
+            f"  {'producer':<24s}{'events/s':>10s}{'calls':>10s}"
+            + f"{'p50':>10s}{'p99':>10s}{'max':>10s}"
+        )
+        for prod, v in p["producers"].items():
+            h = v["latency"]
+            print(
+                f"  {prod:<24s}{v['events_per_s']:>10}{v['calls']:>10}"
+                + f"{h['p50_us']:>10}{h['p99_us']:>10}{h['max_us']:>10}"
+            )
+        print()
+
+
+def stats(args: list[str]):
+    """Prints the controller loop stats. If an interval is provided, the stats
+    are reset and printed every `interval` seconds."""
+    if not args:
+        _print_stats(_get_stats())
+        return
+
+    interval = float(args[0])
+    _get_stats(reset=True)
+    while True:
+        time.sleep(interval)
+        _print_stats(_get_stats(reset=True))
@@ -13,6 +13,9 @@ from .base import (
     DEBUG_MODE,
     RgbMode,
     RgbCapabilities,
+    DeadlinePolicy,
+    Reactor,
+    ReportPolicy,
 )
 from .const import Axis, Button, Configuration
 
@@ -34,4 +37,7 @@ __all__ = [
     "DEBUG_MODE",
     "RgbMode",
     "RgbCapabilities",
+    "DeadlinePolicy",
+    "Reactor",
+    "ReportPolicy",
 ]
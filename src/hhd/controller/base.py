@@ -1,3 +1,5 @@
+import heapq
+import itertools
 import logging
 import os
 import random
@@ -13,6 +15,14 @@ except ImportError:
     from typing import Optional as NotRequired
 
 from .const import Axis, Button, Configuration
+from .lib.bus import EventBus
+from .lib.stats import (
+    STATS_ENABLED,
+    count_coalesced,
+    current_pipeline,
+    register_pipeline,
+    unregister_pipeline,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -193,7 +203,7 @@ class ControllerEmitter:
         self._simple_qam = False
         self._cap = None
         self.cid = ""
-        self._evs = []
+        self._bus = EventBus()
 
     def send_qam(self, expanded: bool = False):
         with self.intercept_lock:
@@ -259,36 +269,27 @@ class ControllerEmitter:
             if not self.cid or (self._cap and not self._cap.get("supports_qam", True)):
                 # Avoid writing events if no controller is connected
                 return False
-            for e in ev:
-                self._evs.append((e, 0))
+        self._bus.put(ev)
         return True
 
     def inject_timed(self, evs: Sequence[tuple[Event, float]]):
         # Unfortunately here we have to clear the previous events to avoid conflicts
         # TODO: Clean this up. It is only used by the RGB module.
-        with self.intercept_lock:
-            self._evs = list(evs)
+        self._bus.put_timed(evs)
 
     def inject_recv(self):
-        with self.intercept_lock:
-            if not self.cid:
-                # Avoid writing events if no controller is connected
-                return []
-
-            if not self._evs:
-                return []
-
-            curr = time.time()
-            removed = []
-            tmp = []
-            for i, (ev, t) in enumerate(self._evs):
-                if curr >= t:
-                    tmp.append(ev)
-                    removed.insert(0, i)  # prepend to remove in opposite order
-
-            for i in removed:
-                self._evs.pop(i)
-            return tmp
+        # Runs every iteration of the controller loop, so it does not take
+        # the lock. Events are drained either way to clear the bus fds.
+        evs = self._bus.get()
+        if not self.cid:
+            # Avoid writing events if no controller is connected
+            return []
+        return evs
+
+    def fds(self) -> Sequence[int]:
+        """Fds that become ready when there are injected events, so that the
+        controller loop wakes up for them."""
+        return self._bus.fds()
 
     def set_capabilities(self, cid, cap: ControllerCapabilities | None):
         with self.intercept_lock:
@@ -519,6 +520,56 @@ class Consumer:
 TouchpadAction = Literal["disabled", "left_click", "right_click"]
 
 
+IMU_CODES = ("accel_x", "accel_y", "accel_z", "gyro_x", "gyro_y", "gyro_z", "imu_ts")
+IMU_MAPS: dict[str, dict[str, str]] = {
+    "left_to_main": {f"left_{c}": c for c in IMU_CODES},
+    "right_to_main": {f"right_{c}": c for c in IMU_CODES},
+    # Only the left side receives the events
+    "main_to_sides": {c: f"left_{c}" for c in IMU_CODES},
+}
+SWAP_GUIDE_MAPS: dict[str, dict[str, str]] = {
+    "guide_is_start": {
+        "start": "mode",
+        "select": "share",
+        "mode": "start",
+        "share": "select",
+    },
+    "guide_is_select": {
+        "start": "mode",
+        "select": "share",
+        "mode": "select",
+        "share": "start",
+    },
+    "select_is_guide": {
+        "start": "share",
+        "select": "mode",
+        "mode": "select",
+        "share": "start",
+    },
+    "start_is_keyboard": {
+        "start": "keyboard",
+        "select": "mode",
+        "mode": "select",
+        "keyboard": "start",
+    },
+}
+DPAD_TO_HAT = {
+    "dpad_up": ("hat_y", -1),
+    "dpad_down": ("hat_y", 1),
+    "dpad_right": ("hat_x", 1),
+    "dpad_left": ("hat_x", -1),
+}
+NINTENDO_MAP = {"a": "b", "b": "a", "x": "y", "y": "x"}
+STATUS_EVENTS = {
+    "battery_left": "battery",
+    "battery_right": "battery",
+    "is_attached_left": "is_attached",
+    "is_attached_right": "is_attached",
+    "is_connected_left": "is_connected",
+    "is_connected_right": "is_connected",
+}
+
+
 class Multiplexer:
     QAM_HOLD_TIME = 0.4
     QAM_MULTI_PRESS_DELAY = 0.2
@@ -610,7 +661,9 @@ class Multiplexer:
         self.touchpad_x = 0
         self.touchpad_y = 0
         self.touchpad_down = None
-        self.queue: list[tuple[Event | Literal["reboot"], float]] = []
+        # Heap of (time, seq, event), seq keeps the order of same time events
+        self.queue: list[tuple[float, int, Event | Literal["reboot"]]] = []
+        self.queue_seq = itertools.count()
         self.reboot_pressed = None
         self.select_is_held = False
         self.reboot_is_held = False
@@ -640,6 +693,50 @@ class Multiplexer:
         self.unique = str(time.perf_counter_ns())
         assert touchpad is None, "touchpad rewiring not supported yet"
 
+        # Dispatch tables for this configuration. Events with codes outside
+        # of them pass through process() untouched.
+        self.imu_map = IMU_MAPS.get(imu, {}) if imu else {}
+        self.swap_map = {}
+        if swap_guide:
+            self.swap_map = SWAP_GUIDE_MAPS.get(
+                swap_guide, SWAP_GUIDE_MAPS["guide_is_select"]
+            )
+
+        axis_codes = {*self.imu_map, "touchpad_x", "touchpad_y"}
+        if trigger == "analog_to_discrete":
+            axis_codes.update(("lt", "rt"))
+        if dpad == "analog_to_discrete" or dpad == "both":
+            axis_codes.update(("hat_x", "hat_y"))
+        self.axis_codes = frozenset(axis_codes)
+
+        button_codes = {
+            *self.swap_map,
+            "select",
+            "mode",
+            "keyboard",
+            "touchpad_right",
+            "touchpad_touch",
+            "y",
+            "b",
+        }
+        if trigger == "discrete_to_analog":
+            button_codes.update(("lt", "rt"))
+        if self.reboot_button:
+            button_codes.add(self.reboot_button)
+        if startselect_chord == "start_select":
+            button_codes.add("start")
+        if dpad == "discrete_to_analog" or dpad == "both":
+            button_codes.update(DPAD_TO_HAT)
+        if self.qam_button is not None:
+            button_codes.add(self.qam_button)
+        if self.noob_mode:
+            button_codes.update(("extra_l1", "extra_r1"))
+        if r3_to_share:
+            button_codes.add("extra_r3")
+        if nintendo_mode:
+            button_codes.update(NINTENDO_MAP)
+        self.button_codes = frozenset(button_codes)
+
         uses_rgb: bool = params.get("rgb_used", False)
         rgb_modes: dict[RgbMode, Sequence[RgbSettings]] | None = params.get(
             "rgb_modes", None
@@ -662,6 +759,26 @@ class Multiplexer:
                 },
             )
 
+        if STATS_ENABLED:
+            self.process = self._process_timed
+
+    def _process_timed(self, events: Sequence[Event]) -> Sequence[Event]:
+        start = time.perf_counter_ns()
+        out = Multiplexer.process(self, events)
+        stats = current_pipeline()
+        if stats:
+            dt = time.perf_counter_ns() - start
+            stats.stages["process"].record(dt)
+            stats.process_ns += dt
+        return out
+
+    def fds(self) -> Sequence[int]:
+        """Fds of the emitter, to be registered with the `Reactor`."""
+        return self.emit.fds() if self.emit else []
+
+    def _schedule(self, ev: Event | Literal["reboot"], t: float):
+        heapq.heappush(self.queue, (t, next(self.queue_seq), ev))
+
     def process(self, events: Sequence[Event]) -> Sequence[Event]:
         out: list[Event] = []
         status_events = set()
@@ -672,8 +789,8 @@ class Multiplexer:
         curr = time.perf_counter()
 
         # Send old events
-        while len(self.queue) and self.queue[0][1] < curr:
-            ev = self.queue.pop(0)[0]
+        while self.queue and self.queue[0][0] < curr:
+            ev = heapq.heappop(self.queue)[2]
             if ev == "reboot":
                 if self.reboot_is_held:
                     try:
@@ -702,35 +819,32 @@ class Multiplexer:
 
         if self.reboot_pressed and self.reboot_pressed + self.reboot_time < curr:
             self.reboot_pressed = None
+            t = curr
             for i in range(self.REBOOT_VIBRATION_NUM):
-                self.queue.append(
-                    (
-                        {
-                            "type": "rumble",
-                            "code": "main",
-                            "strong_magnitude": self.REBOOT_VIBRATION_STRENGTH,
-                            "weak_magnitude": self.REBOOT_VIBRATION_STRENGTH,
-                            "from_reboot": True,
-                        },  # type: ignore
-                        curr
-                        + i * (self.REBOOT_VIBRATION_ON + self.REBOOT_VIBRATION_OFF),
-                    )
+                t = curr + i * (self.REBOOT_VIBRATION_ON + self.REBOOT_VIBRATION_OFF)
+                self._schedule(
+                    {
+                        "type": "rumble",
+                        "code": "main",
+                        "strong_magnitude": self.REBOOT_VIBRATION_STRENGTH,
+                        "weak_magnitude": self.REBOOT_VIBRATION_STRENGTH,
+                        "from_reboot": True,
+                    },  # type: ignore
+                    t,
                 )
-                self.queue.append(
-                    (
-                        {
-                            "type": "rumble",
-                            "code": "main",
-                            "strong_magnitude": 0,
-                            "weak_magnitude": 0,
-                            "from_reboot": True,
-                        },  # type: ignore
-                        curr
-                        + i * (self.REBOOT_VIBRATION_ON + self.REBOOT_VIBRATION_OFF)
-                        + self.REBOOT_VIBRATION_ON,
-                    )
+                t += self.REBOOT_VIBRATION_ON
+                self._schedule(
+                    {
+                        "type": "rumble",
+                        "code": "main",
+                        "strong_magnitude": 0,
+                        "weak_magnitude": 0,
+                        "from_reboot": True,
+                    },  # type: ignore
+                    t,
                 )
-            self.queue.append(("reboot", curr))
+            # Reboot after the vibrations finish
+            self._schedule("reboot", t)
 
         if (
             self.touchpad_hold != "disabled"
@@ -743,25 +857,21 @@ class Multiplexer:
                 if self.touchpad_hold == "left_click"
                 else "touchpad_right"
             )
-            self.queue.append(
-                (
-                    {
-                        "type": "button",
-                        "code": action,
-                        "value": True,
-                    },
-                    curr,
-                )
+            self._schedule(
+                {
+                    "type": "button",
+                    "code": action,
+                    "value": True,
+                },
+                curr,
             )
-            self.queue.append(
-                (
-                    {
-                        "type": "button",
-                        "code": action,
-                        "value": False,
-                    },
-                    curr + self.QAM_DELAY,
-                )
+            self._schedule(
+                {
+                    "type": "button",
+                    "code": action,
+                    "value": False,
+                },
+                curr + self.QAM_DELAY,
             )
             self.touchpad_down = None
         elif self.touchpad_down and (
@@ -773,62 +883,14 @@ class Multiplexer:
         for ev in events:
             match ev["type"]:
                 case "axis":
-                    match self.imu:
-                        case "left_to_main":
-                            match ev["code"]:
-                                case "left_accel_x":
-                                    ev["code"] = "accel_x"
-                                case "left_accel_y":
-                                    ev["code"] = "accel_y"
-                                case "left_accel_z":
-                                    ev["code"] = "accel_z"
-                                case "left_gyro_x":
-                                    ev["code"] = "gyro_x"
-                                case "left_gyro_y":
-                                    ev["code"] = "gyro_y"
-                                case "left_gyro_z":
-                                    ev["code"] = "gyro_z"
-                                case "left_imu_ts":
-                                    ev["code"] = "imu_ts"
-                        case "right_to_main":
-                            match ev["code"]:
-                                case "right_accel_x":
-                                    ev["code"] = "accel_x"
-                                case "right_accel_y":
-                                    ev["code"] = "accel_y"
-                                case "right_accel_z":
-                                    ev["code"] = "accel_z"
-                                case "right_gyro_x":
-                                    ev["code"] = "gyro_x"
-                                case "right_gyro_y":
-                                    ev["code"] = "gyro_y"
-                                case "right_gyro_z":
-                                    ev["code"] = "gyro_z"
-                                case "right_imu_ts":
-                                    ev["code"] = "imu_ts"
-                        case "main_to_sides":
-                            match ev["code"]:
-                                case "accel_x":
-                                    ev["code"] = "right_accel_x"
-                                    ev["code"] = "left_accel_x"
-                                case "accel_y":
-                                    ev["code"] = "right_accel_y"
-                                    ev["code"] = "left_accel_y"
-                                case "accel_z":
-                                    ev["code"] = "right_accel_z"
-                                    ev["code"] = "left_accel_z"
-                                case "gyro_x":
-                                    ev["code"] = "right_gyro_x"
-                                    ev["code"] = "left_gyro_x"
-                                case "gyro_y":
-                                    ev["code"] = "right_gyro_y"
-                                    ev["code"] = "left_gyro_y"
-                                case "gyro_z":
-                                    ev["code"] = "right_gyro_z"
-                                    ev["code"] = "left_gyro_z"
-                                case "imu_ts":
-                                    ev["code"] = "right_imu_ts"
-                                    ev["code"] = "left_imu_ts"
+                    if (
+                        self.startselect_pressed is None
+                        and ev["code"] not in self.axis_codes
+                    ):
+                        continue
+
+                    if self.imu_map:
+                        ev["code"] = self.imu_map.get(ev["code"], ev["code"])
 
                     if (
                         self.startselect_pressed == "wait"
@@ -850,15 +912,13 @@ class Multiplexer:
                         )
                         self.startselect_pressed = "pressed"
                     if self.startselect_pressed == "pressed":
-                        self.queue.append(
-                            (
-                                {
-                                    "type": "axis",
-                                    "code": ev["code"],
-                                    "value": ev["value"],
-                                },
-                                curr + self.QAM_DELAY,
-                            )
+                        self._schedule(
+                            {
+                                "type": "axis",
+                                "code": ev["code"],
+                                "value": ev["value"],
+                            },
+                            curr + self.QAM_DELAY,
                         )
                         ev["code"] = ""  # type: ignore
 
@@ -905,6 +965,12 @@ class Multiplexer:
                     if ev["code"] == "touchpad_y":
                         self.touchpad_y = ev["value"]
                 case "button":
+                    if (
+                        self.startselect_pressed is None
+                        and ev["code"] not in self.button_codes
+                    ):
+                        continue
+
                     if self.trigger == "discrete_to_analog" and ev["code"] in (
                         "lt",
                         "rt",
@@ -931,48 +997,8 @@ class Multiplexer:
                             self.reboot_pressed = None
                             self.reboot_is_held = False
 
-                    if self.swap_guide and ev["code"] in (
-                        "start",
-                        "select",
-                        "mode",
-                        "share",
-                        "keyboard",
-                    ):
-                        match ev["code"]:
-                            # TODO: Refactor the logic of this file,
-                            # the arguments do not make sense.
-                            case "start":
-                                match self.swap_guide:
-                                    case "start_is_keyboard":
-                                        ev["code"] = "keyboard"
-                                    case "select_is_guide":
-                                        ev["code"] = "share"
-                                    case _:
-                                        ev["code"] = "mode"
-                            case "select":
-                                match self.swap_guide:
-                                    case "start_is_keyboard":
-                                        ev["code"] = "mode"
-                                    case "select_is_guide":
-                                        ev["code"] = "mode"
-                                    case _:
-                                        ev["code"] = "share"
-                            case "mode":
-                                if self.swap_guide == "guide_is_start":
-                                    ev["code"] = "start"
-                                else:
-                                    ev["code"] = "select"
-                            case "share":
-                                match self.swap_guide:
-                                    case "start_is_keyboard":
-                                        pass
-                                    case "guide_is_start":
-                                        ev["code"] = "select"
-                                    case _:
-                                        ev["code"] = "start"
-                            case "keyboard":
-                                if self.swap_guide == "start_is_keyboard":
-                                    ev["code"] = "start"
+                    if self.swap_map:
+                        ev["code"] = self.swap_map.get(ev["code"], ev["code"])
 
                     if (
                         self.startselect_chord != "disabled" and ev["code"] == "select"
@@ -981,15 +1007,13 @@ class Multiplexer:
                         and ev["code"] == "start"
                     ):
                         if self.startselect_pressed == "pressed":
-                            self.queue.append(
-                                (
-                                    {
-                                        "type": "button",
-                                        "code": "mode",
-                                        "value": False,
-                                    },
-                                    curr + self.QAM_DELAY,
-                                )
+                            self._schedule(
+                                {
+                                    "type": "button",
+                                    "code": "mode",
+                                    "value": False,
+                                },
+                                curr + self.QAM_DELAY,
                             )
                             self.startselect_pressed = None
 
@@ -1004,15 +1028,13 @@ class Multiplexer:
                                     "value": True,
                                 }
                             )
-                            self.queue.append(
-                                (
-                                    {
-                                        "type": "button",
-                                        "code": ev["code"],
-                                        "value": False,
-                                    },
-                                    curr + self.QAM_DELAY,
-                                )
+                            self._schedule(
+                                {
+                                    "type": "button",
+                                    "code": ev["code"],
+                                    "value": False,
+                                },
+                                curr + self.QAM_DELAY,
                             )
                         ev["code"] = ""  # type: ignore
 
@@ -1035,20 +1057,7 @@ class Multiplexer:
                         # state so that if going from -1 to 1 in one go it would be
                         # preserved. Since this is only used for the legion go
                         # passthrough that is not an issue.
-                        match ev["code"]:
-                            case "dpad_up":
-                                code = "hat_y"
-                                val = -1
-                            case "dpad_down":
-                                code = "hat_y"
-                                val = 1
-                            case "dpad_right":
-                                code = "hat_x"
-                                val = 1
-                            case "dpad_left":
-                                code = "hat_x"
-                                val = -1
-
+                        code, val = DPAD_TO_HAT[ev["code"]]
                         out.append(
                             {
                                 "type": "axis",
@@ -1099,39 +1108,29 @@ class Multiplexer:
                                             "value": True,
                                         },
                                     )
-                                    self.queue.append(
-                                        (
-                                            {
-                                                "type": "button",
-                                                "code": (
-                                                    "b" if self.nintendo_qam else "a"
-                                                ),
-                                                "value": True,
-                                            },
-                                            curr + self.QAM_DELAY,
-                                        ),
+                                    self._schedule(
+                                        {
+                                            "type": "button",
+                                            "code": ("b" if self.nintendo_qam else "a"),
+                                            "value": True,
+                                        },
+                                        curr + self.QAM_DELAY,
                                     )
-                                    self.queue.append(
-                                        (
-                                            {
-                                                "type": "button",
-                                                "code": (
-                                                    "b" if self.nintendo_qam else "a"
-                                                ),
-                                                "value": False,
-                                            },
-                                            curr + 2 * self.QAM_DELAY,
-                                        ),
+                                    self._schedule(
+                                        {
+                                            "type": "button",
+                                            "code": ("b" if self.nintendo_qam else "a"),
+                                            "value": False,
+                                        },
+                                        curr + 2 * self.QAM_DELAY,
                                     )
-                                    self.queue.append(
-                                        (
-                                            {
-                                                "type": "button",
-                                                "code": "mode",
-                                                "value": False,
-                                            },
-                                            curr + 2 * self.QAM_DELAY,
-                                        ),
+                                    self._schedule(
+                                        {
+                                            "type": "button",
+                                            "code": "mode",
+                                            "value": False,
+                                        },
+                                        curr + 2 * self.QAM_DELAY,
                                     )
 
                     if ev["code"] == "keyboard":
@@ -1158,35 +1157,29 @@ class Multiplexer:
                                     "value": True,
                                 },
                             )
-                            self.queue.append(
-                                (
-                                    {
-                                        "type": "button",
-                                        "code": "y" if self.nintendo_qam else "x",
-                                        "value": True,
-                                    },
-                                    curr + self.QAM_DELAY,
-                                )
+                            self._schedule(
+                                {
+                                    "type": "button",
+                                    "code": "y" if self.nintendo_qam else "x",
+                                    "value": True,
+                                },
+                                curr + self.QAM_DELAY,
                             )
-                            self.queue.append(
-                                (
-                                    {
-                                        "type": "button",
-                                        "code": "y" if self.nintendo_qam else "x",
-                                        "value": False,
-                                    },
-                                    curr + 2 * self.QAM_DELAY,
-                                ),
+                            self._schedule(
+                                {
+                                    "type": "button",
+                                    "code": "y" if self.nintendo_qam else "x",
+                                    "value": False,
+                                },
+                                curr + 2 * self.QAM_DELAY,
                             )
-                            self.queue.append(
-                                (
-                                    {
-                                        "type": "button",
-                                        "code": "mode",
-                                        "value": False,
-                                    },
-                                    curr + 2 * self.QAM_DELAY,
-                                ),
+                            self._schedule(
+                                {
+                                    "type": "button",
+                                    "code": "mode",
+                                    "value": False,
+                                },
+                                curr + 2 * self.QAM_DELAY,
                             )
 
                     if self.noob_mode and ev["code"] == "extra_r1" and ev["value"]:
@@ -1218,25 +1211,21 @@ class Multiplexer:
                                 if self.touchpad_short == "left_click"
                                 else "touchpad_right"
                             )
-                            self.queue.append(
-                                (
-                                    {
-                                        "type": "button",
-                                        "code": action,
-                                        "value": True,
-                                    },
-                                    curr,
-                                )
+                            self._schedule(
+                                {
+                                    "type": "button",
+                                    "code": action,
+                                    "value": True,
+                                },
+                                curr,
                             )
-                            self.queue.append(
-                                (
-                                    {
-                                        "type": "button",
-                                        "code": action,
-                                        "value": False,
-                                    },
-                                    curr + self.QAM_DELAY,
-                                )
+                            self._schedule(
+                                {
+                                    "type": "button",
+                                    "code": action,
+                                    "value": False,
+                                },
+                                curr + self.QAM_DELAY,
                             )
 
                         if ev["value"]:
@@ -1249,15 +1238,7 @@ class Multiplexer:
                         ev["code"] = "share"
 
                     if self.nintendo_mode:
-                        match ev["code"]:
-                            case "a":
-                                ev["code"] = "b"
-                            case "b":
-                                ev["code"] = "a"
-                            case "x":
-                                ev["code"] = "y"
-                            case "y":
-                                ev["code"] = "x"
+                        ev["code"] = NINTENDO_MAP.get(ev["code"], ev["code"])
 
                     # Assume we own Xbox + Y if the user is not using the recording feature
                     if (
@@ -1295,15 +1276,13 @@ class Multiplexer:
                         )
                         self.startselect_pressed = "pressed"
                     if self.startselect_pressed == "pressed":
-                        self.queue.append(
-                            (
-                                {
-                                    "type": "button",
-                                    "code": ev["code"],
-                                    "value": ev["value"],
-                                },
-                                curr + self.QAM_DELAY,
-                            )
+                        self._schedule(
+                            {
+                                "type": "button",
+                                "code": ev["code"],
+                                "value": ev["value"],
+                            },
+                            curr + self.QAM_DELAY,
                         )
                         ev["code"] = ""  # type: ignore
                 case "led":
@@ -1317,13 +1296,8 @@ class Multiplexer:
                 case "configuration":
                     if self.status == "both_to_main":
                         self.state[ev["code"]] = ev["value"]
-                        match ev["code"]:
-                            case "battery_left" | "battery_right":
-                                status_events.add("battery")
-                            case "is_attached_left" | "is_attached_right":
-                                status_events.add("is_attached")
-                            case "is_connected_left" | "is_connected_right":
-                                status_events.add("is_connected")
+                        if stat := STATUS_EVENTS.get(ev["code"], None):
+                            status_events.add(stat)
 
         if touched:
             self.touchpad_down = [
@@ -1489,15 +1463,13 @@ class Multiplexer:
                             "value": True,
                         },
                     )
-                    self.queue.append(
-                        (
-                            {
-                                "type": "button",
-                                "code": "share",
-                                "value": False,
-                            },
-                            curr + self.QAM_DELAY,
-                        )
+                    self._schedule(
+                        {
+                            "type": "button",
+                            "code": "share",
+                            "value": False,
+                        },
+                        curr + self.QAM_DELAY,
                     )
                 else:
                     # Have a fallback if gamescope is not working
@@ -1508,35 +1480,29 @@ class Multiplexer:
                             "value": True,
                         },
                     )
-                    self.queue.append(
-                        (
-                            {
-                                "type": "button",
-                                "code": "b" if self.nintendo_qam else "a",
-                                "value": True,
-                            },
-                            curr + self.QAM_DELAY,
-                        )
+                    self._schedule(
+                        {
+                            "type": "button",
+                            "code": "b" if self.nintendo_qam else "a",
+                            "value": True,
+                        },
+                        curr + self.QAM_DELAY,
                     )
-                    self.queue.append(
-                        (
-                            {
-                                "type": "button",
-                                "code": "b" if self.nintendo_qam else "a",
-                                "value": False,
-                            },
-                            curr + 2 * self.QAM_DELAY,
-                        ),
+                    self._schedule(
+                        {
+                            "type": "button",
+                            "code": "b" if self.nintendo_qam else "a",
+                            "value": False,
+                        },
+                        curr + 2 * self.QAM_DELAY,
                     )
-                    self.queue.append(
-                        (
-                            {
-                                "type": "button",
-                                "code": "mode",
-                                "value": False,
-                            },
-                            curr + 2 * self.QAM_DELAY,
-                        ),
+                    self._schedule(
+                        {
+                            "type": "button",
+                            "code": "mode",
+                            "value": False,
+                        },
+                        curr + 2 * self.QAM_DELAY,
                     )
         elif send_steam_expand:
             out.append(
@@ -1546,15 +1512,13 @@ class Multiplexer:
                     "value": True,
                 },
             )
-            self.queue.append(
-                (
-                    {
-                        "type": "button",
-                        "code": "mode",
-                        "value": False,
-                    },
-                    curr + self.QAM_DELAY,
-                )
+            self._schedule(
+                {
+                    "type": "button",
+                    "code": "mode",
+                    "value": False,
+                },
+                curr + self.QAM_DELAY,
             )
         return out
 
@@ -1609,3 +1573,263 @@ class KeyboardWrapper(Producer, Consumer):
 
 def can_read(fd: int):
     return select.select([fd], [], [], 0)[0]
+
+
+class ReportPolicy:
+    """Sets the rate the controller loop runs at.
+
+    If unbounded, the total number of events per second is the sum of all
+    events generated by the producers.
+    For Legion go, that would be 100 + 100 + 500 + 30 = 730
+    Since the controllers of the legion go only update at 500hz, this is
+    wasteful.
+
+    By holding each loop iteration for at least `1 / freq_max`, even if multiple
+    fds become ready close to each other they are combined to the same report,
+    limiting resource use.
+    Ideally, this rate is smaller than the report rate of the hardware controller
+    to ensure there is always a report from that ready during refresh.
+
+    If no fd becomes ready, the loop still runs `freq_min` times per second, so
+    consumers are called a minimum amount of times per second."""
+
+    def __init__(self, freq_min: float = 25, freq_max: float = 400) -> None:
+        self.delay_max = 1 / freq_min
+        self.delay_min = 1 / freq_max
+        self.start = None
+
+    def wait(self, reactor: "Reactor") -> Sequence[int]:
+        """Waits for the next iteration and returns the fds that are ready."""
+        curr = time.perf_counter()
+        if self.start is not None:
+            hold = self.delay_min - (curr - self.start)
+            if hold > 0:
+                time.sleep(hold)
+                curr = time.perf_counter()
+        self.start = curr
+
+        return reactor.select(self.delay_max)
+
+
+class DeadlinePolicy(ReportPolicy):
+    """Coalesces reports around the primary producer (i.e., the gamepad) instead
+    of holding every iteration for a fixed time.
+
+    As with `ReportPolicy`, iterations are at least `1 / freq_max` apart.
+    After that, when the primary producer has a fresh report, the loop runs
+    immediately. When only other producers are ready (e.g., the IMU), the loop
+    waits for the primary report until a deadline, which is one hardware report
+    period (`1 / freq_hw`) after the previous iteration.
+    This way, the events are combined into the virtual report that follows
+    the hardware report without adding a fixed delay after it.
+
+    If `freq_hw` is not known, the period is estimated as the shortest interval
+    between primary reports over the last `PERIOD_WINDOW` of them, since evdev
+    skips the reports where nothing changed. Until then, `1 / freq_max` is used."""
+
+    PERIOD_WINDOW = 64
+    # Bounds of the estimate, the polling rates of USB gamepads
+    FREQ_HW_MIN = 125
+    FREQ_HW_MAX = 1000
+
+    def __init__(
+        self,
+        freq_min: float = 25,
+        freq_max: float = 400,
+        freq_hw: float | None = None,
+    ) -> None:
+        super().__init__(freq_min, freq_max)
+        self.period = 1 / freq_hw if freq_hw else self.delay_min
+        self.estimate = not freq_hw
+        self.last_primary = None
+        self.window_min = None
+        self.window_n = 0
+
+    def _update_period(self, t: float):
+        if self.last_primary is not None:
+            dt = t - self.last_primary
+            if self.window_min is None or dt < self.window_min:
+                self.window_min = dt
+            self.window_n += 1
+            if self.window_n >= self.PERIOD_WINDOW:
+                self.period = min(
+                    max(self.window_min, 1 / self.FREQ_HW_MAX), 1 / self.FREQ_HW_MIN
+                )
+                self.window_min = None
+                self.window_n = 0
+        self.last_primary = t
+
+    def wait(self, reactor: "Reactor") -> Sequence[int]:
+        curr = time.perf_counter()
+        last = self.start if self.start is not None else curr
+        hold = self.delay_min - (curr - last)
+        if hold > 0:
+            time.sleep(hold)
+            curr = time.perf_counter()
+
+        ready = reactor.select(max(last + self.delay_max - curr, 0))
+        if ready and not reactor.has_primary(ready):
+            curr = time.perf_counter()
+            deadline = last + self.period
+            if curr < deadline:
+                reactor.select(deadline - curr, primary=True)
+                # Collect everything that became ready in the meantime
+                ready = reactor.select(0)
+
+        self.start = time.perf_counter()
+        if self.estimate and ready and reactor.has_primary(ready):
+            self._update_period(self.start)
+        return ready
+
+
+class Reactor:
+    """Shared event loop for the controller loops of the device plugins.
+
+    Producers are opened through `prepare()` and their fds are registered
+    once to an `epoll` instance. Then, each iteration, `poll()` waits according
+    to the `ReportPolicy` and `produce()` runs only the producers whose fds are
+    ready, in the order they were prepared.
+
+    Producers are not required to drain their fds every time they are called,
+    so the fds are registered level-triggered."""
+
+    def __init__(self, policy: ReportPolicy | None = None) -> None:
+        self.policy = policy or ReportPolicy()
+        self.devs: list[Producer] = []
+        self._epoll = select.epoll()
+        self._primary_epoll = None
+        self._fds: set[int] = set()
+        self._primary: set[int] = set()
+        self._fd_to_idx: dict[int, int] = {}
+        self._always: set[int] = set()
+
+        # Opt-in instrumentation (HHD_STATS=1), see `hhd.controller.lib.stats`
+        self.stats = register_pipeline() if STATS_ENABLED else None
+        self._t_wake = None
+        self._t_produced = None
+
+    def prepare(
+        self, dev: Producer, always: bool = False, primary: bool = False
+    ) -> Sequence[int]:
+        """Opens the producer and registers its fds. The producer is added
+        before opening it, so that it is closed even if opening fails.
+        If `always` is set, the producer runs every iteration. If `primary`
+        is set, the producer is used by the policy to time reports."""
+        self.devs.append(dev)
+        idx = len(self.devs) - 1
+        if always:
+            self._always.add(idx)
+        if self.stats:
+            self.stats.add_producer(f"{idx}:{type(dev).__name__}")
+
+        fds = dev.open()
+        self.register(fds, primary)
+        for fd in fds:
+            self._fd_to_idx[fd] = idx
+        return fds
+
+    def register(self, fds: Sequence[int], primary: bool = False):
+        """Registers fds that wake up the loop without being tied to a
+        prepared producer (e.g., producers that run every iteration)."""
+        for fd in fds:
+            if fd not in self._fds:
+                self._epoll.register(fd, select.EPOLLIN)
+                self._fds.add(fd)
+            if primary and fd not in self._primary:
+                if self._primary_epoll is None:
+                    self._primary_epoll = select.epoll()
+                self._primary_epoll.register(fd, select.EPOLLIN)
+                self._primary.add(fd)
+
+    def select(self, timeout: float, primary: bool = False) -> Sequence[int]:
+        """Waits up to `timeout` for registered fds (or only the primary ones)
+        to become ready and returns them."""
+        if primary:
+            if self._primary_epoll is None:
+                time.sleep(timeout)
+                return []
+            return [fd for fd, _ in self._primary_epoll.poll(timeout)]
+        return [fd for fd, _ in self._epoll.poll(timeout)]
+
+    def has_primary(self, fds: Sequence[int]) -> bool:
+        for fd in fds:
+            if fd in self._primary:
+                return True
+        return False
+
+    def poll(self) -> Sequence[int]:
+        """Waits for the next iteration and returns the fds that are ready."""
+        if self.stats:
+            return self._poll_timed()
+        return self.policy.wait(self)
+
+    def _poll_timed(self) -> Sequence[int]:
+        stats = self.stats
+        assert stats
+        start = time.perf_counter_ns()
+
+        # Finish the previous iteration, the time after producing that was not
+        # spent in the multiplexer was spent in the consumers
+        if self._t_wake is not None and self._t_produced is not None:
+            stats.stages["consume"].record(
+                max(start - self._t_produced - stats.process_ns, 0)
+            )
+            loop = start - self._t_wake
+            stats.stages["loop"].record(loop)
+            if loop > self.policy.delay_min * 1e9:
+                stats.overruns += 1
+        stats.check_reset()
+
+        ready = self.policy.wait(self)
+        self._t_wake = time.perf_counter_ns()
+        self._t_produced = None
+        stats.process_ns = 0
+        stats.stages["wait"].record(self._t_wake - start)
+        stats.wakeups += 1
+        if not ready:
+            stats.timeouts += 1
+        return ready
+
+    def produce(self, fds: Sequence[int]) -> list[Event]:
+        """Runs the producers with ready fds and returns their events."""
+        to_run = set(self._always)
+        for fd in fds:
+            idx = self._fd_to_idx.get(fd, None)
+            if idx is not None:
+                to_run.add(idx)
+
+        if self.stats:
+            return self._produce_timed(fds, sorted(to_run))
+
+        evs = []
+        for idx in sorted(to_run):
+            evs.extend(self.devs[idx].produce(fds))
+        return evs
+
+    def _produce_timed(self, fds: Sequence[int], to_run: list[int]) -> list[Event]:
+        stats = self.stats
+        assert stats
+        start = prev = time.perf_counter_ns()
+        evs = []
+        for idx in to_run:
+            out = self.devs[idx].produce(fds)
+            evs.extend(out)
+
+            curr = time.perf_counter_ns()
+            p = stats.producers[idx]
+            p.calls += 1
+            p.events += len(out)
+            p.latency.record(curr - prev)
+            prev = curr
+
+        stats.stages["produce"].record(prev - start)
+        stats.coalesced += count_coalesced(evs)
+        self._t_produced = prev
+        return evs
+
+    def close(self):
+        if self.stats:
+            unregister_pipeline(self.stats)
+        self._epoll.close()
+        if self._primary_epoll is not None:
+            self._primary_epoll.close()
@@ -0,0 +1,95 @@
+import heapq
+import os
+import time
+from collections import deque
+from typing import Any, Sequence
+
+from .timerfd import (
+    TFD_CLOEXEC,
+    TFD_NONBLOCK,
+    TFD_TIMER_ABSTIME,
+    timerfd_create,
+    timerfd_read,
+    timerfd_settime_ns,
+)
+
+# Timed events use wall clock timestamps (`time.time()`)
+CLOCK_REALTIME = 0
+# Events are drained every iteration, so this is only reached if the
+# controller loop is stuck; the oldest events are dropped then
+QUEUE_SIZE = 256
+
+# Queued by `put_timed()` to drop the events that are still pending
+_CLEAR = None
+
+
+class EventBus:
+    """Passes events from other threads (plugins, the http API) to a
+    controller loop, which waits on `fds()` together with its devices.
+
+    Producers append to a bounded deque and write to an eventfd. `append()`
+    and `popleft()` of a deque are atomic, so neither side takes a lock.
+    Events with a timestamp are held by the consumer in a heap, and a timerfd
+    is armed for the earliest one, so they wake up the loop when they are due.
+
+    `get()` must only be called from the thread of the controller loop."""
+
+    def __init__(self, maxlen: int = QUEUE_SIZE) -> None:
+        self._queue: deque[tuple[Any, float] | None] = deque(maxlen=maxlen)
+        self._heap: list[tuple[float, int, Any]] = []
+        self._seq = 0
+        self._armed = None
+        self.efd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        self.tfd = timerfd_create(CLOCK_REALTIME, TFD_CLOEXEC | TFD_NONBLOCK)
+
+    def fds(self) -> Sequence[int]:
+        return [self.efd, self.tfd]
+
+    def put(self, evs: Sequence[Any], t: float = 0):
+        """Queues `evs`, which are returned by `get()` after time `t`."""
+        for ev in evs:
+            self._queue.append((ev, t))
+        os.eventfd_write(self.efd, 1)
+
+    def put_timed(self, evs: Sequence[tuple[Any, float]]):
+        """Replaces the pending events with `evs`."""
+        self._queue.append(_CLEAR)
+        self._queue.extend(evs)
+        os.eventfd_write(self.efd, 1)
+
+    def get(self) -> list[Any]:
+        """Returns the events that are due, in the order they were queued."""
+        # Clear the fds before draining, so that an event queued in between
+        # wakes up the loop again instead of being missed
+        try:
+            os.eventfd_read(self.efd)
+        except BlockingIOError:
+            pass
+        timerfd_read(self.tfd)
+
+        out = []
+        curr = time.time()
+        while self._queue:
+            item = self._queue.popleft()
+            if item is _CLEAR:
+                out.clear()
+                self._heap.clear()
+                continue
+            ev, t = item
+            if t <= curr:
+                out.append(ev)
+            else:
+                heapq.heappush(self._heap, (t, self._seq, ev))
+                self._seq += 1
+
+        while self._heap and self._heap[0][0] <= curr:
+            out.append(heapq.heappop(self._heap)[2])
+
+        head = self._heap[0][0] if self._heap else None
+        if head != self._armed:
+            # 0 disarms the timer
+            timerfd_settime_ns(
+                self.tfd, TFD_TIMER_ABSTIME, int(head * 1e9) if head else 0
+            )
+            self._armed = head
+        return out
@@ -1,5 +1,6 @@
 import re
-from typing import Literal, NamedTuple, Sequence
+import struct
+from typing import Any, Callable, Literal, Mapping, NamedTuple, Sequence
 
 
 class BM(NamedTuple):
@@ -212,6 +213,203 @@ def decode_config(rep: bytes, map: CM):
         return ax
 
 
+NUM_FORMATS = {
+    "u32": ("I", 0, (1 << 32) - 1),
+    "i32": ("i", 0, (1 << 31) - 1),
+    "m32": ("I", 1 << 31, (1 << 31) - 1),
+    "u16": ("H", 0, (1 << 16) - 1),
+    "i16": ("h", 0, (1 << 15) - 1),
+    "m16": ("H", 1 << 15, (1 << 15) - 1),
+    "u8": ("B", 0, (1 << 8) - 1),
+    "i8": ("b", 0, (1 << 7) - 1),
+    "m8": ("B", 1 << 7, 1 << 7),
+}
+"""Struct format, middle point and divisor for each numerical type, matching
+`decode_axis`."""
+
+
+class ReportDecoder:
+    """Decodes the buttons, axes and configuration of a single report id.
+
+    The maps are compiled once: byte aligned fields are unpacked with one
+    `struct.Struct` per byte order (more only if fields overlap), bits are
+    read with a precomputed byte index and mask, and the scale, offset and
+    flip of each field are precomputed. The unpacked values are compared to
+    the previous report in one pass, and only the changed fields are converted
+    and returned as events, in map order (buttons, axes, configuration)."""
+
+    def __init__(
+        self,
+        btn_map: Mapping[Any, BM] = {},
+        axis_map: Mapping[Any, AM] = {},
+        config_map: Mapping[Any, CM] = {},
+    ) -> None:
+        nums: list[tuple[int, str, str, int]] = []
+        bits: list[tuple[int, int]] = []
+        # (type, code, is_bit, idx, params)
+        fields = []
+
+        def add_num(loc: int, t: str, order: str):
+            nums.append((loc >> 3, NUM_FORMATS[t][0], order, len(nums)))
+            return len(nums) - 1
+
+        def add_bit(loc: int):
+            bits.append((loc // 8, 1 << (7 - (loc % 8))))
+            return len(bits) - 1
+
+        for code, m in btn_map.items():
+            fields.append(("button", code, True, add_bit(m.loc), m.flipped))
+        for code, m in axis_map.items():
+            _, mid, div = NUM_FORMATS[m.type]
+            params = (mid, m.scale, div, m.offset, -1 if m.flipped else 1, None)
+            fields.append(
+                ("axis", code, False, add_num(m.loc, m.type, m.order), params)
+            )
+        for code, m in config_map.items():
+            if m.type == "bit":
+                fields.append(("configuration", code, True, add_bit(m.loc), m.flipped))
+            else:
+                _, mid, div = NUM_FORMATS[m.type]
+                params = (mid, m.scale, div, m.offset, 1, m.bounds)
+                idx = add_num(m.loc, m.type, m.order)
+                fields.append(("configuration", code, False, idx, params))
+
+        # Pack non-overlapping fields with the same byte order into structs
+        self.structs: list[tuple[struct.Struct, int]] = []
+        num_idx = [0] * len(nums)
+        cnt = 0
+        self.size = 0
+        for order, prefix in (("little", "<"), ("big", ">")):
+            group = sorted(n for n in nums if n[2] == order)
+            fmt = ""
+            start = pos = 0
+            for ofs, c, _, idx in group:
+                if fmt and ofs < pos:
+                    st = struct.Struct(prefix + fmt)
+                    self.structs.append((st, start))
+                    fmt = ""
+                if not fmt:
+                    start = pos = ofs
+                fmt += "x" * (ofs - pos) + c
+                pos = ofs + struct.calcsize(c)
+                self.size = max(self.size, pos)
+                num_idx[idx] = cnt
+                cnt += 1
+            if fmt:
+                self.structs.append((struct.Struct(prefix + fmt), start))
+
+        self.bits = bits
+        for idx, _ in bits:
+            self.size = max(self.size, idx + 1)
+
+        # Bits are placed after the numbers in the unpacked values
+        self.fields = [
+            (t, code, is_bit, idx + cnt if is_bit else num_idx[idx], params)
+            for t, code, is_bit, idx, params in fields
+        ]
+        self.prev = None
+        self.clamped = {}
+
+    def reset(self):
+        self.prev = None
+        self.clamped = {}
+
+    def decode(self, rep: bytes) -> list:
+        if len(rep) < self.size:
+            rep = bytes(rep).ljust(self.size, b"\x00")
+
+        vals = []
+        for st, ofs in self.structs:
+            vals.extend(st.unpack_from(rep, ofs))
+        for idx, mask in self.bits:
+            vals.append(rep[idx] & mask)
+
+        prev = self.prev
+        self.prev = vals
+
+        out = []
+        for t, code, is_bit, idx, params in self.fields:
+            raw = vals[idx]
+            if prev is not None and prev[idx] == raw:
+                continue
+
+            if is_bit:
+                val = bool(raw) != params
+            else:
+                mid, scale, div, offset, sign, bounds = params
+                if scale:
+                    val = sign * (scale * (raw - mid) + offset)
+                else:
+                    val = sign * ((raw - mid) / div + offset)
+                if bounds:
+                    val = min(max(val, bounds[0]), bounds[1])
+                    # Clamped values might not change even if the raw value did
+                    if prev is not None and self.clamped.get(idx, None) == val:
+                        continue
+                    self.clamped[idx] = val
+            out.append({"type": t, "code": code, "value": val})
+        return out
+
+
+def compile_axis_encoder(t: AM) -> Callable[[bytearray, float], None]:
+    """Returns a function equivalent to `encode_axis(buff, t, val)`, with the
+    struct, multiplier and branches of the type resolved once."""
+    pack_into = struct.Struct(
+        ("<" if t.order == "little" else ">") + NUM_FORMATS[t.type][0]
+    ).pack_into
+    ofs = t.loc >> 3
+    bits = int(t.type[1:])
+    if t.type[0] == "u":
+        mult = (1 << bits) - 1
+        mid = None
+    else:
+        mult = (1 << (bits - 1)) - 1
+        mid = mult if t.type[0] == "m" else None
+    if t.type[0] == "i":
+        v_min, v_max = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    else:
+        v_min, v_max = 0, (1 << bits) - 1
+
+    def pack(buff: bytearray, ofs: int, v: int):
+        # `pack_into` zeroes the field before failing, check the range first
+        # so an overflow leaves the previous value in place
+        if not v_min <= v <= v_max:
+            raise OverflowError(f"Value {v} does not fit in '{t.type}'.")
+        pack_into(buff, ofs, v)
+
+    sign = -1 if t.flipped else 1
+    scale = t.scale
+    offset = t.offset
+    bounds = t.bounds
+
+    def unscaled(val: float):
+        if mid is None:
+            return int(mult * val)
+        return int(round(mult * val + mid))
+
+    if not scale:
+
+        def write(buff: bytearray, val: float):
+            pack(buff, ofs, unscaled(sign * val))
+
+    elif bounds:
+        lo, hi = bounds
+
+        def write(buff: bytearray, val: float):
+            val = sign * val
+            # Zero falls through to the unscaled value, as in `encode_axis`
+            new_val = min(max(int(scale * val + offset), lo), hi) or unscaled(val)
+            pack(buff, ofs, new_val)
+
+    else:
+
+        def write(buff: bytearray, val: float):
+            val = sign * val
+            pack(buff, ofs, int(scale * val + offset) or unscaled(val))
+
+    return write
+
+
 def matches_patterns(val: str | int, pats: Sequence[int | str | re.Pattern]):
     if not pats:
         return True
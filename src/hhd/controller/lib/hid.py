@@ -3,8 +3,12 @@
 import os
 import ctypes
 import atexit
+from threading import Lock
+from typing import Sequence
 
-__all__ = ["HIDException", "DeviceInfo", "Device", "enumerate"]
+from .udev import get_monitor
+
+__all__ = ["HIDException", "DeviceInfo", "Device", "enumerate", "EnumerationCache"]
 
 
 # hidapi = None
@@ -168,20 +172,144 @@ def enumerate(vid=0, pid=0):
     return ret
 
 
+def _ints(pats: Sequence):
+    return bool(pats) and all(isinstance(v, int) for v in pats)
+
+
+def _unique(devs):
+    return sorted(list({v["path"]: v for v in devs}.values()), key=lambda l: l["path"])
+
+
+class EnumerationCache:
+    """Caches the result of `enumerate()` until a hidraw device is added or
+    removed, as reported by the uevent monitor. Each change bumps `generation`,
+    and the enumeration is redone lazily on the next lookup. Without a monitor
+    (no netlink), every lookup enumerates.
+
+    The unique devices are indexed by (vid, pid), (usage_page, usage) and
+    interface number, so that opening a device is a dict lookup. The returned
+    dicts are shared and should not be modified."""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.generation = 0
+        self._gen = -1
+        self._sub = None
+
+        self.devices = []
+        self.unique = []
+        self.by_id: dict[tuple[int, int], list[dict]] = {}
+        self.by_vid: dict[int, list[dict]] = {}
+        self.by_usage: dict[tuple[int, int], list[dict]] = {}
+        self.by_interface: dict[int, list[dict]] = {}
+        self._unique_by_id: dict[tuple[int, int], list[dict]] = {}
+
+    def invalidate(self, *_):
+        with self.lock:
+            self.generation += 1
+
+    def _update(self):
+        if self._sub is None:
+            # Subscribe before enumerating so no changes are missed
+            mon = get_monitor()
+            self._sub = mon.subscribe(self.invalidate, "hidraw") if mon else False
+
+        with self.lock:
+            gen = self.generation
+            if self._sub is not False and gen == self._gen:
+                return
+
+        devices = enumerate()
+        unique = _unique(devices)
+
+        by_id = {}
+        by_vid = {}
+        for d in devices:
+            by_id.setdefault((d["vendor_id"], d["product_id"]), []).append(d)
+            by_vid.setdefault(d["vendor_id"], []).append(d)
+
+        unique_by_id = {}
+        by_usage = {}
+        by_interface = {}
+        for d in unique:
+            unique_by_id.setdefault((d["vendor_id"], d["product_id"]), []).append(d)
+            by_usage.setdefault((d["usage_page"], d["usage"]), []).append(d)
+            by_interface.setdefault(d["interface_number"], []).append(d)
+
+        with self.lock:
+            self.devices = devices
+            self.unique = unique
+            self.by_id = by_id
+            self.by_vid = by_vid
+            self.by_usage = by_usage
+            self.by_interface = by_interface
+            self._unique_by_id = unique_by_id
+            # If a device changed while enumerating, the next call will redo it
+            self._gen = gen
+
+    def enumerate_unique(self, vid=0, pid=0, usage_page=0, usage=0):
+        """Same as `enumerate_unique()`, from the cache."""
+        self._update()
+        with self.lock:
+            if vid and pid:
+                devs = self.by_id.get((vid, pid), [])
+            elif vid:
+                devs = self.by_vid.get(vid, [])
+            elif pid:
+                devs = [d for d in self.devices if d["product_id"] == pid]
+            else:
+                devs = self.devices
+
+        return _unique(
+            v
+            for v in devs
+            if (not usage_page or usage_page == v.get("usage_page", None))
+            and (not usage or usage == v.get("usage", None))
+        )
+
+    def lookup(
+        self,
+        vid: Sequence = [],
+        pid: Sequence = [],
+        usage_page: Sequence = [],
+        usage: Sequence = [],
+        interface: int | None = None,
+    ):
+        """Returns the candidate unique devices for the provided patterns,
+        sorted by path. Integer patterns are resolved through the indexes,
+        the caller still has to check the rest (e.g., regexes)."""
+        self._update()
+        with self.lock:
+            if _ints(vid) and _ints(pid):
+                devs = [
+                    d
+                    for v in set(vid)
+                    for p in set(pid)
+                    for d in self._unique_by_id.get((v, p), [])
+                ]
+            elif _ints(usage_page) and _ints(usage):
+                devs = [
+                    d
+                    for up in set(usage_page)
+                    for u in set(usage)
+                    for d in self.by_usage.get((up, u), [])
+                ]
+            elif interface is not None:
+                devs = list(self.by_interface.get(interface, []))
+            else:
+                return list(self.unique)
+
+        return sorted(devs, key=lambda l: l["path"])
+
+
+enumerate_cache = EnumerationCache()
+
+
 def enumerate_unique(vid=0, pid=0, usage_page=0, usage=0):
     """Returns the current connected devices,
-    sorted by path."""
-    return sorted(
-        list(
-            {
-                v["path"]: v
-                for v in enumerate(vid, pid)
-                if (not usage_page or usage_page == v.get("usage_page", None))
-                and (not usage or usage == v.get("usage", None))
-            }.values()
-        ),
-        key=lambda l: l["path"],
-    )
+    sorted by path. The enumeration is cached until a hidraw device is
+    added or removed."""
+    return enumerate_cache.enumerate_unique(vid, pid, usage_page, usage)
 
 
 class Device(object):
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from typing import Any, Sequence
+
+STATS_ENABLED = bool(os.environ.get("HHD_STATS", False))
+
+# Histogram buckets are linear up to 2 ** (SUB_BITS + 1) and then each power
+# of 2 is split into 2 ** SUB_BITS buckets (~6% precision). Values are in ns,
+# so 600 buckets cover up to ~20 minutes.
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+HIST_BUCKETS = 600
+PERCENTILES = (50, 90, 99, 99.9)
+
+STAGES = ("wait", "produce", "process", "consume", "loop")
+
+
+def _index(v: int):
+    if v < 2 * SUB_COUNT:
+        return v if v > 0 else 0
+    shift = v.bit_length() - SUB_BITS - 1
+    return min((shift << SUB_BITS) + (v >> shift), HIST_BUCKETS - 1)
+
+
+def _bucket_max(idx: int):
+    if idx < 2 * SUB_COUNT:
+        return idx
+    shift = (idx >> SUB_BITS) - 1
+    return ((idx - (shift << SUB_BITS) + 1) << shift) - 1
+
+
+class Histogram:
+    """Log-linear (HDR-style) histogram of durations in ns.
+
+    There is a single writer, the controller loop, and recording is a couple of
+    integer operations without locks. Readers take a `snapshot()`, which copies
+    the buckets and can be taken from any thread."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * HIST_BUCKETS
+        self.total = 0
+        self.max = 0
+
+    def record(self, v: int):
+        self.counts[_index(v)] += 1
+        self.total += v
+        if v > self.max:
+            self.max = v
+
+    def snapshot(self) -> dict[str, Any]:
+        counts = list(self.counts)
+        n = sum(counts)
+        out: dict[str, Any] = {
+            "count": n,
+            "mean_us": round(self.total / n / 1000, 2) if n else 0,
+            "max_us": round(self.max / 1000, 2),
+        }
+        if not n:
+            for p in PERCENTILES:
+                out[f"p{p}_us"] = 0
+            return out
+
+        targets = [(p, max(1, -int(-n * p // 100))) for p in PERCENTILES]
+        seen = 0
+        i = 0
+        for idx, c in enumerate(counts):
+            if not c:
+                continue
+            seen += c
+            while i < len(targets) and seen >= targets[i][1]:
+                v = min(_bucket_max(idx), self.max)
+                out[f"p{targets[i][0]}_us"] = round(v / 1000, 2)
+                i += 1
+            if i == len(targets):
+                break
+        return out
+
+
+class ProducerStats:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.calls = 0
+        self.events = 0
+        self.latency = Histogram()
+
+
+class PipelineStats:
+    """Counters of a controller loop, written by the `Reactor` of the loop.
+
+    Each iteration is split in stages: `wait` is the time the loop is blocked
+    in the report policy, `produce` the time spent in the producers, `process`
+    the time in the `Multiplexer` and `consume` the rest of the iteration, which
+    is spent in the consumers. `loop` is the time from the wake-up to the end
+    of the iteration, i.e., from reading the devices to writing the reports."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.producers: list[ProducerStats] = []
+        self._reset = False
+        self._clear()
+
+    def _clear(self):
+        self.started = time.perf_counter()
+        self.stages = {s: Histogram() for s in STAGES}
+        for p in self.producers:
+            p.calls = 0
+            p.events = 0
+            p.latency = Histogram()
+        self.process_ns = 0
+        self.wakeups = 0
+        self.timeouts = 0
+        self.coalesced = 0
+        self.overruns = 0
+
+    def add_producer(self, name: str):
+        p = ProducerStats(name)
+        self.producers.append(p)
+        return p
+
+    def reset(self):
+        """Clears the counters. Thread safe, the writer clears them on the
+        next iteration."""
+        self._reset = True
+
+    def check_reset(self):
+        if self._reset:
+            self._reset = False
+            self._clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "elapsed": round(elapsed, 3),
+            "wakeups": self.wakeups,
+            "wakeups_per_s": round(self.wakeups / elapsed, 1),
+            "timeouts": self.timeouts,
+            "coalesced": self.coalesced,
+            "overruns": self.overruns,
+            "stages": {k: v.snapshot() for k, v in self.stages.items()},
+            "producers": {
+                p.name: {
+                    "calls": p.calls,
+                    "events": p.events,
+                    "events_per_s": round(p.events / elapsed, 1),
+                    "latency": p.latency.snapshot(),
+                }
+                for p in self.producers
+            },
+        }
+
+
+_pipelines: dict[str, PipelineStats] = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def register_pipeline(name: str | None = None) -> PipelineStats:
+    """Creates the stats of a controller loop. Loops with the same name (e.g.,
+    after a controller restart) replace the previous ones."""
+    if not name:
+        name = threading.current_thread().name
+    stats = PipelineStats(name)
+    with _lock:
+        _pipelines[name] = stats
+    _local.pipeline = stats
+    return stats
+
+
+def current_pipeline() -> PipelineStats | None:
+    """Returns the stats of the controller loop running on this thread."""
+    return getattr(_local, "pipeline", None)
+
+
+def unregister_pipeline(stats: PipelineStats):
+    with _lock:
+        if _pipelines.get(stats.name, None) is stats:
+            del _pipelines[stats.name]
+    if current_pipeline() is stats:
+        _local.pipeline = None
+
+
+def get_stats(reset: bool = False) -> dict[str, Any]:
+    with _lock:
+        pipelines = list(_pipelines.values())
+    out = {
+        "enabled": STATS_ENABLED,
+        "pipelines": {p.name: p.snapshot() for p in pipelines},
+    }
+    if reset:
+        for p in pipelines:
+            p.reset()
+    return out
+
+
+def count_coalesced(evs: Sequence[dict]) -> int:
+    """Returns the number of axis and button events that are superseded by a
+    later event of the same code in the same iteration, so they never make it
+    to a report."""
+    seen = set()
+    n = 0
+    for ev in evs:
+        if ev["type"] != "axis" and ev["type"] != "button":
+            continue
+        k = (ev["type"], ev["code"])
+        if k in seen:
+            n += 1
+        else:
+            seen.add(k)
+    return n
@@ -0,0 +1,172 @@
+import os
+import select
+import time
+from threading import Lock
+from typing import Any
+
+# Attributes are a single value, most fit in a few bytes
+ATTR_SIZE = 4096
+# sysfs_notify() makes poll() return these for the attribute
+NOTIFY_EVENTS = select.POLLPRI | select.POLLERR
+
+
+class SysfsAttr:
+    """A sysfs attribute that is kept open and re-read with `pread()`, which is
+    a single syscall instead of the open/read/close of `open()`.
+
+    By default, every read returns the current value. With `ttl`, the value is
+    cached for that many seconds. With `notify`, the value is cached until the
+    kernel notifies that the attribute changed (`sysfs_notify()`); only
+    attributes that are documented to support it should use it, as for the rest
+    the value would never update.
+
+    If the device goes away, reads raise and the attribute is reopened on the
+    next read."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float | None = None,
+        notify: bool = False,
+        truncate: bool = False,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.notify = notify
+        # Regular files (e.g., in a fake sysfs tree) keep the old contents
+        # after a shorter write, sysfs attributes do not
+        self.truncate = truncate
+        self.fd = None
+        self.wfd = None
+        self.poller = None
+        self.value = None
+        self.t = 0
+
+    def open(self):
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+            if self.notify:
+                self.poller = select.poll()
+                self.poller.register(self.fd, NOTIFY_EVENTS)
+        return self.fd
+
+    def fileno(self):
+        return self.open()
+
+    def changed(self, timeout: float = 0):
+        """Returns True if the kernel notified that the attribute changed since
+        the last read. Waits up to `timeout` seconds for it."""
+        self.open()
+        assert self.poller, "Attribute does not use notifications."
+        return bool(self.poller.poll(int(timeout * 1000)))
+
+    def read_bytes(self) -> bytes:
+        """Reads the raw value, bypassing the cache."""
+        fd = self.open()
+        try:
+            return os.pread(fd, ATTR_SIZE, 0)
+        except OSError:
+            self.close()
+            raise
+
+    def read(self) -> str:
+        if self.value is not None:
+            if self.notify:
+                if not self.changed():
+                    return self.value
+            elif self.ttl is not None and time.monotonic() - self.t < self.ttl:
+                return self.value
+
+        value = self.read_bytes().decode().strip()
+        if self.notify or self.ttl is not None:
+            self.value = value
+            self.t = time.monotonic()
+        return value
+
+    def read_int(self) -> int:
+        return int(self.read())
+
+    def write(self, val: Any):
+        data = str(val).encode()
+        if self.wfd is None:
+            self.wfd = os.open(self.path, os.O_WRONLY | os.O_CLOEXEC)
+        try:
+            os.pwrite(self.wfd, data, 0)
+            if self.truncate:
+                os.ftruncate(self.wfd, len(data))
+        except OSError:
+            os.close(self.wfd)
+            self.wfd = None
+            raise
+        self.value = None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.wfd is not None:
+            os.close(self.wfd)
+            self.wfd = None
+        self.poller = None
+        self.value = None
+
+
+class SysfsCache:
+    """Keeps the attributes that are read or written by path, so that callers
+    can use paths as with `open()` and still keep the files open.
+
+    Paths are resolved under `root`, so a fake sysfs tree of regular files
+    (e.g., in a temporary directory) can stand in for `/sys`."""
+
+    def __init__(self, root: str = "", ttl: float | None = None) -> None:
+        self.root = root
+        self.ttl = ttl
+        self.attrs: dict[str, SysfsAttr] = {}
+        self.lock = Lock()
+
+    def attr(
+        self, path: str, ttl: float | None = None, notify: bool = False
+    ) -> SysfsAttr:
+        """Returns the attribute for `path`. The cache options of the first call
+        for a path are used."""
+        with self.lock:
+            a = self.attrs.get(path, None)
+            if a is None:
+                fn = os.path.join(self.root, path.lstrip("/")) if self.root else path
+                a = SysfsAttr(
+                    fn,
+                    ttl if ttl is not None else self.ttl,
+                    notify,
+                    truncate=bool(self.root),
+                )
+                self.attrs[path] = a
+            return a
+
+    def read(self, path: str, default: str | None = None, ttl: float | None = None):
+        try:
+            with self.lock:
+                a = self.attrs.get(path, None)
+            if a is None:
+                a = self.attr(path, ttl)
+            return a.read()
+        except Exception as e:
+            if default is not None:
+                return default
+            raise e
+
+    def write(self, path: str, val: Any):
+        self.attr(path).write(val)
+
+    def close(self):
+        with self.lock:
+            for a in self.attrs.values():
+                a.close()
+            self.attrs = {}
+
+
+_cache = SysfsCache()
+
+
+def get_cache() -> SysfsCache:
+    """Returns the cache shared by the daemon."""
+    return _cache
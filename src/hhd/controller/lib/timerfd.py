@@ -0,0 +1,77 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+
+CLOCK_MONOTONIC = 1
+TFD_TIMER_ABSTIME = 1
+TFD_CLOEXEC = os.O_CLOEXEC
+TFD_NONBLOCK = os.O_NONBLOCK
+
+# Reads return the number of expirations since the last read
+EXPIRATIONS = struct.Struct("=Q")
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+class _Itimerspec(ctypes.Structure):
+    _fields_ = [("it_interval", _Timespec), ("it_value", _Timespec)]
+
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        _libc.timerfd_create.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc.timerfd_create.restype = ctypes.c_int
+        _libc.timerfd_settime.argtypes = [
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.POINTER(_Itimerspec),
+            ctypes.POINTER(_Itimerspec),
+        ]
+        _libc.timerfd_settime.restype = ctypes.c_int
+    return _libc
+
+
+def _timespec(ns: int):
+    return _Timespec(ns // 1_000_000_000, ns % 1_000_000_000)
+
+
+def timerfd_create(clock: int = CLOCK_MONOTONIC, flags: int = TFD_CLOEXEC) -> int:
+    """Uses `os.timerfd_create()` on python 3.13+, libc otherwise."""
+    if hasattr(os, "timerfd_create"):
+        return os.timerfd_create(clock, flags=flags)  # type: ignore
+
+    fd = _get_libc().timerfd_create(clock, flags)
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return fd
+
+
+def timerfd_settime_ns(fd: int, flags: int, initial: int, interval: int = 0):
+    """Arms the timer to expire at `initial` ns (absolute with
+    `TFD_TIMER_ABSTIME`) and every `interval` ns after. 0 disarms it."""
+    if hasattr(os, "timerfd_settime_ns"):
+        os.timerfd_settime_ns(fd, flags=flags, initial=initial, interval=interval)  # type: ignore
+        return
+
+    spec = _Itimerspec(_timespec(interval), _timespec(initial))
+    if _get_libc().timerfd_settime(fd, flags, ctypes.byref(spec), None) < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def timerfd_read(fd: int) -> int:
+    """Returns the number of expirations, 0 if the timer is non-blocking and
+    did not expire."""
+    try:
+        return EXPIRATIONS.unpack(os.read(fd, EXPIRATIONS.size))[0]
+    except BlockingIOError:
+        return 0
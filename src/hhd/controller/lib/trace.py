@@ -0,0 +1,322 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import struct
+import time
+from functools import partial
+from threading import Lock
+from typing import Any, Callable, NamedTuple, Sequence
+
+from hhd.controller.base import Consumer, Event, Producer, ReportPolicy
+
+logger = logging.getLogger(__name__)
+
+TRACE_FN = os.environ.get("HHD_TRACE", None)
+
+# The trace is the magic, followed by records with the header below
+# (type, stream id, payload length, timestamp in ns since the start of
+# the recording) and the payload. Stream records have a json payload that
+# describes the producer, data records contain the bytes of a single read.
+TRACE_MAGIC = b"HHDTRACE\x01"
+RECORD = struct.Struct("<BHIq")
+REC_STREAM = 0
+REC_DATA = 1
+
+TraceCallback = Callable[[bytes | memoryview], None]
+
+
+class TraceStream(NamedTuple):
+    id: int
+    kind: str
+    cls: str
+    info: dict[str, Any]
+
+
+class TraceRecorder:
+    """Appends the raw reads of producers to a trace file.
+
+    Producers add a stream when they are opened, which returns the callback
+    to record their reads with. Recording is thread safe, as the device
+    plugins run their controller loops on separate threads."""
+
+    def __init__(self, fn: str) -> None:
+        self.f = open(fn, "wb")
+        self.f.write(TRACE_MAGIC)
+        self.lock = Lock()
+        self.start = time.perf_counter_ns()
+        self.streams = 0
+
+    def add_stream(
+        self, kind: str, producer: Producer, info: dict[str, Any]
+    ) -> TraceCallback:
+        data = json.dumps(
+            {"kind": kind, "cls": type(producer).__name__, "info": info}
+        ).encode()
+        with self.lock:
+            sid = self.streams
+            self.streams += 1
+            self._write(REC_STREAM, sid, data)
+        logger.info(f"Recording {kind} trace of '{type(producer).__name__}'.")
+        return partial(self.write, sid)
+
+    def _write(self, rtype: int, sid: int, data: bytes | memoryview):
+        t = time.perf_counter_ns() - self.start
+        self.f.write(RECORD.pack(rtype, sid, len(data), t))
+        self.f.write(data)
+
+    def write(self, sid: int, data: bytes | memoryview):
+        with self.lock:
+            if not self.f.closed:
+                self._write(REC_DATA, sid, data)
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+
+_recorder = None
+_recorder_lock = Lock()
+
+
+def trace_stream(
+    kind: str, producer: Producer, info: dict[str, Any]
+) -> TraceCallback | None:
+    """Returns the callback the producer should pass its reads to, or None if
+    `HHD_TRACE` is not set."""
+    global _recorder
+    if not TRACE_FN:
+        return None
+
+    with _recorder_lock:
+        if _recorder is None:
+            try:
+                _recorder = TraceRecorder(TRACE_FN)
+                atexit.register(_recorder.close)
+            except Exception as e:
+                logger.error(f"Could not open trace file '{TRACE_FN}':\n{e}")
+                _recorder = False
+        if not _recorder:
+            return None
+    return _recorder.add_stream(kind, producer, info)
+
+
+class TracedDevice:
+    """Wraps a hidraw device to record the reports returned by `read()`."""
+
+    def __init__(self, dev, trace: TraceCallback) -> None:
+        self._dev = dev
+        self._trace = trace
+
+    def read(self, *args, **kwargs):
+        rep = self._dev.read(*args, **kwargs)
+        if rep:
+            self._trace(rep)
+        return rep
+
+    def __getattr__(self, name: str):
+        return getattr(self._dev, name)
+
+
+def read_trace(fn: str) -> tuple[list[TraceStream], list[tuple[int, int, bytes]]]:
+    """Returns the streams and the `(timestamp, stream id, data)` records of a
+    trace. A truncated last record (e.g., from a crash) is ignored."""
+    with open(fn, "rb") as f:
+        data = f.read()
+    if not data.startswith(TRACE_MAGIC):
+        raise ValueError(f"File '{fn}' is not a hhd trace.")
+
+    streams = []
+    records = []
+    ofs = len(TRACE_MAGIC)
+    while ofs + RECORD.size <= len(data):
+        rtype, sid, n, t = RECORD.unpack_from(data, ofs)
+        ofs += RECORD.size
+        if ofs + n > len(data):
+            break
+        payload = data[ofs : ofs + n]
+        ofs += n
+
+        if rtype == REC_STREAM:
+            s = json.loads(payload)
+            streams.append(TraceStream(sid, s["kind"], s["cls"], s["info"]))
+        elif rtype == REC_DATA:
+            records.append((t, sid, payload))
+    return streams, records
+
+
+class ReplayDevice:
+    """Stands in for the device of a producer during replay. Reads return the
+    recorded data, writes are dropped."""
+
+    def __init__(self, fd: int, info: dict[str, Any]) -> None:
+        self.fd = fd
+        self.info = info
+        self.path = info.get("path", "replay")
+
+    def fileno(self):
+        return self.fd
+
+    def read(self, size: int = 4096, timeout=None):
+        try:
+            return os.read(self.fd, size)
+        except BlockingIOError:
+            return b""
+
+    def write(self, data):
+        return len(data)
+
+    def send_feature_report(self, data):
+        return len(data)
+
+    def get_feature_report(self, report_id, size: int = 4096):
+        return b""
+
+    def get_input_report(self, report_id, size: int = 4096):
+        return b""
+
+    def close(self):
+        pass
+
+
+class TracePlayer:
+    """Feeds the records of a trace to the producers bound to its streams.
+
+    Each stream is backed by a `SOCK_SEQPACKET` socket pair, so every read
+    of the producer returns exactly one recorded read, and the producer
+    decodes it with its own code path, as it would with the device."""
+
+    def __init__(self, fn: str) -> None:
+        self.streams, self.records = read_trace(fn)
+        self.pos = 0
+        # sid: (write end, read end)
+        self.socks: dict[int, tuple[socket.socket, socket.socket]] = {}
+        self.bound: dict[int, Producer] = {}
+
+    @property
+    def done(self):
+        return self.pos >= len(self.records)
+
+    @property
+    def next_time(self) -> int | None:
+        if self.done:
+            return None
+        return self.records[self.pos][0]
+
+    def bind(self, producer: Producer) -> ReplayDevice | None:
+        """Returns a device for the first unbound stream that was recorded by
+        a producer of the same class, or None. If the producer has a
+        `matches_trace()` method, the recorded device also has to match its
+        patterns, so producers of the same class (e.g., the evdev devices of
+        a controller) bind to their own stream regardless of order."""
+        matches = getattr(producer, "matches_trace", None)
+        for s in self.streams:
+            if s.id in self.bound or s.cls != type(producer).__name__:
+                continue
+            if matches and not matches(s.info):
+                continue
+            w, r = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            # Large reads of the IMU may not fit in the default buffer
+            w.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+            r.setblocking(False)
+            self.socks[s.id] = (w, r)
+            self.bound[s.id] = producer
+            return ReplayDevice(r.fileno(), s.info)
+        return None
+
+    def unbound(self) -> list[TraceStream]:
+        return [s for s in self.streams if s.id not in self.bound]
+
+    def unbind(self, producer: Producer):
+        for sid, p in list(self.bound.items()):
+            if p is not producer:
+                continue
+            for sock in self.socks.pop(sid):
+                sock.close()
+            del self.bound[sid]
+
+    def feed(self, until: int) -> int:
+        """Sends the records up to timestamp `until` to the bound producers.
+        Returns the number of records."""
+        n = 0
+        records = self.records
+        while self.pos < len(records) and records[self.pos][0] <= until:
+            _, sid, data = records[self.pos]
+            self.pos += 1
+            if sid in self.socks:
+                self.socks[sid][0].send(data)
+                n += 1
+        return n
+
+    def close(self):
+        for sid in list(self.bound):
+            for sock in self.socks.pop(sid):
+                sock.close()
+        self.bound = {}
+
+
+class ReplayProducer(Producer, Consumer):
+    """Runs `producer` on the recorded reads of its stream in `player` instead
+    of its device. The producer supports replay if it accepts a `replay`
+    device in `open()` (hidraw, evdev and IIO producers)."""
+
+    def __init__(self, player: TracePlayer, producer: Producer) -> None:
+        self.player = player
+        self.producer = producer
+
+    def open(self) -> Sequence[int]:
+        dev = self.player.bind(self.producer)
+        if not dev:
+            logger.warning(
+                f"No stream found in trace for '{type(self.producer).__name__}'."
+            )
+            return []
+        self.producer.replay = dev  # type: ignore
+        return self.producer.open()
+
+    def produce(self, fds: Sequence[int]) -> Sequence[Event]:
+        return self.producer.produce(fds)
+
+    def consume(self, events: Sequence[Event]):
+        if isinstance(self.producer, Consumer):
+            self.producer.consume(events)
+
+    def close(self, exit: bool) -> bool:
+        try:
+            return self.producer.close(exit)
+        finally:
+            self.player.unbind(self.producer)
+
+
+class ReplayPolicy(ReportPolicy):
+    """Runs the controller loop on the records of a trace instead of waiting
+    for devices. Each iteration feeds the records of one report period
+    (`1 / freq_max`), which is how the live policies coalesce reads. With
+    `realtime`, the records are fed at the time they were recorded,
+    otherwise as fast as the loop runs."""
+
+    def __init__(
+        self, player: TracePlayer, freq_max: float = 400, realtime: bool = False
+    ) -> None:
+        super().__init__(freq_max=freq_max)
+        self.player = player
+        self.realtime = realtime
+        self.period = int(self.delay_min * 1e9)
+        self.t0 = None
+
+    def wait(self, reactor) -> Sequence[int]:
+        t = self.player.next_time
+        if t is None:
+            return []
+
+        if self.realtime:
+            curr = time.perf_counter_ns()
+            if self.t0 is None:
+                self.t0 = curr - t
+            hold = self.t0 + t - curr
+            if hold > 0:
+                time.sleep(hold / 1e9)
+
+        self.player.feed(t + self.period)
+        return reactor.select(0)
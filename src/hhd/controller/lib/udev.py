@@ -0,0 +1,284 @@
+import errno
+import logging
+import os
+import select
+import socket
+from threading import Lock, Thread
+from typing import Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+NETLINK_KOBJECT_UEVENT = 15
+# Kernel uevents, udev rebroadcasts them under group 2
+UEVENT_GROUP_KERNEL = 1
+UEVENT_BUFFER_SIZE = 16384
+UEVENT_RCVBUF = 1024 * 1024
+
+SYSFS = "/sys"
+DEFAULT_SUBSYSTEMS = ("input", "hidraw", "iio")
+SUBSYSTEM_DIRS = {
+    "input": "/sys/class/input",
+    "hidraw": "/sys/class/hidraw",
+    "iio": "/sys/bus/iio/devices",
+}
+
+Uevent = dict[str, str]
+UeventCallback = Callable[[str, Uevent], None]
+
+
+def parse_uevent(data: bytes) -> tuple[str, Uevent] | None:
+    """Parses a kernel uevent netlink message of the form
+    `action@devpath\\0KEY=VALUE\\0...`. Returns `(action, properties)`."""
+    if data.startswith(b"libudev\0"):
+        # Messages from udev are sent to a different group, skip them
+        return None
+
+    parts = data.split(b"\0")
+    if b"@" not in parts[0]:
+        return None
+
+    props = {}
+    for p in parts[1:]:
+        k, sep, v = p.partition(b"=")
+        if sep:
+            props[k.decode(errors="replace")] = v.decode(errors="replace")
+
+    action = props.get("ACTION", None)
+    if not action:
+        action = parts[0].split(b"@", 1)[0].decode(errors="replace")
+    if "DEVPATH" not in props:
+        props["DEVPATH"] = parts[0].split(b"@", 1)[1].decode(errors="replace")
+    return action, props
+
+
+def read_uevent(devpath: str, subsystem: str | None = None) -> Uevent | None:
+    """Reads the `uevent` file of a device in sysfs, to create the same
+    properties the kernel would send on an add event."""
+    props = {"DEVPATH": devpath}
+    try:
+        with open(os.path.join(SYSFS + devpath, "uevent"), "r") as f:
+            for line in f:
+                k, sep, v = line.rstrip("\n").partition("=")
+                if sep:
+                    props[k] = v
+    except Exception:
+        return None
+
+    if "SUBSYSTEM" not in props:
+        if subsystem:
+            props["SUBSYSTEM"] = subsystem
+        else:
+            try:
+                props["SUBSYSTEM"] = os.path.basename(
+                    os.readlink(os.path.join(SYSFS + devpath, "subsystem"))
+                )
+            except Exception:
+                pass
+    return props
+
+
+def _matches(props: Uevent, subsystem: str | None, match: dict[str, str]):
+    if subsystem and props.get("SUBSYSTEM", None) != subsystem:
+        return False
+    for k, v in match.items():
+        if props.get(k, None) != v:
+            return False
+    return True
+
+
+class UeventMonitor:
+    """Listens to kernel uevents through netlink and keeps a registry of the
+    devices of `subsystems` and their properties, keyed by devpath.
+
+    The monitor can be used from a select loop with `fileno()` and `process()`
+    or run on its own thread with `start()`. Consumers subscribe to add/remove
+    events instead of polling sysfs or `/proc/bus/input/devices`.
+
+    For testing, a datagram socket (e.g., one end of a socketpair) can be
+    provided with `sock` and recorded uevent messages sent through the other end.
+    """
+
+    def __init__(
+        self,
+        subsystems: Sequence[str] = DEFAULT_SUBSYSTEMS,
+        sock: socket.socket | None = None,
+        scan: bool = True,
+    ) -> None:
+        self.subsystems = set(subsystems)
+        self.devices: dict[str, Uevent] = {}
+        self.subscribers: dict[int, tuple[UeventCallback, str | None, dict]] = {}
+        self.lock = Lock()
+        self._sub_id = 0
+        self._t = None
+        self._wake = None
+
+        if sock is None:
+            sock = socket.socket(
+                socket.AF_NETLINK,
+                socket.SOCK_RAW | socket.SOCK_CLOEXEC,
+                NETLINK_KOBJECT_UEVENT,
+            )
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_RCVBUF)
+            except Exception:
+                pass
+            sock.bind((0, UEVENT_GROUP_KERNEL))
+        sock.setblocking(False)
+        self.sock = sock
+
+        # Bind before scanning so that no devices are missed
+        if scan:
+            self.scan()
+
+    def scan(self):
+        """Populates the registry from sysfs."""
+        devices = {}
+        for subsystem in self.subsystems:
+            base = SUBSYSTEM_DIRS.get(subsystem, f"/sys/class/{subsystem}")
+            try:
+                names = os.listdir(base)
+            except Exception:
+                continue
+            for name in names:
+                try:
+                    devpath = os.path.realpath(os.path.join(base, name))
+                except Exception:
+                    continue
+                if not devpath.startswith(SYSFS + "/"):
+                    continue
+                props = read_uevent(devpath[len(SYSFS) :], subsystem)
+                if props:
+                    devices[props["DEVPATH"]] = props
+
+        with self.lock:
+            self.devices = devices
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def process(self) -> list[tuple[str, Uevent]]:
+        """Reads all pending uevents, updates the registry and notifies the
+        subscribers. Returns the processed events."""
+        out = []
+        while True:
+            try:
+                data = self.sock.recv(UEVENT_BUFFER_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                # The kernel dropped events. Rescan to catch up
+                logger.warning(f"Uevent socket overrun, rescanning. Error:\n{e}")
+                self.scan()
+                continue
+            if not data:
+                break
+
+            ev = parse_uevent(data)
+            if not ev:
+                continue
+            action, props = ev
+            if props.get("SUBSYSTEM", None) not in self.subsystems:
+                continue
+
+            devpath = props["DEVPATH"]
+            with self.lock:
+                if action == "remove":
+                    old = self.devices.pop(devpath, None)
+                    if old:
+                        # Keep the properties of the device around for callbacks
+                        props = {**old, **props}
+                else:
+                    self.devices[devpath] = props
+                subs = list(self.subscribers.values())
+
+            out.append((action, props))
+            for cb, subsystem, match in subs:
+                if not _matches(props, subsystem, match):
+                    continue
+                try:
+                    cb(action, props)
+                except Exception as e:
+                    logger.error(f"Uevent subscriber failed with error:\n{e}")
+        return out
+
+    def subscribe(
+        self, cb: UeventCallback, subsystem: str | None = None, **match: str
+    ) -> int:
+        """Calls `cb(action, props)` for the events of the devices that belong to
+        `subsystem` and whose properties equal `match`. Returns an id
+        for `unsubscribe()`."""
+        with self.lock:
+            self._sub_id += 1
+            self.subscribers[self._sub_id] = (cb, subsystem, match)
+            return self._sub_id
+
+    def unsubscribe(self, sub: int):
+        with self.lock:
+            self.subscribers.pop(sub, None)
+
+    def match(self, subsystem: str | None = None, **match: str) -> list[Uevent]:
+        """Returns the devices in the registry that belong to `subsystem` and
+        whose properties equal `match`, sorted by devpath."""
+        with self.lock:
+            return [
+                v
+                for k, v in sorted(self.devices.items())
+                if _matches(v, subsystem, match)
+            ]
+
+    def get(self, devpath: str) -> Uevent | None:
+        with self.lock:
+            return self.devices.get(devpath, None)
+
+    def _loop(self):
+        assert self._wake
+        wake = self._wake[0]
+        while True:
+            r, _, _ = select.select([self.sock, wake], [], [])
+            if wake in r:
+                break
+            try:
+                self.process()
+            except Exception as e:
+                # The socket is unusable, stop instead of spinning on it
+                logger.error(f"Uevent monitor failed with error:\n{e}")
+                break
+
+    def start(self):
+        """Processes events on a background thread."""
+        if self._t:
+            return
+        self._wake = os.pipe()
+        self._t = Thread(target=self._loop, daemon=True)
+        self._t.start()
+
+    def close(self):
+        if self._t and self._wake:
+            os.write(self._wake[1], b"\0")
+            self._t.join()
+            os.close(self._wake[0])
+            os.close(self._wake[1])
+            self._t = None
+            self._wake = None
+        self.sock.close()
+
+
+_monitor = None
+_monitor_lock = Lock()
+
+
+def get_monitor() -> UeventMonitor | None:
+    """Returns the shared uevent monitor, running on a background thread.
+    Returns None if netlink is not available (e.g., in containers)."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            try:
+                _monitor = UeventMonitor()
+                _monitor.start()
+            except Exception as e:
+                logger.warning(f"Could not start uevent monitor. Error:\n{e}")
+                _monitor = False
+        return _monitor or None
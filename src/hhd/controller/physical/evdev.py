@@ -3,6 +3,7 @@ import logging
 import os
 import re
 import stat
+import struct
 import subprocess
 import time
 from typing import Collection, Mapping, Sequence, TypeVar, cast
@@ -15,6 +16,7 @@ from hhd.controller.base import Event
 from hhd.controller.const import AbsAxis, GamepadButton, KeyboardButton
 from hhd.controller.lib.common import hexify, matches_patterns
 from hhd.controller.lib.hide import hide_gamepad, unhide_gamepad
+from hhd.controller.lib.trace import trace_stream
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +27,15 @@ def B(b: str):
 
 A = TypeVar("A")
 
+# struct input_event, read straight from the device fd
+INPUT_EVENT = struct.Struct("llHHi")
+MAX_READ_EVENTS = 64
+
+EV_ABS = B("EV_ABS")
+EV_KEY = B("EV_KEY")
+EV_MSC = B("EV_MSC")
+KEY_LEFTMETA = B("KEY_LEFTMETA")
+
 
 def to_map(b: dict[A, Sequence[int]]) -> dict[int, A]:
     out = {}
@@ -265,29 +276,59 @@ class GenericGamepadEvdev(Producer, Consumer):
         self.queue = []
         self.postprocess = postprocess
         self.start_pressed = None
+        # Device with recorded events, see `hhd.controller.lib.trace`
+        self.replay = None
+        self.trace = None
+
+    def _setup(self):
+        self.started = True
+        self.effect_id = -1
+        self.queue = []
+        self.buf = memoryview(bytearray(INPUT_EVENT.size * MAX_READ_EVENTS))
+
+    def _matches_info(self, info: dict) -> bool:
+        return (
+            matches_patterns(info.get("vendor", ""), self.vid)
+            and matches_patterns(info.get("product", ""), self.pid)
+            and matches_patterns(info.get("name", ""), self.name)
+        )
+
+    def _matches_caps(self, dev_cap: Mapping[int, Sequence[int]]) -> bool:
+        for cap_id, caps in self.capabilities.items():
+            if cap_id not in dev_cap:
+                return False
+            # Only the first code of each type is checked
+            for cap in caps:
+                if cap not in dev_cap[cap_id]:
+                    return False
+                break
+        return True
+
+    def matches_trace(self, info: dict) -> bool:
+        """Checks a recorded device (see `hhd.controller.lib.trace`) against
+        the patterns of the producer. Capabilities are checked if recorded."""
+        caps = info.get("capabilities", None)
+        return self._matches_info(info) and (
+            caps is None or self._matches_caps({int(k): v for k, v in caps.items()})
+        )
 
     def open(self) -> Sequence[int]:
+        if self.replay:
+            self.dev = cast(evdev.InputDevice, self.replay)
+            self.ranges = {int(k): v for k, v in self.replay.info["ranges"].items()}
+            self.supports_vibration = False
+            self.fd = self.replay.fd
+            self._setup()
+            return [self.fd]
+
         for d, info in list_evs(filter_valid=True).items():
-            if not matches_patterns(info.get("vendor", ""), self.vid):
-                continue
-            if not matches_patterns(info.get("product", ""), self.pid):
-                continue
-            if not matches_patterns(info.get("name", ""), self.name):
+            if not self._matches_info(info):
                 continue
             dev = evdev.InputDevice(d)
-            if self.capabilities:
-                matches = True
-                dev_cap = cast(dict[int, Sequence[int]], dev.capabilities())
-                for cap_id, caps in self.capabilities.items():
-                    if cap_id not in dev_cap:
-                        matches = False
-                        break
-                    for cap in caps:
-                        if cap not in dev_cap[cap_id]:
-                            matches = False
-                        break
-                if not matches:
-                    continue
+            if self.capabilities and not self._matches_caps(
+                cast(dict[int, Sequence[int]], dev.capabilities())
+            ):
+                continue
 
             # hide_gamepad will destroy the current fds, so run it before
             # creating the final device
@@ -316,9 +357,19 @@ class GenericGamepadEvdev(Producer, Consumer):
                 }
                 self.supports_vibration = B("EV_FF") in dev.capabilities()
                 self.fd = self.dev.fd
-                self.started = True
-                self.effect_id = -1
-                self.queue = []
+                self._setup()
+                self.trace = trace_stream(
+                    "evdev",
+                    self,
+                    {
+                        "path": d,
+                        "name": info.get("name", ""),
+                        "vendor": info.get("vendor", 0),
+                        "product": info.get("product", 0),
+                        "ranges": self.ranges,
+                        "capabilities": self.dev.capabilities(absinfo=False),
+                    },
+                )
             except Exception as e:
                 # Prevent leftover rules in case of error
                 if self.hidden:
@@ -401,7 +452,7 @@ class GenericGamepadEvdev(Producer, Consumer):
             out.append(
                 {
                     "type": "button",
-                    "code": self.btn_map[B("KEY_LEFTMETA")],
+                    "code": self.btn_map[KEY_LEFTMETA],
                     "value": True,
                 }
             )
@@ -419,40 +470,43 @@ class GenericGamepadEvdev(Producer, Consumer):
                 }
             )
 
+        # Parse the input_event records directly instead of creating an
+        # evdev InputEvent object per event
         while can_read(self.fd):
-            for e in self.dev.read():
-                if e.type == B("EV_KEY"):
-                    if e.code in self.btn_map:
+            n = os.readv(self.fd, [self.buf])
+            if self.trace:
+                self.trace(self.buf[:n])
+            for _, _, etype, code, value in INPUT_EVENT.iter_unpack(self.buf[:n]):
+                if etype == EV_KEY:
+                    if code in self.btn_map:
                         # Only 1 is valid for press (look at sysrq)
-                        if e.code == B("KEY_LEFTMETA") and e.value:
+                        if code == KEY_LEFTMETA and value:
                             # start requires special handling
                             # If it exists on the button map, it may
                             # also be used for other shortcuts.
                             # So we have to wait a bit to see if it is
                             # a standalone press
                             self.start_pressed = curr
-                        elif e.value == 0 or e.value == 1:
+                        elif value == 0 or value == 1:
                             out.append(
                                 {
                                     "type": "button",
-                                    "code": self.btn_map[e.code],
-                                    "value": bool(e.value),
+                                    "code": self.btn_map[code],
+                                    "value": bool(value),
                                 }
                             )
                             self.start_pressed = None
-                elif e.type == B("EV_ABS"):
-                    if e.code in self.axis_map:
-                        ax = self.axis_map[e.code]
+                elif etype == EV_ABS:
+                    if code in self.axis_map:
+                        ax = self.axis_map[code]
                         if ax in self.postprocess and self.postprocess[ax].get(
                             "zero_is_middle", False
                         ):
-                            mmax = self.ranges[e.code][1] + 1
-                            val = (e.value - mmax // 2 + 1) / mmax * 2
+                            mmax = self.ranges[code][1] + 1
+                            val = (value - mmax // 2 + 1) / mmax * 2
                         else:
                             # Normalize
-                            val = e.value / abs(
-                                self.ranges[e.code][1 if e.value >= 0 else 0]
-                            )
+                            val = value / abs(self.ranges[code][1 if value >= 0 else 0])
 
                         # Calibrate
                         if ax in self.postprocess:
@@ -478,12 +532,12 @@ class GenericGamepadEvdev(Producer, Consumer):
                                 "value": val,
                             }
                         )
-                elif e.type == B("EV_MSC"):
-                    if e.code in self.msc_map:
+                elif etype == EV_MSC:
+                    if code in self.msc_map:
                         out.append(
                             {
                                 "type": "button",
-                                "code": self.btn_map[e.code],
+                                "code": self.btn_map[code],
                                 "value": True,
                             }
                         )
@@ -491,7 +545,7 @@ class GenericGamepadEvdev(Producer, Consumer):
                             (
                                 {
                                     "type": "button",
-                                    "code": self.btn_map[e.code],
+                                    "code": self.btn_map[code],
                                     "value": False,
                                 },
                                 curr + self.msc_delay,
@@ -1,6 +1,6 @@
 import logging
 import re
-from typing import Any, Literal, NamedTuple, Protocol, Sequence
+from typing import Any, Literal, NamedTuple, Protocol, Sequence, cast
 
 from hhd.controller import (
     Axis,
@@ -16,13 +16,12 @@ from hhd.controller.lib.common import (
     AM,
     BM,
     CM,
-    decode_axis,
-    decode_config,
-    get_button,
+    ReportDecoder,
     hexify,
     matches_patterns,
 )
-from hhd.controller.lib.hid import MAX_REPORT_SIZE, Device, enumerate_unique
+from hhd.controller.lib.hid import MAX_REPORT_SIZE, Device, enumerate_cache
+from hhd.controller.lib.trace import TracedDevice, trace_stream
 
 logger = logging.getLogger(__name__)
 
@@ -71,37 +70,66 @@ class GenericGamepadHidraw(Producer, Consumer):
         self.fd = 0
 
         self.report = None
+        self.decoders: dict[int | None, ReportDecoder] = {}
+        # Device with recorded reports, see `hhd.controller.lib.trace`
+        self.replay = None
+
+    def matches_trace(self, d: dict) -> bool:
+        """Checks the info of a device (or of a recorded one, see
+        `hhd.controller.lib.trace`) against the patterns of the producer."""
+        return (
+            matches_patterns(d["vendor_id"], self.vid)
+            and matches_patterns(d["product_id"], self.pid)
+            and matches_patterns(d["manufacturer_string"], self.manufacturer)
+            and matches_patterns(d["product_string"], self.product)
+            and matches_patterns(d["usage_page"], self.usage_page)
+            and matches_patterns(d["usage"], self.usage)
+            and (
+                self.interface is None
+                or d.get("interface_number", None) == self.interface
+            )
+        )
 
     def open(self) -> Sequence[int]:
-        for d in enumerate_unique():
-            if not matches_patterns(d["vendor_id"], self.vid):
-                continue
-            if not matches_patterns(d["product_id"], self.pid):
-                continue
-            if not matches_patterns(d["manufacturer_string"], self.manufacturer):
-                continue
-            if not matches_patterns(d["product_string"], self.product):
-                continue
-            if not matches_patterns(d["usage_page"], self.usage_page):
-                continue
-            if not matches_patterns(d["usage"], self.usage):
-                continue
-            if (
-                self.interface is not None
-                and d.get("interface_number", None) != self.interface
-            ):
+        if self.replay:
+            devs = [self.replay.info]
+        else:
+            devs = enumerate_cache.lookup(
+                self.vid, self.pid, self.usage_page, self.usage, self.interface
+            )
+        for d in devs:
+            if not self.matches_trace(d):
                 continue
             self.path = d["path"]
-            self.dev = Device(path=self.path)
+            if self.replay:
+                self.dev = cast(Device, self.replay)
+            else:
+                self.dev = Device(path=self.path)
+                trace = trace_stream(
+                    "hidraw",
+                    self,
+                    {
+                        **d,
+                        "path": d["path"].decode(errors="replace"),
+                        "report_size": self.report_size,
+                    },
+                )
+                if trace:
+                    self.dev = cast(Device, TracedDevice(self.dev, trace))
             self.fd = self.dev.fd
             logger.info(
                 f"Found device {hexify(d['vendor_id'])}:{hexify(d['product_id'])}:\n"
                 + f"'{d['manufacturer_string']}': '{d['product_string']}' at {d['path']}"
             )
             self.report = None
-            self.prev_btn = {}
-            self.prev_axis = {}
-            self.prev_config = {}
+            self.decoders = {
+                rep_id: ReportDecoder(
+                    self.btn_map.get(rep_id, {}),
+                    self.axis_map.get(rep_id, {}),
+                    self.config_map.get(rep_id, {}),
+                )
+                for rep_id in {*self.btn_map, *self.axis_map, *self.config_map}
+            }
             return [self.fd]
 
         err = f"Device with the following not found:\n"
@@ -150,34 +178,10 @@ class GenericGamepadHidraw(Producer, Consumer):
         if None in self.btn_map or None in self.axis_map:
             rep_id = None
 
-        # Decode buttons
-        out: list[Event] = []
-        if rep_id in self.btn_map:
-            for btn, map in self.btn_map[rep_id].items():
-                val = get_button(rep, map)
-                if btn in self.prev_btn and self.prev_btn[btn] == val:
-                    continue
-                self.prev_btn[btn] = val
-                out.append({"type": "button", "code": btn, "value": val})
-
-        # Decode Axis
-        if rep_id in self.axis_map:
-            for ax, map in self.axis_map[rep_id].items():
-                val = decode_axis(rep, map)
-                if ax in self.prev_axis and self.prev_axis[ax] == val:
-                    continue
-                self.prev_axis[ax] = val
-                out.append({"type": "axis", "code": ax, "value": val})
-
-        # Decode
-        if rep_id in self.config_map:
-            for cnf, map in self.config_map[rep_id].items():
-                val = decode_config(rep, map)
-                if cnf in self.prev_config and self.prev_config[cnf] == val:
-                    continue
-                self.prev_config[cnf] = val
-                out.append({"type": "configuration", "code": cnf, "value": val})
-        return out
+        decoder = self.decoders.get(rep_id, None)
+        if not decoder:
+            return []
+        return decoder.decode(rep)
 
     def consume(self, events: Sequence[Event]):
         if self.callback and self.dev:
@@ -1,10 +1,24 @@
 import logging
 import os
 import select
+import struct
+import time
 from threading import Event as TEvent, Thread
 from typing import Any, Generator, Literal, NamedTuple, Sequence
 
 from hhd.controller import Axis, Event, Producer
+from hhd.controller.lib.stats import Histogram
+from hhd.controller.lib.sysfs import SysfsAttr
+from hhd.controller.lib.timerfd import (
+    CLOCK_MONOTONIC,
+    TFD_CLOEXEC,
+    TFD_NONBLOCK,
+    TFD_TIMER_ABSTIME,
+    timerfd_create,
+    timerfd_read,
+    timerfd_settime_ns,
+)
+from hhd.controller.lib.trace import trace_stream
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +49,8 @@ GYRO_NAMES = ["gyro_3d"]
 # FIXME: this :00 needs to be cleaned up
 IMU_NAMES = ["bmi323-imu", "BMI0160", "BMI0260", "i2c-10EC5280:00", "i2c-BOSC0260:00"]
 SYSFS_TRIG_CONFIG_DIR = os.environ.get("HHD_MOUNT_TRIG_SYSFS", "/var/trig_sysfs_config")
+# How often (ms) the trigger thread checks if it should stop, if ticks stall
+TRIGGER_POLL_TIMEOUT = 100
 
 ACCEL_MAPPINGS: dict[str, tuple[Axis, str | None, float, float | None]] = {
     "accel_x": ("accel_z", "accel", 1, None),
@@ -248,6 +264,74 @@ def get_size(dev: DeviceInfo):
     return out >> 3
 
 
+SCAN_FORMATS = {8: "b", 16: "h", 32: "i", 64: "q"}
+MAX_SCANS_PER_READ = 64
+
+
+class ScanParser:
+    """Unpacks batches of IIO scans with precompiled structs.
+
+    One struct is compiled per byte order present in the scan, spanning a
+    whole scan, with the elements that are not mapped to an axis (and the
+    elements of the other byte order) skipped as padding. Shift and bit
+    masking are not applied, as before."""
+
+    def __init__(self, dev: DeviceInfo) -> None:
+        # Byte offset of each element, with the alignment of `get_size`
+        ofs = 0
+        align = 1
+        offsets = []
+        for se in dev.axis:
+            if ofs % se.storage_bits:
+                ofs = (ofs // se.storage_bits + 1) * se.storage_bits
+            offsets.append(ofs >> 3)
+            ofs += se.storage_bits
+            align = max(align, se.storage_bits >> 3)
+        # The kernel pads the scan to its largest element
+        self.size = -(-(ofs >> 3) // align) * align
+
+        self.structs: list[struct.Struct] = []
+        # (value index, element), in scan order
+        self.elements: list[tuple[int, ScanElement]] = []
+        idx = {}
+        cnt = 0
+        for order, prefix in (("little", "<"), ("big", ">")):
+            fmt = prefix
+            pos = 0
+            for i, (o, se) in enumerate(zip(offsets, dev.axis)):
+                if not se.axis or se.endianness != order:
+                    continue
+                c = SCAN_FORMATS[se.storage_bits]
+                fmt += "x" * (o - pos) + (c if se.signed else c.upper())
+                pos = o + (se.storage_bits >> 3)
+                idx[i] = cnt
+                cnt += 1
+            if pos:
+                self.structs.append(struct.Struct(fmt + "x" * (self.size - pos)))
+        self.elements = [(idx[i], se) for i, se in enumerate(dev.axis) if i in idx]
+
+    def unpack(self, data) -> list[tuple]:
+        """Unpacks `data`, which should contain a whole number of scans, into
+        a tuple of raw values per scan, indexed by `elements`."""
+        if len(self.structs) == 1:
+            return list(self.structs[0].iter_unpack(data))
+        return [
+            sum(vals, ())
+            for vals in zip(*(st.iter_unpack(data) for st in self.structs))
+        ]
+
+
+def is_legion_overflow(d_raw: float):
+    # Legion go likes to overflow to -124 in both directions
+    # skip this number to avoid jitters
+    # With a kernel patch to allow higher resolution, this happens
+    # with the following numbers
+    # 4d 95 f3 c7: -124715
+    # 33 97 f3 c7: -124718
+    # Reported by hhd: -124422, -124419
+    return d_raw == -124 or d_raw // 1000 == -125
+
+
 class IioReader(Producer):
     def __init__(
         self,
@@ -258,6 +342,7 @@ class IioReader(Producer):
         mappings: dict[str, tuple[Axis, str | None, float, float | None]],
         update_trigger: bool = False,
         legion_fix: bool = False,
+        reduce: Literal["latest", "mean"] = "latest",
     ) -> None:
         self.types = types
         self.attr = attr
@@ -268,8 +353,21 @@ class IioReader(Producer):
         self.fd = -1
         self.dev = None
         self.legion_fix = legion_fix
+        self.reduce = reduce
+        # Device with recorded scans, see `hhd.controller.lib.trace`
+        self.replay = None
+        self.trace = None
 
     def open(self):
+        if self.replay:
+            info = self.replay.info
+            self.dev = DeviceInfo(
+                info["dev"], [ScanElement(*se) for se in info["axis"]], info["sysfs"]
+            )
+            self.fd = self.replay.fd
+            self._setup()
+            return [self.fd]
+
         sens_dir, type = find_sensor(self.types)
         if not sens_dir or not type:
             return []
@@ -291,15 +389,31 @@ class IioReader(Producer):
             )
             return []
 
-        self.buf = None
-        self.prev = {}
         self.dev = dev
         self.fd = os.open(dev.dev, os.O_RDONLY)
-        self.size = get_size(dev)
+        self._setup()
+        self.trace = trace_stream(
+            "iio",
+            self,
+            {"dev": dev.dev, "axis": dev.axis, "sysfs": dev.sysfs},
+        )
 
         return [self.fd]
 
+    def _setup(self):
+        assert self.dev
+        self.buf = None
+        self.prev = {}
+        self.parser = ScanParser(self.dev)
+        self.size = self.parser.size
+        self.rbuf = bytearray(self.size * MAX_SCANS_PER_READ)
+
     def close(self, exit: bool):
+        if self.replay:
+            # The replayed fd is owned by the trace player
+            self.dev = None
+            self.fd = -1
+            return True
         try:
             if self.dev:
                 close_dev(self.dev)
@@ -314,61 +428,73 @@ class IioReader(Producer):
         if self.fd not in fds or not self.dev:
             return []
 
-        data = os.read(self.fd, self.size)
-        if self.buf == data:
+        # Read all pending scans at once, the kernel returns whole scans
+        n = os.readv(self.fd, [self.rbuf])
+        if self.trace:
+            self.trace(memoryview(self.rbuf)[:n])
+        # If the buffer filled up, keep the newest scans
+        while n == len(self.rbuf) and select.select([self.fd], [], [], 0)[0]:
+            n = os.readv(self.fd, [self.rbuf])
+            if self.trace:
+                self.trace(memoryview(self.rbuf)[:n])
+        n -= n % self.size
+        if not n:
             return []
-        self.buf = data
 
-        # Empty the buffer preventing repeated calls
-        while select.select([self.fd], [], [], 0)[0]:
-            data = os.read(self.fd, self.size)
+        data = memoryview(self.rbuf)[:n]
+        last = data[n - self.size :]
+        if self.buf == last:
+            return []
+        self.buf = bytes(last)
 
-        out: list[Event] = []
-        ofs = 0
-        for se in self.dev.axis:
-            # Align bytes
-            if ofs % se.storage_bits:
-                ofs = (ofs // se.storage_bits + 1) * se.storage_bits
+        scans = self.parser.unpack(data)
+        latest = scans[-1]
 
-            # Grab value if required
-            if se.axis:
-                # TODO: Implement parsing iio fully, by adding shifting and cutoff
-                d = data[ofs >> 3 : (ofs >> 3) + (se.storage_bits >> 3)]
-                d_raw = int.from_bytes(d, byteorder=se.endianness, signed=se.signed)
-                # d = d >> se.shift
-                # d &= (1 << se.bits) - 1
-                d = d_raw * se.scale + se.offset
-
-                if se.max_val is not None:
-                    if d > 0:
-                        d = min(d, se.max_val)
-                    else:
-                        d = max(d, -se.max_val)
-
-                if se.axis not in self.prev or self.prev[se.axis] != d:
-                    if not (
-                        self.legion_fix and (d_raw == -124 or d_raw // 1000 == -125)
-                    ):
-                        # Legion go likes to overflow to -124 in both directions
-                        # skip this number to avoid jitters
-                        # With a kernel patch to allow higher resolution, this happens
-                        # with the following numbers
-                        # 4d 95 f3 c7: -124715
-                        # 33 97 f3 c7: -124718
-                        # Reported by hhd: -124422, -124419
-                        # Legion go axis tester
-                        # import time
-                        # if se.axis == "gyro_x":
-                        #     print(f"{time.time() % 1:.3f} {d_raw}")
-                        out.append(
-                            {
-                                "type": "axis",
-                                "code": se.axis,
-                                "value": d,
-                            }
-                        )
-                    self.prev[se.axis] = d
-            ofs += se.storage_bits
+        out: list[Event] = []
+        for idx, se in self.parser.elements:
+            d_raw = latest[idx]
+            skip = self.legion_fix and is_legion_overflow(d_raw)
+
+            if (
+                self.reduce == "mean"
+                and len(scans) > 1
+                and se.axis
+                and not se.axis.endswith("_ts")
+            ):
+                vals = [
+                    s[idx]
+                    for s in scans
+                    if not (self.legion_fix and is_legion_overflow(s[idx]))
+                ]
+                if vals:
+                    d_raw = sum(vals) / len(vals)
+                    skip = False
+
+            # TODO: Implement parsing iio fully, by adding shifting and cutoff
+            # d = d >> se.shift
+            # d &= (1 << se.bits) - 1
+            d = d_raw * se.scale + se.offset
+
+            if se.max_val is not None:
+                if d > 0:
+                    d = min(d, se.max_val)
+                else:
+                    d = max(d, -se.max_val)
+
+            if se.axis not in self.prev or self.prev[se.axis] != d:
+                if not skip:
+                    # Legion go axis tester
+                    # import time
+                    # if se.axis == "gyro_x":
+                    #     print(f"{time.time() % 1:.3f} {d_raw}")
+                    out.append(
+                        {
+                            "type": "axis",
+                            "code": se.axis,
+                            "value": d,
+                        }
+                    )
+                self.prev[se.axis] = d
 
         # TODO: Clean this up
         # Hide duplicate events
@@ -378,15 +504,27 @@ class IioReader(Producer):
 
 
 class AccelImu(IioReader):
-    def __init__(self, freq=None, scale=None) -> None:
+    def __init__(
+        self, freq=None, scale=None, reduce: Literal["latest", "mean"] = "latest"
+    ) -> None:
         super().__init__(
-            ACCEL_NAMES, ["accel"], [freq] if freq else None, [scale], ACCEL_MAPPINGS
+            ACCEL_NAMES,
+            ["accel"],
+            [freq] if freq else None,
+            [scale],
+            ACCEL_MAPPINGS,
+            reduce=reduce,
         )
 
 
 class GyroImu(IioReader):
     def __init__(
-        self, freq=None, scale=None, map=None, legion_fix: bool = False
+        self,
+        freq=None,
+        scale=None,
+        map=None,
+        legion_fix: bool = False,
+        reduce: Literal["latest", "mean"] = "latest",
     ) -> None:
         super().__init__(
             GYRO_NAMES,
@@ -395,6 +533,7 @@ class GyroImu(IioReader):
             [scale],
             map if map else GYRO_MAPPINGS,
             legion_fix=legion_fix,
+            reduce=reduce,
         )
 
 
@@ -405,6 +544,7 @@ class CombinedImu(IioReader):
         map: dict[str, tuple[Axis, str | None, float, float | None]] | None = None,
         gyro_scale: str | None = None,
         accel_scale: str | None = None,
+        reduce: Literal["latest", "mean"] = "latest",
     ) -> None:
         super().__init__(
             IMU_NAMES,
@@ -412,17 +552,18 @@ class CombinedImu(IioReader):
             [freq, freq] if freq else None,
             [gyro_scale, accel_scale],
             map if map is not None else BMI_MAPPINGS,
+            reduce=reduce,
         )
 
 
 class ForcedSampler:
     def __init__(self, devices: Sequence[str], keep_fds: bool = False) -> None:
         self.devices = devices
-        self.fds = []
+        self.attrs = []
         self.keep_fds = keep_fds
 
     def open(self):
-        self.fds = []
+        self.attrs = []
         self.paths = []
         for d in self.devices:
             f, _ = find_sensor([d])
@@ -437,22 +578,20 @@ class ForcedSampler:
 
             self.paths.append(p)
             if self.keep_fds:
-                self.fds.append(os.open(p, os.O_RDONLY | os.O_NONBLOCK))
+                self.attrs.append(SysfsAttr(p))
 
     def sample(self):
         if self.keep_fds:
-            for fd in select.select(self.fds, [], [], 0)[0]:
-                os.read(fd, 20)
-            for fd in select.select(self.fds, [], [], 0)[0]:
-                os.lseek(fd, 0, os.SEEK_SET)
+            for a in self.attrs:
+                a.read_bytes()
         else:
             for p in self.paths:
                 with open(p, "rb") as f:
                     f.read()
 
     def close(self):
-        for fd in self.fds:
-            os.close(fd)
+        for a in self.attrs:
+            a.close()
 
 
 class HrtimerTrigger(IioReader):
@@ -571,10 +710,8 @@ class HrtimerTrigger(IioReader):
             logger.error(f"Could not delete hrtimer trigger. Error:\n{e}")
 
 
-def _sysfs_trig_sampler(ev: TEvent, trigger: int, rate: int = 65):
-    import time
-
-    trig = None
+def _find_sysfs_trigger(trigger: int) -> str | None:
+    """Returns the `trigger_now` attribute of sysfs trigger `trigger`."""
     for fn in os.listdir("/sys/bus/iio/devices/"):
         if not fn.startswith("trigger"):
             continue
@@ -583,28 +720,101 @@ def _sysfs_trig_sampler(ev: TEvent, trigger: int, rate: int = 65):
             name = f.read().strip()
 
         if name == f"sysfstrig{trigger}":
-            trig = os.path.join(tmp, "trigger_now")
-            break
+            return os.path.join(tmp, "trigger_now")
+    return None
 
-    if trig is None:
-        logger.warning(f"Trigger `sysfstrig{trigger}` not found.")
-        return
 
-    fd = -1
-    delay = 1 / rate
-    try:
-        fd = os.open(trig, os.O_WRONLY)
-        while not ev.is_set():
-            os.write(fd, b"1")
-            os.lseek(fd, 0, os.SEEK_SET)
-            time.sleep(delay)
-    except KeyboardInterrupt:
-        raise
-    except Exception as e:
-        logger.warning(f"Trig sampler failed with error:\n{e}")
-    finally:
-        if fd != -1:
-            os.close(fd)
+class TriggerTimer(Producer):
+    """Fires a sysfs trigger (writes to `trigger_now`) at `rate`.
+
+    Ticks come from a timerfd that is armed with absolute deadlines, so the
+    rate does not drift by the time it takes to fire, as it does when sleeping
+    between writes. If ticks are missed (e.g., the loop was busy), the trigger
+    fires once for all of them and they are counted.
+
+    The timer can be prepared in the controller loop as a producer or run on its
+    own thread with `run()`."""
+
+    def __init__(self, path: str, rate: float) -> None:
+        self.path = path
+        self.rate = rate
+        self.period = int(1e9 / rate)
+        self.fd = -1
+        self.attr = None
+        self.start = 0
+        self.expirations = 0
+        self.fired = 0
+        self.missed = 0
+        # Time from the deadline to firing, in ns
+        self.jitter = Histogram()
+
+    def open(self) -> Sequence[int]:
+        self.attr = SysfsAttr(self.path)
+        self.fd = timerfd_create(CLOCK_MONOTONIC, TFD_CLOEXEC | TFD_NONBLOCK)
+        self.expirations = 0
+        self.fired = 0
+        self.missed = 0
+        self.jitter = Histogram()
+        self.start = time.monotonic_ns() + self.period
+        timerfd_settime_ns(self.fd, TFD_TIMER_ABSTIME, self.start, self.period)
+        return [self.fd]
+
+    def fire(self) -> bool:
+        n = timerfd_read(self.fd)
+        if not n:
+            return False
+        curr = time.monotonic_ns()
+        self.expirations += n
+        self.missed += n - 1
+        deadline = self.start + (self.expirations - 1) * self.period
+        self.jitter.record(curr - deadline)
+
+        assert self.attr
+        self.attr.write(1)
+        self.fired += 1
+        return True
+
+    def produce(self, fds: Sequence[int]) -> Sequence[Event]:
+        if self.fd in fds:
+            self.fire()
+        return []
+
+    def run(self, ev: TEvent):
+        """Fires the trigger until `ev` is set. Call `open()` first."""
+        poll = select.poll()
+        poll.register(self.fd, select.POLLIN)
+        try:
+            while not ev.is_set():
+                if poll.poll(TRIGGER_POLL_TIMEOUT):
+                    self.fire()
+        except Exception as e:
+            logger.warning(f"Trig sampler failed with error:\n{e}")
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = (time.monotonic_ns() - self.start + self.period) / 1e9
+        return {
+            "rate": self.rate,
+            "achieved_rate": round(self.fired / elapsed, 1) if elapsed > 0 else 0,
+            "fired": self.fired,
+            "missed": self.missed,
+            "jitter": self.jitter.snapshot(),
+        }
+
+    def close(self, exit: bool) -> bool:
+        if self.fd == -1:
+            return False
+        s = self.snapshot()
+        logger.info(
+            f"Trigger ran at {s['achieved_rate']}Hz (target {self.rate}Hz), "
+            + f"missed {s['missed']} ticks, jitter p99 {s['jitter']['p99_us']}us "
+            + f"(max {s['jitter']['max_us']}us)."
+        )
+        os.close(self.fd)
+        self.fd = -1
+        if self.attr:
+            self.attr.close()
+            self.attr = None
+        return False
 
 
 class SoftwareTrigger(IioReader):
@@ -619,13 +829,18 @@ class SoftwareTrigger(IioReader):
         self,
         freq: int,
         devices: Sequence[Sequence[str]] = [IMU_NAMES, GYRO_NAMES, ACCEL_NAMES],
+        threaded: bool = True,
     ) -> None:
+        """With `threaded`, the trigger fires from its own thread. Otherwise,
+        `timer` should be prepared in the controller loop after `open()`."""
         self.devices = devices
         self.old_triggers = {}
         self.freq = freq
+        self.threaded = threaded
         self.opened = False
         self.ev = None
         self.thread = None
+        self.timer = None
 
     def open(self):
         import time
@@ -677,10 +892,18 @@ class SoftwareTrigger(IioReader):
             with open(trig_fn, "w") as f:
                 f.write(f"sysfstrig{self.id}")
 
-        self.ev = TEvent()
-        self.thread = Thread(target=_sysfs_trig_sampler, args=(self.ev, id, self.freq))
-        self.thread.start()
         self.opened = True
+        trig = _find_sysfs_trigger(self.id)
+        if trig is None:
+            logger.warning(f"Trigger `sysfstrig{self.id}` not found.")
+            return True
+
+        self.timer = TriggerTimer(trig, self.freq)
+        if self.threaded:
+            self.timer.open()
+            self.ev = TEvent()
+            self.thread = Thread(target=self.timer.run, args=(self.ev,))
+            self.thread.start()
 
         return True
 
@@ -694,8 +917,11 @@ class SoftwareTrigger(IioReader):
             self.ev.set()
         if self.thread:
             self.thread.join()
+        if self.timer and self.threaded:
+            self.timer.close(True)
         self.ev = None
         self.thread = None
+        self.timer = None
 
         # Remove from current sensors
         for trig, (name, buff) in self.old_triggers.items():
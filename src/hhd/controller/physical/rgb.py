@@ -1,4 +1,5 @@
 import logging
+import math
 import os
 import time
 from threading import Event as TEvent
@@ -7,6 +8,7 @@ from typing import Any, Sequence
 
 from hhd.controller import Consumer
 from hhd.controller.base import Event, RgbLedEvent
+from hhd.controller.lib.sysfs import get_cache
 
 LED_PATHS = [
     "/sys/class/leds/multicolor:chassis/",
@@ -18,18 +20,12 @@ logger = logging.getLogger(__name__)
 
 def write_sysfs(dir: str, fn: str, val: Any):
     logger.info(f'Writing `{str(val)}` to \n"{os.path.join(dir, fn)}"')
-    with open(os.path.join(dir, fn), "w") as f:
-        f.write(str(val))
+    get_cache().write(os.path.join(dir, fn), val)
 
 
 def read_sysfs(dir: str, fn: str, default: str | None = None):
-    try:
-        with open(os.path.join(dir, fn), "r") as f:
-            return f.read().strip()
-    except Exception as e:
-        if default is not None:
-            return default
-        raise e
+    # The LED attributes that are read do not change
+    return get_cache().read(os.path.join(dir, fn), default, ttl=math.inf)
 
 
 def get_led_path():
@@ -10,7 +10,7 @@ from hhd.controller import (
     TouchpadCorrectionType,
     correct_touchpad,
 )
-from hhd.controller.lib.common import encode_axis, set_button
+from hhd.controller.lib.common import compile_axis_encoder, set_button
 from hhd.controller.lib.uhid import BUS_BLUETOOTH, BUS_USB, UhidDevice
 from hhd.controller.lib.ccache import ControllerCache
 
@@ -51,6 +51,9 @@ REPORT_MAX_DELAY = 1 / DS5_EDGE_MIN_REPORT_FREQ
 REPORT_MIN_DELAY = 1 / DS5_EDGE_MAX_REPORT_FREQ
 DS5_EDGE_MIN_TIMESTAMP_INTERVAL = 1500
 MAX_IMU_SYNC_DELAY = 2
+DS5_SPECIAL_AXES = frozenset(
+    ("hat_x", "hat_y", "touchpad_x", "touchpad_y", "gyro_ts", "accel_ts", "imu_ts")
+)
 
 logger = logging.getLogger(__name__)
 
@@ -102,10 +105,16 @@ class Dualsense(Producer, Consumer):
         )
         self.axis_map = DS5_BT_AXIS_MAP if use_bluetooth else DS5_USB_AXIS_MAP
         self.btn_map = DS5_BT_BTN_MAP if use_bluetooth else DS5_USB_BTN_MAP
+        self.axis_encoders = {
+            k: compile_axis_encoder(v) for k, v in self.axis_map.items()
+        }
 
     def open(self) -> Sequence[int]:
         self.available = False
         self.report = bytearray(prefill_ds5_report(self.use_bluetooth))
+        self.back = bytearray(self.report)
+        self.axis_routes = {}
+        self.btn_routes = {}
 
         cached = cast(
             Dualsense | None, _cache_left.get() if self.left_motion else _cache.get()
@@ -136,19 +145,7 @@ class Dualsense(Producer, Consumer):
             else DS5_NAME_LEFT
         )
         if not self.dev:
-            self.dev = UhidDevice(
-                vid=DS5_VENDOR,
-                pid=DS5_EDGE_PRODUCT if self.edge_mode else DS5_PRODUCT,
-                bus=BUS_BLUETOOTH if self.use_bluetooth else BUS_USB,
-                version=DS5_EDGE_VERSION,
-                country=DS5_EDGE_COUNTRY,
-                name=name,
-                report_descriptor=(
-                    DS5_EDGE_DESCRIPTOR_BT
-                    if self.use_bluetooth
-                    else DS5_EDGE_DESCRIPTOR_USB
-                ),
-            )
+            self.dev = self.create_device(name)
             self.fd = self.dev.open()
 
         self.touch_correction = correct_touchpad(
@@ -168,6 +165,21 @@ class Dualsense(Producer, Consumer):
         assert self.fd
         return [self.fd]
 
+    def create_device(self, name: bytes) -> UhidDevice:
+        return UhidDevice(
+            vid=DS5_VENDOR,
+            pid=DS5_EDGE_PRODUCT if self.edge_mode else DS5_PRODUCT,
+            bus=BUS_BLUETOOTH if self.use_bluetooth else BUS_USB,
+            version=DS5_EDGE_VERSION,
+            country=DS5_EDGE_COUNTRY,
+            name=name,
+            report_descriptor=(
+                DS5_EDGE_DESCRIPTOR_BT
+                if self.use_bluetooth
+                else DS5_EDGE_DESCRIPTOR_USB
+            ),
+        )
+
     def close(self, exit: bool, in_cache: bool = False) -> bool:
         if not in_cache and self.cache and time.perf_counter() - self.start:
             logger.warning(
@@ -360,6 +372,45 @@ class Dualsense(Producer, Consumer):
                     logger.debug(f"Received unhandled report:\n{ev}")
         return out
 
+    def _route_axis(self, code: str):
+        """Resolves the filtering, renaming and encoder of an axis code.
+        Called once per code, the result is cached in `axis_routes`."""
+        if not self.enable_touchpad and code.startswith("touchpad"):
+            return None
+        if self.left_motion:
+            # Only left keep imu events for left motion
+            if "left_gyro_" in code or "left_accel_" in code or "left_imu_" in code:
+                code = code.replace("left_", "")
+            else:
+                return None
+        return (
+            code,
+            self.axis_encoders.get(code, None),
+            self.flip_z and code == "gyro_z",
+            code in DS5_SPECIAL_AXES,
+        )
+
+    def _route_button(self, code: str):
+        """Resolves the filtering, paddle remapping and bit of a button code.
+        Called once per code, the result is cached in `btn_routes`."""
+        if self.left_motion:
+            # skip buttons for left motion
+            return None
+        if not self.enable_touchpad and code.startswith("touchpad"):
+            return None
+        click = None
+        if (self.paddles_to_clicks == "top" and code == "extra_l1") or (
+            self.paddles_to_clicks == "bottom" and code == "extra_l2"
+        ):
+            click = b"\x80\x01\x20"
+            code = "touchpad_left"
+        if (self.paddles_to_clicks == "top" and code == "extra_r1") or (
+            self.paddles_to_clicks == "bottom" and code == "extra_r2"
+        ):
+            click = b"\x00\x06\x20"
+            code = "touchpad_left"
+        return code, self.btn_map.get(code, None), click
+
     def consume(self, events: Sequence[Event]):
         assert self.dev and self.report
         # To fix gyro to mouse in latest steam
@@ -367,32 +418,32 @@ class Dualsense(Producer, Consumer):
         send = not self.sync_gyro
         curr = time.perf_counter()
 
-        new_rep = bytearray(self.report)
+        # Reuse the previous report buffer instead of allocating a new one
+        new_rep = self.back
+        new_rep[:] = self.report
+        axis_routes = self.axis_routes
+        btn_routes = self.btn_routes
         for ev in events:
             code = ev["code"]
             match ev["type"]:
                 case "axis":
-                    if not self.enable_touchpad and code.startswith("touchpad"):
+                    route = axis_routes.get(code, False)
+                    if route is False:
+                        route = axis_routes[code] = self._route_axis(code)
+                    if not route:
                         continue
-                    if self.left_motion:
-                        # Only left keep imu events for left motion
-                        if (
-                            "left_gyro_" in code
-                            or "left_accel_" in code
-                            or "left_imu_" in code
-                        ):
-                            code = code.replace("left_", "")
-                        else:
-                            continue
-                    if code in self.axis_map:
-                        if self.flip_z and code == "gyro_z":
+                    code, enc, flip, special = route
+                    if enc:
+                        if flip:
                             ev["value"] = -ev["value"]
                         try:
-                            encode_axis(new_rep, self.axis_map[code], ev["value"])
+                            enc(new_rep, ev["value"])
                         except Exception:
                             logger.warning(
                                 f"Encoding '{ev['code']}' with {ev['value']} overflowed."
                             )
+                    if not special:
+                        continue
                     # DPAD is weird
                     match code:
                         case "hat_x":
@@ -441,34 +492,17 @@ class Dualsense(Producer, Consumer):
                                 ev["value"] / DS5_EDGE_DELTA_TIME_NS
                             ).to_bytes(8, byteorder="little", signed=False)[:4]
                 case "button":
-                    if self.left_motion:
-                        # skip buttons for left motion
-                        continue
-                    if not self.enable_touchpad and code.startswith("touchpad"):
+                    route = btn_routes.get(code, False)
+                    if route is False:
+                        route = btn_routes[code] = self._route_button(code)
+                    if not route:
                         continue
-                    if (self.paddles_to_clicks == "top" and code == "extra_l1") or (
-                        self.paddles_to_clicks == "bottom" and code == "extra_l2"
-                    ):
+                    code, bm, click = route
+                    if click:
                         # Place finger on correct place and click
-                        new_rep[self.ofs + 33] = 0x80
-                        new_rep[self.ofs + 34] = 0x01
-                        new_rep[self.ofs + 35] = 0x20
-                        # Replace code with click
-                        ev = {**ev, "code": "touchpad_left"}
-                        code = "touchpad_left"
-                    if (self.paddles_to_clicks == "top" and code == "extra_r1") or (
-                        self.paddles_to_clicks == "bottom" and code == "extra_r2"
-                    ):
-                        # Place finger on correct place and click
-                        new_rep[self.ofs + 33] = 0x00
-                        new_rep[self.ofs + 34] = 0x06
-                        new_rep[self.ofs + 35] = 0x20
-                        # Replace code with click
-                        ev = {**ev, "code": "touchpad_left"}
-                        code = "touchpad_left"
-
-                    if code in self.btn_map:
-                        set_button(new_rep, self.btn_map[code], ev["value"])
+                        new_rep[self.ofs + 33 : self.ofs + 36] = click
+                    if bm:
+                        set_button(new_rep, bm, ev["value"])
 
                     # Fix touchpad click requiring touch
                     if code == "touchpad_touch":
@@ -518,6 +552,7 @@ class Dualsense(Producer, Consumer):
         # at least a couple of times per second
         # if new_rep == self.report and not self.fake_timestamps:
         #     return
+        self.back = self.report
         self.report = new_rep
 
         # If the IMU breaks, smoothly re-enable the controller
@@ -1,4 +1,6 @@
 import logging
+import os
+import struct
 import time
 from typing import Sequence
 
@@ -19,6 +21,51 @@ _cache_volume = ControllerCache()
 
 MAX_IMU_SYNC_DELAY = 2
 
+# struct input_event, the timeval is ignored by the kernel for injected events
+INPUT_EVENT = struct.Struct("llHHi")
+MAX_BATCH_EVENTS = 64
+
+EV_ABS = B("EV_ABS")
+EV_KEY = B("EV_KEY")
+EV_MSC = B("EV_MSC")
+EV_SYN = B("EV_SYN")
+ABS_MT_POSITION_X = B("ABS_MT_POSITION_X")
+ABS_MT_POSITION_Y = B("ABS_MT_POSITION_Y")
+ABS_MT_TRACKING_ID = B("ABS_MT_TRACKING_ID")
+BTN_TOOL_FINGER = B("BTN_TOOL_FINGER")
+MSC_TIMESTAMP = B("MSC_TIMESTAMP")
+SYN_REPORT = B("SYN_REPORT")
+
+
+class EventBatch:
+    """Packs input events into a preallocated `input_event` array, so that a
+    frame can be written to the uinput fd with a single `write(2)`."""
+
+    def __init__(self, size: int = MAX_BATCH_EVENTS) -> None:
+        self.buf = bytearray(INPUT_EVENT.size * size)
+        self.view = memoryview(self.buf)
+        self.size = size
+        self.n = 0
+
+    def write(self, fd: int, etype: int, code: int, value: int):
+        if self.n == self.size:
+            # Full, send the events without a syn, the kernel queues them
+            self.flush(fd)
+        INPUT_EVENT.pack_into(
+            self.buf, self.n * INPUT_EVENT.size, 0, 0, etype, code, value
+        )
+        self.n += 1
+
+    def syn(self, fd: int):
+        self.write(fd, EV_SYN, SYN_REPORT, 0)
+        self.flush(fd)
+
+    def flush(self, fd: int):
+        if self.n:
+            n = self.n
+            self.n = 0
+            os.write(fd, self.view[: n * INPUT_EVENT.size])
+
 
 class UInputDevice(Consumer, Producer):
     @staticmethod
@@ -143,6 +190,7 @@ class UInputDevice(Consumer, Producer):
         self.touchpad_aspect = 1
         self.touch_id = 1
         self.fd = self.dev.fd
+        self.batch = EventBatch()
         self.start = time.perf_counter()
         self.last_imu = time.perf_counter()
         self.imu_failed = False
@@ -178,6 +226,9 @@ class UInputDevice(Consumer, Producer):
         if not self.dev:
             return
 
+        # Events are batched and written with the syn
+        fd = self.fd
+        write = self.batch.write
         should_syn = not self.sync_gyro
         wrote = {}
         ts = 0
@@ -205,13 +256,13 @@ class UInputDevice(Consumer, Producer):
                             val = int(ax.scale * ev["value"] + ax.offset)
                         if ax.bounds:
                             val = min(max(val, ax.bounds[0]), ax.bounds[1])
-                        self.dev.write(B("EV_ABS"), ax.id, val)
+                        write(fd, EV_ABS, ax.id, val)
                         wrote[key] = val
 
                         if ev["code"] == "touchpad_x":
-                            self.dev.write(B("EV_ABS"), B("ABS_MT_POSITION_X"), val)
+                            write(fd, EV_ABS, ABS_MT_POSITION_X, val)
                         elif ev["code"] == "touchpad_y":
-                            self.dev.write(B("EV_ABS"), B("ABS_MT_POSITION_Y"), val)
+                            write(fd, EV_ABS, ABS_MT_POSITION_Y, val)
 
                     elif (
                         self.output_imu_timestamps is True
@@ -226,26 +277,29 @@ class UInputDevice(Consumer, Producer):
                         # Evdev expects us accuracy
                         self.last_imu_ts = ev["value"]
                         ts = (ev["value"] // 1000) % (2**31)
-                        self.dev.write(B("EV_MSC"), B("MSC_TIMESTAMP"), ts)
+                        write(fd, EV_MSC, MSC_TIMESTAMP, ts)
                         wrote[key] = ts
                 case "button":
                     if ev["code"] in self.btn_map:
                         if ev["code"] == "touchpad_touch":
-                            self.dev.write(
-                                B("EV_ABS"),
-                                B("ABS_MT_TRACKING_ID"),
+                            write(
+                                fd,
+                                EV_ABS,
+                                ABS_MT_TRACKING_ID,
                                 self.touch_id if ev["value"] else -1,
                             )
-                            self.dev.write(
-                                B("EV_KEY"),
-                                B("BTN_TOOL_FINGER"),
+                            write(
+                                fd,
+                                EV_KEY,
+                                BTN_TOOL_FINGER,
                                 1 if ev["value"] else 0,
                             )
                             self.touch_id += 1
                             if self.touch_id > 500:
                                 self.touch_id = 1
-                        self.dev.write(
-                            B("EV_KEY"),
+                        write(
+                            fd,
+                            EV_KEY,
                             self.btn_map[ev["code"]],
                             1 if ev["value"] else 0,
                         )
@@ -259,7 +313,7 @@ class UInputDevice(Consumer, Producer):
             # We have timestamps with ns accuracy.
             # Evdev expects us accuracy
             ts = (time.perf_counter_ns() // 1000) % (2**31)
-            self.dev.write(B("EV_MSC"), B("MSC_TIMESTAMP"), ts)
+            write(fd, EV_MSC, MSC_TIMESTAMP, ts)
 
         if self.sync_gyro:
             curr = time.perf_counter()
@@ -275,7 +329,7 @@ class UInputDevice(Consumer, Producer):
             and (should_syn or not self.sync_gyro or self.imu_failed)
             and (not self.output_imu_timestamps or ts)
         ):
-            self.dev.syn()
+            self.batch.syn(fd)
             self.wrote = False
 
     def produce(self, fds: Sequence[int]) -> Sequence[Event]:
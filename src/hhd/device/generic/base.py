@@ -1,10 +1,9 @@
 import logging
 import os
-import select
 import time
 from threading import Event as TEvent
 
-from hhd.controller import DEBUG_MODE, Multiplexer
+from hhd.controller import DEBUG_MODE, Multiplexer, DeadlinePolicy, Reactor
 from hhd.controller.lib.hide import unhide_all
 from hhd.controller.physical.hidraw import GenericGamepadHidraw
 from hhd.controller.physical.evdev import B as EC
@@ -204,21 +203,10 @@ def controller_loop(
     if motion:
         REPORT_FREQ_MAX = max(REPORT_FREQ_MAX, conf["imu_hz"].to(float))
 
-    REPORT_DELAY_MAX = 1 / REPORT_FREQ_MIN
-    REPORT_DELAY_MIN = 1 / REPORT_FREQ_MAX
-
-    fds = []
-    devs = []
-    fd_to_dev = {}
-
-    def prepare(m):
-        devs.append(m)
-        fs = m.open()
-        fds.extend(fs)
-        for f in fs:
-            fd_to_dev[f] = m
+    reactor = Reactor(DeadlinePolicy(REPORT_FREQ_MIN, REPORT_FREQ_MAX))
 
     try:
+        reactor.register(multiplexer.fds())
         if dtype == "claw":
             d_vend = GenericGamepadHidraw(
                 vid=[MSI_CLAW_VID],
@@ -254,33 +242,24 @@ def controller_loop(
                 capabilities={EC("EV_KEY"): [EC("KEY_F17"), EC("KEY_F18")]},
             )
 
-        prepare(d_xinput)
+        reactor.prepare(d_xinput, primary=True)
         if motion and d_imu:
             start_imu = True
             if dconf.get("hrtimer", False):
                 start_imu = d_timer.open()
             if start_imu:
-                prepare(d_imu)
-        prepare(d_volume_btn)
-        prepare(d_kbd_1)
+                reactor.prepare(d_imu)
+        reactor.prepare(d_volume_btn)
+        reactor.prepare(d_kbd_1)
         if d_kbd_2:
-            prepare(d_kbd_2)
+            reactor.prepare(d_kbd_2)
         for d in d_producers:
-            prepare(d)
+            reactor.prepare(d)
 
         logger.info("Emulated controller launched, have fun!")
         while not should_exit.is_set() and not updated.is_set():
-            start = time.perf_counter()
-            # Add timeout to call consumers a minimum amount of times per second
-            r, _, _ = select.select(fds, [], [], REPORT_DELAY_MAX)
-            evs = []
-            to_run = set()
-            for f in r:
-                to_run.add(id(fd_to_dev[f]))
-
-            for d in devs:
-                if id(d) in to_run:
-                    evs.extend(d.produce(r))
+            r = reactor.poll()
+            evs = reactor.produce(r)
 
             evs = multiplexer.process(evs)
             if evs:
@@ -294,11 +273,6 @@ def controller_loop(
             for d in d_outs:
                 d.consume(evs)
 
-            t = time.perf_counter()
-            elapsed = t - start
-            if elapsed < REPORT_DELAY_MIN:
-                time.sleep(REPORT_DELAY_MIN - elapsed)
-
     except KeyboardInterrupt:
         raise
     finally:
@@ -309,10 +283,11 @@ def controller_loop(
             logger.error(f"Error while closing device '{d}' with exception:\n{e}")
             if debug:
                 raise e
-        for d in reversed(devs):
+        for d in reversed(reactor.devs):
             try:
                 d.close(not updated.is_set())
             except Exception as e:
                 logger.error(f"Error while closing device '{d}' with exception:\n{e}")
                 if debug:
                     raise e
+        reactor.close()
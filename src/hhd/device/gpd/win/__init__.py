@@ -132,11 +132,14 @@ class GpdWinControllersPlugin(HHDPlugin):
         if self.prev is None:
             self.prev = new_conf
         else:
-            self.prev.update(new_conf.conf)
+            self.prev.update(new_conf.data)
 
         self.updated.set()
         self.start(self.prev)
 
+    def next_wake(self):
+        return None
+
     def start(self, conf):
         from .base import plugin_run
 
@@ -202,6 +205,9 @@ class GpdWinControlsPlugin(HHDPlugin):
 
         return base
 
+    def next_wake(self):
+        return None
+
     def update(self, conf: Config):
         if not conf.get_action(f"wincontrols.wincontrols.apply"):
             return
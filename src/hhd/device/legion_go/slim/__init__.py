@@ -51,7 +51,7 @@ class LegionGoSControllerPlugin(HHDPlugin):
         if self.prev is None:
             self.prev = new_conf
         else:
-            self.prev.update(new_conf.conf)
+            self.prev.update(new_conf.data)
 
         if reset:
             self.started = False
@@ -59,6 +59,9 @@ class LegionGoSControllerPlugin(HHDPlugin):
             self.updated.set()
         self.start(self.prev, reset)
 
+    def next_wake(self):
+        return None
+
     def start(self, conf, reset=False):
         from .base import plugin_run
 
@@ -5,7 +5,15 @@ import time
 from threading import Event as TEvent
 from typing import Sequence
 
-from hhd.controller import DEBUG_MODE, Button, Consumer, Event, Producer
+from hhd.controller import (
+    DEBUG_MODE,
+    Button,
+    Consumer,
+    Event,
+    Producer,
+    DeadlinePolicy,
+    Reactor,
+)
 from hhd.controller.base import Multiplexer
 from hhd.controller.lib.hide import unhide_all
 from hhd.controller.physical.evdev import B as EC
@@ -297,41 +305,21 @@ def controller_loop_xinput(
     REPORT_FREQ_MIN = 25
     REPORT_FREQ_MAX = 500
 
-    REPORT_DELAY_MAX = 1 / REPORT_FREQ_MIN
-    REPORT_DELAY_MIN = 1 / REPORT_FREQ_MAX
-
-    fds = []
-    devs = []
-    fd_to_dev = {}
-
-    def prepare(m):
-        devs.append(m)
-        fs = m.open()
-        fds.extend(fs)
-        for f in fs:
-            fd_to_dev[f] = m
+    reactor = Reactor(DeadlinePolicy(REPORT_FREQ_MIN, REPORT_FREQ_MAX))
 
     try:
-        prepare(d_xinput)
-        prepare(d_shortcuts)
-        prepare(d_cfg)
-        prepare(d_raw)
+        reactor.register(multiplexer.fds())
+        reactor.prepare(d_xinput, primary=True)
+        reactor.prepare(d_shortcuts)
+        reactor.prepare(d_cfg)
+        reactor.prepare(d_raw)
         for d in d_producers:
-            prepare(d)
+            reactor.prepare(d)
 
         logger.info("Emulated controller launched, have fun!")
         while not should_exit.is_set() and not updated.is_set():
-            start = time.perf_counter()
-            # Add timeout to call consumers a minimum amount of times per second
-            r, _, _ = select.select(fds, [], [], REPORT_DELAY_MAX)
-            evs = []
-            to_run = set()
-            for f in r:
-                to_run.add(id(fd_to_dev[f]))
-
-            for d in devs:
-                if id(d) in to_run:
-                    evs.extend(d.produce(r))
+            r = reactor.poll()
+            evs = reactor.produce(r)
 
             evs = multiplexer.process(evs)
             if evs:
@@ -345,21 +333,17 @@ def controller_loop_xinput(
             for d in d_outs:
                 d.consume(evs)
 
-            t = time.perf_counter()
-            elapsed = t - start
-            if elapsed < REPORT_DELAY_MIN:
-                time.sleep(REPORT_DELAY_MIN - elapsed)
-
     except KeyboardInterrupt:
         raise
     finally:
-        for d in reversed(devs):
+        for d in reversed(reactor.devs):
             try:
                 d.close(not updated.is_set())
             except Exception as e:
                 logger.error(f"Error while closing device '{d}' with exception:\n{e}")
                 if debug:
                     raise e
+        reactor.close()
 
 
 class SelectivePassthrough(Producer, Consumer):
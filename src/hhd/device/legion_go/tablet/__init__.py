@@ -60,7 +60,7 @@ class LegionGoControllersPlugin(HHDPlugin):
         if self.prev is None:
             self.prev = new_conf
         else:
-            self.prev.update(new_conf.conf)
+            self.prev.update(new_conf.data)
 
         if reset:
             self.started = False
@@ -68,6 +68,9 @@ class LegionGoControllersPlugin(HHDPlugin):
             self.updated.set()
         self.start(self.prev, reset)
 
+    def next_wake(self):
+        return None
+
     def start(self, conf, reset=False):
         from .base import plugin_run
 
@@ -1,11 +1,16 @@
 import logging
 import os
-import select
 import time
 from threading import Event as TEvent
 
 
-from hhd.controller import Multiplexer, DEBUG_MODE
+from hhd.controller import (
+    DEBUG_MODE,
+    DeadlinePolicy,
+    Multiplexer,
+    Reactor,
+    ReportPolicy,
+)
 from hhd.controller.lib.hide import unhide_all
 from hhd.controller.physical.evdev import B as EC
 from hhd.controller.physical.evdev import GenericGamepadEvdev, enumerate_evs
@@ -178,7 +183,7 @@ def plugin_run(
     unhide_all()
 
 
-def find_vendor(prepare, turbo, protocol: str | None):
+def find_vendor(reactor: Reactor, turbo, protocol: str | None):
     d_ser = SerialDevice(turbo=turbo, required=True)
     d_hidraw = OxpHidraw(
         vid=[X1_MINI_VID],
@@ -199,7 +204,7 @@ def find_vendor(prepare, turbo, protocol: str | None):
 
     if not protocol or protocol in ["serial", "mixed"]:
         try:
-            prepare(d_ser)
+            reactor.prepare(d_ser, always=True)
             # OneXFly uses serial only for the buttons and hidraw for RGB
             # Initialize V2 selectcively on that one
             try:
@@ -208,7 +213,7 @@ def find_vendor(prepare, turbo, protocol: str | None):
                         logger.warning(
                             f"Device has protocol 'serial', but 'mixed' was detected."
                         )
-                    prepare(d_hidraw_v2)
+                    reactor.prepare(d_hidraw_v2, always=True)
                 return [d_ser, d_hidraw_v2]
             except Exception as e:
                 logger.info(
@@ -220,7 +225,7 @@ def find_vendor(prepare, turbo, protocol: str | None):
 
     if not protocol or protocol == "hid_v1":
         try:
-            prepare(d_hidraw)
+            reactor.prepare(d_hidraw, always=True)
             logger.info("Found OXP V1 hidraw vendor device.")
             return [d_hidraw]
         except Exception as e:
@@ -228,7 +233,7 @@ def find_vendor(prepare, turbo, protocol: str | None):
 
     if not protocol or protocol == "hid_v2":
         try:
-            prepare(d_hidraw_v2)
+            reactor.prepare(d_hidraw_v2, always=True)
             logger.info("Found OXP V2 hidraw vendor device.")
             return [d_hidraw_v2]
         except Exception as e:
@@ -331,28 +336,16 @@ def turbo_loop(
     REPORT_FREQ_MIN = 25
     REPORT_FREQ_MAX = 25
 
-    REPORT_DELAY_MAX = 1 / REPORT_FREQ_MIN
-    REPORT_DELAY_MIN = 1 / REPORT_FREQ_MAX
-
-    fds = []
-    devs = []
-    fd_to_dev = {}
-
-    def prepare(m):
-        devs.append(m)
-        fs = m.open()
-        fds.extend(fs)
-        for f in fs:
-            fd_to_dev[f] = m
+    reactor = Reactor(ReportPolicy(REPORT_FREQ_MIN, REPORT_FREQ_MAX))
 
     try:
-        prepare(d_volume_btn)
-        d_vend = find_vendor(prepare, True, dconf.get("protocol", None))
-        d_vend_id = [id(d) for d in d_vend]
+        reactor.register(multiplexer.fds())
+        reactor.prepare(d_volume_btn)
+        d_vend = find_vendor(reactor, True, dconf.get("protocol", None))
 
         for d in d_producers:
-            prepare(d)
-        prepare(d_kbd_1)
+            reactor.prepare(d)
+        reactor.prepare(d_kbd_1)
 
         logger.info(
             "Turbo only mode started, the turbo button of the device will still work."
@@ -371,16 +364,8 @@ def turbo_loop(
                     logger.info("Controller found, switching to controller mode.")
                     break
 
-            r, _, _ = select.select(fds, [], [], REPORT_DELAY_MAX)
-            evs = []
-            to_run = set()
-            for f in r:
-                to_run.add(id(fd_to_dev[f]))
-
-            for d in devs:
-                d_id = id(d)
-                if d_id in to_run or d_id in d_vend_id:
-                    evs.extend(d.produce(r))
+            r = reactor.poll()
+            evs = reactor.produce(r)
 
             evs = multiplexer.process(evs)
             if evs:
@@ -394,21 +379,17 @@ def turbo_loop(
             for d in d_outs:
                 d.consume(evs)
 
-            t = time.perf_counter()
-            elapsed = t - start
-            if elapsed < REPORT_DELAY_MIN:
-                time.sleep(REPORT_DELAY_MIN - elapsed)
-
     except KeyboardInterrupt:
         raise
     finally:
-        for d in reversed(devs):
+        for d in reversed(reactor.devs):
             try:
                 d.close(not updated.is_set())
             except Exception as e:
                 logger.error(f"Error while closing device '{d}' with exception:\n{e}")
                 if debug:
                     raise e
+        reactor.close()
 
 
 def controller_loop(
@@ -530,50 +511,28 @@ def controller_loop(
     if motion:
         REPORT_FREQ_MAX = max(REPORT_FREQ_MAX, conf["imu_hz"].to(float))
 
-    REPORT_DELAY_MAX = 1 / REPORT_FREQ_MIN
-    REPORT_DELAY_MIN = 1 / REPORT_FREQ_MAX
-
-    fds = []
-    devs = []
-    fd_to_dev = {}
-
-    def prepare(m):
-        devs.append(m)
-        fs = m.open()
-        fds.extend(fs)
-        for f in fs:
-            fd_to_dev[f] = m
+    reactor = Reactor(DeadlinePolicy(REPORT_FREQ_MIN, REPORT_FREQ_MAX))
 
     try:
-        d_vend = find_vendor(prepare, turbo, dconf.get("protocol", None))
-        d_vend_id = [id(d) for d in d_vend]
-        prepare(d_xinput)
+        reactor.register(multiplexer.fds())
+        d_vend = find_vendor(reactor, turbo, dconf.get("protocol", None))
+        reactor.prepare(d_xinput, primary=True)
         if motion:
             start_imu = True
             if dconf.get("hrtimer", False):
                 start_imu = d_timer.open()
             if start_imu:
-                prepare(d_imu)
-        prepare(d_volume_btn)
-        prepare(d_kbd_1)
+                reactor.prepare(d_imu)
+        reactor.prepare(d_volume_btn)
+        reactor.prepare(d_kbd_1)
 
         for d in d_producers:
-            prepare(d)
+            reactor.prepare(d)
 
         logger.info("Emulated controller launched, have fun!")
         while not should_exit.is_set() and not updated.is_set():
-            start = time.perf_counter()
-            # Add timeout to call consumers a minimum amount of times per second
-            r, _, _ = select.select(fds, [], [], REPORT_DELAY_MAX)
-            evs = []
-            to_run = set()
-            for f in r:
-                to_run.add(id(fd_to_dev[f]))
-
-            for d in devs:
-                d_id = id(d)
-                if d_id in to_run or d_id in d_vend_id:
-                    evs.extend(d.produce(r))
+            r = reactor.poll()
+            evs = reactor.produce(r)
 
             evs = multiplexer.process(evs)
             if evs:
@@ -588,11 +547,6 @@ def controller_loop(
             for d in d_outs:
                 d.consume(evs)
 
-            t = time.perf_counter()
-            elapsed = t - start
-            if elapsed < REPORT_DELAY_MIN:
-                time.sleep(REPORT_DELAY_MIN - elapsed)
-
     except KeyboardInterrupt:
         raise
     finally:
@@ -603,10 +557,11 @@ def controller_loop(
             logger.error(f"Error while closing device '{d}' with exception:\n{e}")
             if debug:
                 raise e
-        for d in reversed(devs):
+        for d in reversed(reactor.devs):
             try:
                 d.close(not updated.is_set())
             except Exception as e:
                 logger.error(f"Error while closing device '{d}' with exception:\n{e}")
                 if debug:
                     raise e
+        reactor.close()
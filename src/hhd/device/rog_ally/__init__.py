@@ -59,11 +59,14 @@ class RogAllyControllersPlugin(HHDPlugin):
         if self.prev is None:
             self.prev = new_conf
         else:
-            self.prev.update(new_conf.conf)
+            self.prev.update(new_conf.data)
 
         self.updated.set()
         self.start(self.prev)
 
+    def next_wake(self):
+        return None
+
     def start(self, conf):
         from .base import plugin_run
 
@@ -1,10 +1,17 @@
 import logging
-import select
 import time
 from threading import Event as TEvent
 from typing import Sequence
 
-from hhd.controller import DEBUG_MODE, Axis, Event, Multiplexer, can_read
+from hhd.controller import (
+    DEBUG_MODE,
+    Axis,
+    Event,
+    Multiplexer,
+    DeadlinePolicy,
+    Reactor,
+    can_read,
+)
 from hhd.controller.lib.hide import unhide_all
 from hhd.controller.physical.evdev import DINPUT_AXIS_POSTPROCESS, AbsAxis
 from hhd.controller.physical.evdev import B as EC
@@ -412,45 +419,25 @@ def controller_loop(
     if motion:
         REPORT_FREQ_MAX = max(REPORT_FREQ_MAX, conf["imu_hz"].to(float))
 
-    REPORT_DELAY_MAX = 1 / REPORT_FREQ_MIN
-    REPORT_DELAY_MIN = 1 / REPORT_FREQ_MAX
-
-    fds = []
-    devs = []
-    fd_to_dev = {}
-
-    def prepare(m):
-        devs.append(m)
-        fs = m.open()
-        fds.extend(fs)
-        for f in fs:
-            fd_to_dev[f] = m
+    reactor = Reactor(DeadlinePolicy(REPORT_FREQ_MIN, REPORT_FREQ_MAX))
 
     try:
+        reactor.register(multiplexer.fds())
         d_vend.open()
-        prepare(d_xinput)
+        reactor.prepare(d_xinput, primary=True)
         if d_allyx:
-            prepare(d_allyx)
+            reactor.prepare(d_allyx)
         if motion:
             if d_timer.open():
-                prepare(d_imu)
-        prepare(d_kbd_1)
+                reactor.prepare(d_imu)
+        reactor.prepare(d_kbd_1)
         for d in d_producers:
-            prepare(d)
+            reactor.prepare(d)
 
         logger.info("Emulated controller launched, have fun!")
         while not should_exit.is_set() and not updated.is_set():
-            start = time.perf_counter()
-            # Add timeout to call consumers a minimum amount of times per second
-            r, _, _ = select.select(fds, [], [], REPORT_DELAY_MAX)
-            evs = []
-            to_run = set()
-            for f in r:
-                to_run.add(id(fd_to_dev[f]))
-
-            for d in devs:
-                if id(d) in to_run:
-                    evs.extend(d.produce(r))
+            r = reactor.poll()
+            evs = reactor.produce(r)
             evs.extend(d_vend.produce(r))
 
             evs = multiplexer.process(evs)
@@ -479,21 +466,6 @@ def controller_loop(
                     pass
                 d_kbd_grabbed = True
 
-            # If unbounded, the total number of events per second is the sum of all
-            # events generated by the producers.
-            # For Legion go, that would be 100 + 100 + 500 + 30 = 730
-            # Since the controllers of the legion go only update at 500hz, this is
-            # wasteful.
-            # By setting a target refresh rate for the report and sleeping at the
-            # end, we ensure that even if multiple fds become ready close to each other
-            # they are combined to the same report, limiting resource use.
-            # Ideally, this rate is smaller than the report rate of the hardware controller
-            # to ensure there is always a report from that ready during refresh
-            t = time.perf_counter()
-            elapsed = t - start
-            if elapsed < REPORT_DELAY_MIN:
-                time.sleep(REPORT_DELAY_MIN - elapsed)
-
     except KeyboardInterrupt:
         raise
     finally:
@@ -509,10 +481,11 @@ def controller_loop(
             logger.error(f"Error while closing device '{d}' with exception:\n{e}")
             if debug:
                 raise e
-        for d in reversed(devs):
+        for d in reversed(reactor.devs):
             try:
                 d.close(not updated.is_set())
             except Exception as e:
                 logger.error(f"Error while closing device '{d}' with exception:\n{e}")
                 if debug:
                     raise e
+        reactor.close()
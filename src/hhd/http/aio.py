@@ -0,0 +1,277 @@
+import asyncio
+import logging
+from io import BytesIO
+from threading import Thread
+
+from .api import (
+    STATE_POLL_TIMEOUT,
+    STREAM_COALESCE,
+    STREAM_HEADERS,
+    STREAM_KEEPALIVE,
+    RestHandler,
+    parse_path,
+    parse_since,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_SIZE = 65536
+REQUEST_TIMEOUT = 30
+
+
+class AsyncHTTPServer:
+    """Serves the `RestHandler` routes from a single asyncio loop, running on
+    its own thread.
+
+    Requests are parsed with the handler's own `parse_request()` and the
+    response is written into a buffer. Long polls of `/api/v1/state` do not
+    hold a thread; each client awaits a future that is resolved by
+    `notify()`, which is called once per server update. The response for the
+    new revision is rendered once and shared through the state cache.
+    Other requests run on the default executor, as they may block on the
+    server condition for a short time."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.t = None
+        self.servers: list[asyncio.AbstractServer] = []
+        self.waiters: set[asyncio.Future] = set()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def open_tcp(self, handler: type[RestHandler], host: str, port: int):
+        """Starts serving on `(host, port)`, raises if the socket can not be
+        bound."""
+        self._start()
+
+        async def start():
+            return await asyncio.start_server(
+                lambda r, w: self._client(handler, r, w),
+                host or "0.0.0.0",
+                port,
+                limit=MAX_HEADER_SIZE,
+            )
+
+        self.servers.append(self._call(start()))
+
+    def open_unix(self, handler: type[RestHandler], path: str):
+        self._start()
+
+        async def start():
+            return await asyncio.start_unix_server(
+                lambda r, w: self._client(handler, r, w),
+                path,
+                limit=MAX_HEADER_SIZE,
+            )
+
+        self.servers.append(self._call(start()))
+
+    def _start(self):
+        if self.t:
+            return
+        self.t = Thread(target=self._run)
+        self.t.start()
+
+    def notify(self):
+        """Wakes up the waiting long polls. Thread safe."""
+        if self.t:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        waiters = self.waiters
+        self.waiters = set()
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    async def _wait(self, timeout: float | None = None):
+        fut = self.loop.create_future()
+        self.waiters.add(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiters.discard(fut)
+
+    def close(self):
+        if not self.t:
+            return
+
+        async def stop():
+            for s in self.servers:
+                s.close()
+            self._wake()
+            for s in self.servers:
+                await s.wait_closed()
+
+        try:
+            self._call(asyncio.wait_for(stop(), REQUEST_TIMEOUT))
+        except Exception as e:
+            logger.warning(f"Error while closing the http server:\n{e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.t.join()
+        self.loop.close()
+        self.servers = []
+        self.t = None
+
+    def _create_handler(self, cls: type[RestHandler], writer: asyncio.StreamWriter):
+        h = cls.__new__(cls)
+        peer = writer.get_extra_info("peername")
+        h.client_address = peer if isinstance(peer, tuple) else ("unix", 0)
+        h.server = None  # type: ignore
+        h.request = None
+        h.close_connection = True
+        h.wfile = BytesIO()
+        return h
+
+    async def _client(
+        self,
+        cls: type[RestHandler],
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        try:
+            try:
+                head = await asyncio.wait_for(
+                    reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT
+                )
+            except asyncio.LimitOverrunError:
+                writer.write(b"HTTP/1.0 431 Request Header Fields Too Large\r\n\r\n")
+                await writer.drain()
+                return
+            except asyncio.IncompleteReadError:
+                return
+
+            h = self._create_handler(cls, writer)
+            h.rfile = BytesIO(head)
+            h.raw_requestline = h.rfile.readline(MAX_HEADER_SIZE + 1)
+            if not h.parse_request():
+                # Error response was written by parse_request
+                writer.write(h.wfile.getvalue())
+                await writer.drain()
+                return
+
+            length = int(h.headers.get("Content-Length", 0) or 0)
+            if length > 0:
+                body = await asyncio.wait_for(
+                    reader.readexactly(length), REQUEST_TIMEOUT
+                )
+                pos = h.rfile.tell()
+                h.rfile.write(body)
+                h.rfile.seek(pos)
+
+            if await self._stream(h, writer):
+                return
+            if not await self._poll_state(h):
+                await self.loop.run_in_executor(None, self._dispatch, h)
+
+            writer.write(h.wfile.getvalue())
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Error while serving request:\n{e}")
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    def _dispatch(self, h: RestHandler):
+        mname = "do_" + h.command
+        # Unknown methods are handled as GET by `RestHandler.__getattr__`
+        getattr(h, mname)()
+
+    def _match(self, h: RestHandler, command: str):
+        """Returns the parameters of an authenticated GET request for
+        `/api/v1/<command>`, or None."""
+        if h.command == "POST":
+            return None
+        segments, params = parse_path(h.path)
+        if (
+            len(segments) < 3
+            or segments[:2] != ["api", "v1"]
+            or segments[2].lower() != command
+        ):
+            return None
+        if not h.is_authenticated():
+            return None
+        return params
+
+    async def _stream(self, h: RestHandler, writer: asyncio.StreamWriter):
+        """Handles `/api/v1/stream`, sending the changes as they happen.
+        Returns False if the request is not for the stream."""
+        params = self._match(h, "stream")
+        if params is None:
+            return False
+        try:
+            since = parse_since(params, h.headers)
+        except ValueError:
+            return False
+        langs = params.get("lang", params.get("locale", None))
+        lang = langs[0] if langs else None
+
+        state = h.state
+        h.set_response(200, STREAM_HEADERS)
+        writer.write(h.wfile.getvalue())
+        settings = None
+        while True:
+            with h.cond:
+                out, since, settings = h.render_events(lang, since, settings)
+            writer.write(out or b": keepalive\n\n")
+            await writer.drain()
+
+            end = self.loop.time() + STREAM_KEEPALIVE
+            while (
+                state.revision == since
+                and h.settings_cache.settings is settings
+                and not state.closed
+            ):
+                remaining = end - self.loop.time()
+                if remaining <= 0:
+                    break
+                await self._wait(remaining)
+            if state.closed:
+                return True
+            # Merge bursts of updates into one event
+            await asyncio.sleep(STREAM_COALESCE)
+
+    async def _poll_state(self, h: RestHandler):
+        """Handles `GET /api/v1/state?poll` without blocking a thread.
+        Returns False if the request is not a long poll."""
+        params = self._match(h, "state")
+        if params is None or "poll" not in params:
+            return False
+
+        since = None
+        if "since" in params:
+            try:
+                since = int(params["since"][0])
+            except ValueError:
+                return False
+        langs = params.get("lang", params.get("locale", None))
+        lang = langs[0] if langs else None
+
+        state = h.state
+        if since is not None:
+            # Hang until the state changes after the revision
+            end = self.loop.time() + STATE_POLL_TIMEOUT
+            while state.revision == since and not state.closed:
+                remaining = end - self.loop.time()
+                if remaining <= 0:
+                    break
+                await self._wait(remaining)
+        elif not state.closed:
+            # Hang for the next update
+            await self._wait()
+
+        with h.cond:
+            rev = state.revision
+            out = h.render_state(lang, since)
+        h.set_response_ok({"Revision": str(rev)})
+        h.wfile.write(out)
+        return True
@@ -1,15 +1,20 @@
+import gzip
+import hashlib
 import itertools
 import json
 import logging
 import os
 import socket
+import time
+from collections import deque
 from copy import deepcopy
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn, TCPServer
 from threading import Condition, Thread
-from typing import Any, Mapping, Sequence, cast
+from typing import Any, Mapping, NamedTuple, Sequence, cast
 from urllib.parse import parse_qs, urlparse
 
+from hhd.controller.lib.stats import get_stats
 from hhd.plugins import (
     Config,
     Context,
@@ -50,6 +55,11 @@ STANDARD_HEADERS = {
 ERROR_HEADERS = {**STANDARD_HEADERS, "Content-type": "text/plain"}
 AUTH_HEADERS = ERROR_HEADERS
 OK_HEADERS = {**STANDARD_HEADERS, "Content-type": "application/json"}
+STREAM_HEADERS = {
+    **STANDARD_HEADERS,
+    "Content-type": "text/event-stream",
+    "Cache-Control": "no-cache",
+}
 
 # https://en.wikipedia.org/wiki/List_of_Unicode_characters#Control_codes
 _control_char_table = str.maketrans(
@@ -59,6 +69,19 @@ _control_char_table[ord("\\")] = r"\\"
 
 SECTIONS = load_relative_yaml("../sections.yml")["sections"]
 
+# Number of state revisions kept for `/api/v1/state?since=N`
+STATE_HISTORY = 64
+# Maximum time a `/api/v1/state?poll&since=N` request is held
+STATE_POLL_TIMEOUT = 60
+# `/api/v1/stream` sends a comment after this long without events
+STREAM_KEEPALIVE = 30
+# Time to wait after a change before sending it, to merge bursts of updates
+STREAM_COALESCE = 0.05
+# Responses smaller than this are not compressed
+GZIP_MIN_SIZE = 1024
+# Server backend, "asyncio" or "threading"
+HTTP_BACKEND = os.environ.get("HHD_HTTP_BACKEND", "asyncio")
+
 
 def parse_path(path: str) -> tuple[list, dict[str, list[str]]]:
     try:
@@ -76,9 +99,192 @@ def parse_path(path: str) -> tuple[list, dict[str, list[str]]]:
         return [], {}
 
 
+def format_event(event: str, data: bytes, id: int | None = None) -> bytes:
+    """Formats a server-sent event. `data` should not contain new lines."""
+    out = b"event: " + event.encode() + b"\n"
+    if id is not None:
+        out += b"id: " + str(id).encode() + b"\n"
+    return out + b"data: " + data + b"\n\n"
+
+
+def parse_since(params: dict[str, list[str]], headers: Any = None) -> int | None:
+    """Returns the revision of `since` or the `Last-Event-ID` header. Raises
+    ValueError if it is not an integer."""
+    if "since" in params:
+        return int(params["since"][0])
+    if headers is not None and (last := headers.get("Last-Event-ID", None)):
+        return int(last)
+    return None
+
+
+class StateCache:
+    """Revisions of the state (`conf` and `info`) with cached responses.
+
+    Every update that changes the state creates a new revision with a snapshot
+    of both trees. Snapshots share their unchanged subtrees with each other,
+    so they are cheap to keep and to diff. Rendered responses are cached for
+    the current revision. Should be accessed with the server condition held."""
+
+    def __init__(self, history: int = STATE_HISTORY) -> None:
+        self.revision = 0
+        self.snapshots: deque[tuple[int, Config, Config]] = deque(maxlen=history)
+        self.cache: dict[Any, bytes] = {}
+        self.closed = False
+
+    def update(self, conf: Config, info: Config):
+        if self.snapshots:
+            _, old_conf, old_info = self.snapshots[-1]
+            if not old_conf.diff(conf) and not old_info.diff(info):
+                return False
+
+        self.revision += 1
+        self.snapshots.append((self.revision, conf.copy(), info.copy()))
+        self.cache = {}
+        return True
+
+    @property
+    def current(self):
+        return self.snapshots[-1]
+
+    def changes(self, since: int) -> dict[str, Any] | None:
+        """Returns the dotted paths that changed after revision `since` with
+        their new values (`None` if removed), or `None` if the revision is no
+        longer available."""
+        _, conf, info = self.current
+        for rev, old_conf, old_info in self.snapshots:
+            if rev != since:
+                continue
+            out = old_conf.diff(conf)
+            for k, v in old_info.diff(info).items():
+                out[f"info.{k}" if k else "info"] = v
+            return out
+        return None
+
+    def render(
+        self,
+        locales: Sequence[HHDLocale],
+        lang: str | None,
+        user_lang: str | None,
+        since: int | None = None,
+    ) -> bytes:
+        """Renders the current revision, or the changes after revision `since`,
+        as translated json. Responses are cached per revision, language, and
+        `since`."""
+        _, conf, info = self.current
+        ver = translate_ver(conf, lang=lang, user_lang=user_lang)
+        key = (ver, since)
+        if key in self.cache:
+            return self.cache[key]
+
+        changes = None
+        if since is not None and since <= self.revision:
+            changes = self.changes(since)
+
+        if changes is not None:
+            out = {"revision": self.revision, "version": ver, "changes": changes}
+            out["changes"] = translate(
+                changes, conf, locales, lang=lang, user_lang=user_lang
+            )
+        else:
+            out = {**cast(dict, conf.conf), "info": info.conf}
+            out["version"] = ver
+            out = translate(
+                out,
+                conf,
+                locales,
+                lang=lang,
+                user_lang=user_lang,
+            )
+            if since is not None:
+                # The revision is too old, send the whole state
+                out = {"revision": self.revision, "version": ver, "state": out}
+
+        data = json.dumps(out).encode()
+        self.cache[key] = data
+        return data
+
+
+class SettingsResponse(NamedTuple):
+    version: str
+    etag: str
+    data: bytes
+    gzip: bytes | None
+
+
+class SettingsCache:
+    """Translated, serialized and compressed `/api/v1/settings` responses,
+    per settings version and language. Cleared when the settings change.
+    Should be accessed with the server condition held."""
+
+    def __init__(self) -> None:
+        self.settings = None
+        self.responses: dict[str, SettingsResponse] = {}
+
+    def update(self, settings: HHDSettings):
+        if settings is not self.settings:
+            self.settings = settings
+            self.responses = {}
+
+    def get(
+        self,
+        conf: Config,
+        locales: Sequence[HHDLocale],
+        lang: str | None,
+        user_lang: str | None,
+    ) -> SettingsResponse:
+        v = translate_ver(conf, lang=lang, user_lang=user_lang)
+        if v in self.responses:
+            return self.responses[v]
+
+        s = dict(deepcopy(self.settings or {}))
+        try:
+            s["hhd"]["version"] = {  # type: ignore
+                "type": "version",
+                "tags": ["non-essential", "advanced", "expert", "hide"],
+                "value": v,
+            }
+        except Exception as e:
+            logger.error(f"Error while writing version hash to response.")
+        s = translate(s, conf, locales, lang=lang, user_lang=user_lang)
+
+        data = json.dumps(s).encode()
+        etag = '"' + hashlib.md5(data).hexdigest()[:16] + '"'
+        gz = None
+        if len(data) >= GZIP_MIN_SIZE:
+            gz = gzip.compress(data, mtime=0)
+
+        res = SettingsResponse(v, etag, data, gz)
+        self.responses[v] = res
+        return res
+
+
+def etag_matches(etag: str, header: str | None):
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag or tag == "*":
+            return True
+    return False
+
+
+def accepts_gzip(header: str | None):
+    if not header:
+        return False
+    for enc in header.split(","):
+        name, _, q = enc.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return q.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00")
+    return False
+
+
 class RestHandler(BaseHTTPRequestHandler):
     settings: HHDSettings
     cond: Condition
+    state: StateCache
+    settings_cache: SettingsCache
     conf: Config
     info: Config
     profiles: Mapping[str, Config]
@@ -189,7 +395,7 @@ class RestHandler(BaseHTTPRequestHandler):
                     profile = sanitize_name(params["profile"][0])
                     if profile not in self.profiles:
                         return self.send_error(f"Profile '{profile}' not found.")
-                    self.send_json(self.profiles[profile].conf)
+                    self.send_json(self.profiles[profile].data)
                 case "set":
                     if "profile" not in params:
                         return self.send_error(f"Profile not specified")
@@ -205,7 +411,7 @@ class RestHandler(BaseHTTPRequestHandler):
 
                     # Return the profile
                     if profile in self.profiles:
-                        self.send_json(self.profiles[profile].conf)
+                        self.send_json(self.profiles[profile].data)
                     else:
                         self.send_error(f"Applied profile not found (race condition?).")
                 case "del":
@@ -269,6 +475,53 @@ class RestHandler(BaseHTTPRequestHandler):
         with open(img, "rb") as f:
             self.wfile.write(f.read())
 
+    def render_state(self, lang: str | None, since: int | None) -> bytes:
+        """Renders the state of the current revision, or the changes after
+        revision `since`, as translated json. The condition should be held."""
+        return self.state.render(self.locales, lang, self.user_lang, since)
+
+    def render_events(
+        self, lang: str | None, since: int | None, settings: Any
+    ) -> tuple[bytes, int, Any]:
+        """Renders the stream events for the changes after revision `since` and
+        for new `settings`. Returns the events, and the revision and settings
+        they bring the client to. The condition should be held."""
+        out = b""
+        if self.settings_cache.settings is not settings:
+            settings = self.settings_cache.settings
+            v = translate_ver(self.conf, lang=lang, user_lang=self.user_lang)
+            out += format_event("settings", json.dumps({"version": v}).encode())
+
+        rev = self.state.revision
+        if rev != since:
+            out += format_event("state", self.render_state(lang, since or 0), rev)
+        return out, rev, settings
+
+    def handle_stream(self, lang: str | None, since: int | None):
+        """Streams state and settings changes as server-sent events until the
+        client disconnects or the server closes."""
+        self.set_response(200, STREAM_HEADERS)
+        settings = None
+        while True:
+            with self.cond:
+                out, since, settings = self.render_events(lang, since, settings)
+            if out:
+                self.wfile.write(out)
+            else:
+                self.wfile.write(b": keepalive\n\n")
+            self.wfile.flush()
+
+            with self.cond:
+                self.cond.wait_for(
+                    lambda: self.state.revision != since
+                    or self.settings_cache.settings is not settings
+                    or self.state.closed,
+                    timeout=STREAM_KEEPALIVE,
+                )
+                if self.state.closed:
+                    return
+            time.sleep(STREAM_COALESCE)
+
     def v1_endpoint(self, content: Any | None):
         segments, params = parse_path(self.path)
         langs = params.get("lang", params.get("locale", None))
@@ -297,24 +550,31 @@ class RestHandler(BaseHTTPRequestHandler):
             case "profile":
                 self.handle_profile(segments[3:], params, content)
             case "settings":
-                v = translate_ver(self.conf, lang=lang, user_lang=self.user_lang)
-                self.set_response_ok({"Version": v})
                 with self.cond:
-                    s = dict(deepcopy(self.settings))
-                    try:
-                        s["hhd"]["version"] = {  # type: ignore
-                            "type": "version",
-                            "tags": ["non-essential", "advanced", "expert", "hide"],
-                            "value": v,
-                        }
-                    except Exception as e:
-                        logger.error(f"Error while writing version hash to response.")
-                    s = translate(
-                        s, self.conf, self.locales, lang=lang, user_lang=self.user_lang
+                    res = self.settings_cache.get(
+                        self.conf, self.locales, lang, self.user_lang
                     )
-                    self.wfile.write(json.dumps(s).encode())
+
+                headers = {"Version": res.version, "ETag": res.etag}
+                if etag_matches(res.etag, self.headers.get("If-None-Match", None)):
+                    return self.set_response(304, {**STANDARD_HEADERS, **headers})
+
+                data = res.data
+                headers["Vary"] = "Accept-Encoding"
+                if res.gzip and accepts_gzip(self.headers.get("Accept-Encoding", None)):
+                    data = res.gzip
+                    headers["Content-Encoding"] = "gzip"
+                headers["Content-Length"] = str(len(data))
+                self.set_response_ok(headers)
+                self.wfile.write(data)
             case "state":
-                self.set_response_ok()
+                since = None
+                if "since" in params:
+                    try:
+                        since = int(params["since"][0])
+                    except ValueError:
+                        return self.send_error(f"Revision should be an integer.")
+
                 with self.cond:
                     if content:
                         if not isinstance(content, Mapping):
@@ -323,21 +583,29 @@ class RestHandler(BaseHTTPRequestHandler):
                             )
                         self.emit({"type": "state", "config": Config(content)})
                         self.cond.wait()
+                    elif "poll" in params and since is not None:
+                        # Hang until the state changes after the revision
+                        self.cond.wait_for(
+                            lambda: self.state.revision != since or self.state.closed,
+                            timeout=STATE_POLL_TIMEOUT,
+                        )
                     elif "poll" in params:
                         # Hang for the next update if the UI requests it.
                         self.cond.wait()
-                    out = {**cast(dict, self.conf.conf), "info": self.info.conf}
-                    out["version"] = translate_ver(
-                        self.conf, lang=lang, user_lang=self.user_lang
-                    )
-                    out = translate(
-                        out,
-                        self.conf,
-                        self.locales,
-                        lang=lang,
-                        user_lang=self.user_lang,
-                    )
-                    self.wfile.write(json.dumps(out).encode())
+                    rev = self.state.revision
+                    out = self.render_state(lang, since)
+
+                self.set_response_ok({"Revision": str(rev)})
+                self.wfile.write(out)
+            case "stream":
+                try:
+                    since = parse_since(params, self.headers)
+                except ValueError:
+                    return self.send_error(f"Revision should be an integer.")
+                self.handle_stream(lang, since)
+            case "stats":
+                # Controller loop stats, `?reset` clears them after reading
+                self.send_json(get_stats(reset="reset" in params))
             case "version":
                 self.send_json({"version": 5})
             case "sections":
@@ -421,21 +689,28 @@ class UnixHTTPServer(ThreadingMixIn, TCPServer):
 
 
 class HHDHTTPServer:
+
     def __init__(
         self,
         localhost: bool,
         port: int,
         token: str | None,
+        backend: str = HTTP_BACKEND,
     ) -> None:
         self.localhost = localhost
         self.port = port
+        self.backend = backend
         cond = Condition()
+        state = StateCache()
+        settings_cache = SettingsCache()
 
         # Have to subclass to create closure
         class NewRestHandler(RestHandler):
             pass
 
         NewRestHandler.cond = cond
+        NewRestHandler.state = state
+        NewRestHandler.settings_cache = settings_cache
         NewRestHandler.token = token
         self.handler = NewRestHandler
 
@@ -445,14 +720,19 @@ class HHDHTTPServer:
             pass
 
         NewUnixHandler.cond = cond
+        NewUnixHandler.state = state
+        NewUnixHandler.settings_cache = settings_cache
         NewUnixHandler.token = None
         self.uhandler = NewUnixHandler
 
         self.cond = cond
+        self.state = state
+        self.settings_cache = settings_cache
         self.https = None
         self.t = None
         self.unix = None
         self.tu = None
+        self.aio = None
 
     def update(
         self,
@@ -477,9 +757,27 @@ class HHDHTTPServer:
                 # Only load user lang once to avoid weirdness
                 self.handler.user_lang = get_user_lang(ctx)
                 self.uhandler.user_lang = self.handler.user_lang
+            changed = self.state.update(conf, info)
+            if changed and self.aio:
+                # Render once for all waiting clients
+                try:
+                    self.state.render(locales, None, self.handler.user_lang)
+                except Exception as e:
+                    logger.error(f"Could not render state. Error:\n{e}")
+            self.settings_cache.update(settings)
+            try:
+                # Render the settings for the current language ahead of time
+                self.settings_cache.get(conf, locales, None, self.handler.user_lang)
+            except Exception as e:
+                logger.error(f"Could not render settings. Error:\n{e}")
             self.cond.notify_all()
+        if self.aio:
+            self.aio.notify()
 
     def open(self):
+        if self.backend == "asyncio":
+            return self._open_asyncio()
+
         self.https = ThreadingSimpleServer(
             ("127.0.0.1" if self.localhost else "", self.port), self.handler
         )
@@ -499,7 +797,32 @@ class HHDHTTPServer:
         except Exception as e:
             logger.error(f"Error starting server at '/run/hhd/api':\n{e}")
 
+    def _open_asyncio(self):
+        from .aio import AsyncHTTPServer
+
+        self.aio = AsyncHTTPServer()
+        self.aio.open_tcp(
+            self.handler, "127.0.0.1" if self.localhost else "", self.port
+        )
+
+        try:
+            if not os.path.exists("/run/hhd"):
+                os.mkdir("/run/hhd", 0o700)
+            else:
+                os.chmod("/run/hhd", 0o700)
+            if os.path.exists("/run/hhd/api"):
+                os.remove("/run/hhd/api")
+            self.aio.open_unix(self.uhandler, "/run/hhd/api")
+        except Exception as e:
+            logger.error(f"Error starting server at '/run/hhd/api':\n{e}")
+
     def close(self):
+        with self.cond:
+            self.state.closed = True
+            self.cond.notify_all()
+        if self.aio:
+            self.aio.close()
+            self.aio = None
         if self.https and self.t:
             with self.cond:
                 self.cond.notify_all()
@@ -24,9 +24,9 @@ Commands:
         be the ones that were set if they were rejected. Use None to remove a key.
     poll: Same as get but will wait for the next Handheld Daemon event loop to
         return. The loop runs every 2s or whenever an event is received.
-    track: Continuously track the provided values. Same as calling get and then 
-        poll repeatedly. The separator between updates can be changed with --sep. 
-        Default is \\n. track will print the values even if they did not change.
+    track: Continuously track the provided values. Prints them and then prints 
+        them again whenever the state changes, using the /api/v1/stream endpoint. 
+        The separator between updates can be changed with --sep. Default is \\n.
 
 Examples:
     hhdctl get
@@ -63,8 +63,36 @@ def _request(*args, **kwargs):
     return con.getresponse()
 
 
-def _get_state(poll: bool = False):
-    return _request("GET", f"/api/v1/state{'?poll' if poll else ''}")
+def _get_state(poll: bool = False, since: int | None = None):
+    query = []
+    if poll:
+        query.append("poll")
+    if since is not None:
+        query.append(f"since={since}")
+    return _request("GET", f"/api/v1/state{'?' + '&'.join(query) if query else ''}")
+
+
+def _read_events(res):
+    """Yields the `(event, data)` of a server-sent event stream."""
+    event = None
+    data = []
+    while line := res.readline():
+        line = line.rstrip(b"\r\n").decode()
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+            event = None
+            data = []
+        elif line.startswith(":"):
+            # Keepalive
+            continue
+        else:
+            k, _, v = line.partition(":")
+            v = v[1:] if v.startswith(" ") else v
+            if k == "event":
+                event = v
+            elif k == "data":
+                data.append(v)
 
 
 def _set_state(state):
@@ -85,8 +113,11 @@ def _get(keys, poll: bool = False, state=None, values: bool = False):
         logger.error(f"Failed to get state with status: {state.status}")
         return 2
 
+    return _print(keys, unroll_dict(json.loads(state.read())), values)
+
+
+def _print(keys, data, values: bool = False):
     out = ""
-    data = unroll_dict(json.loads(state.read()))
     err = 0
     for k in keys or data:
         if k not in data or data[k] is None:
@@ -115,13 +146,76 @@ def _get(keys, poll: bool = False, state=None, values: bool = False):
     return err
 
 
+def apply_changes(data: dict, changes: dict):
+    """Applies the changed dotted paths returned by `/api/v1/state?since=N`
+    to the unrolled state `data`."""
+    for k, v in changes.items():
+        for old in [d for d in data if d == k or d.startswith(k + ".")]:
+            del data[old]
+        if isinstance(v, dict):
+            data.update(_unroll_dict(v, k))
+        elif v is not None:
+            data[k] = v
+    return data
+
+
 def _track(keys, sep, values):
-    poll = False
+    keys = [k.split("=", 1)[0] for k in keys] if keys else keys
+    res = _request("GET", "/api/v1/stream")
+    if res.status != 200:
+        # Older versions do not support streaming
+        res.read()
+        return _track_poll(keys, sep, values)
+
+    data = {}
+    for event, payload in _read_events(res):
+        if event != "state":
+            continue
+        upd = json.loads(payload)
+        if "state" in upd:
+            data = unroll_dict(upd["state"])
+        else:
+            apply_changes(data, upd["changes"])
+            data["version"] = upd["version"]
+
+        _print(keys, data, values)
+        sys.stdout.write(sep)
+        sys.stdout.flush()
+
+    logger.error("Handheld Daemon closed the connection.")
+    return 2
+
+
+def _track_poll(keys, sep, values):
+    state = _get_state()
+    if state.status != 200:
+        logger.error(f"Failed to get state with status: {state.status}")
+        return 2
+    rev = int(state.getheader("Revision", "0"))
+    data = unroll_dict(json.loads(state.read()))
+
     while True:
-        _get(keys, poll=poll, values=values)
+        _print(keys, data, values)
         sys.stdout.write(sep)
         sys.stdout.flush()
-        poll = True
+
+        # Only fetch what changed since the last revision
+        state = _get_state(poll=True, since=rev)
+        if state.status != 200:
+            logger.error(f"Failed to get state with status: {state.status}")
+            return 2
+        upd = json.loads(state.read())
+        if "revision" not in upd:
+            # Older versions do not support revisions
+            data = unroll_dict(upd)
+            continue
+
+        rev = upd["revision"]
+        if "state" in upd:
+            data = unroll_dict(upd["state"])
+        else:
+            apply_changes(data, upd["changes"])
+            data["version"] = upd["version"]
 
 
 def _set(keys, values):
@@ -209,8 +303,8 @@ def set_state(state):
     return json.loads(res.read())
 
 
-def get_state(poll: bool = False):
-    res = _get_state(poll)
+def get_state(poll: bool = False, since: int | None = None):
+    res = _get_state(poll, since)
     if res.status != 200:
         raise Exception(f"Failed to get state with status: {res.status}")
     return json.loads(res.read())
@@ -232,6 +326,7 @@ ALL = {
     "set_state": set_state,
     "get_state": get_state,
     "unroll_dict": unroll_dict,
+    "apply_changes": apply_changes,
     "main": main,
 }
 
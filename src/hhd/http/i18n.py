@@ -7,6 +7,10 @@ from typing import Mapping, Sequence, cast
 from hhd.plugins import Config, Context, HHDLocale, HHDSettings
 
 _translations = {}
+# (domains, languages): mo files
+_mo_files = {}
+# mo files: merged translation
+_merged = {}
 
 
 def get_user_lang(ctx: Context):
@@ -58,9 +62,18 @@ def get_mo_files(
     else:
         languages = None
 
+    # Locales are installed with the plugins, so look them up once
+    key = (
+        tuple((locale["domain"], locale["dir"]) for locale in locales),
+        tuple(languages) if languages else None,
+    )
+    if key in _mo_files:
+        return _mo_files[key]
+
     fns = []
     for locale in locales:
         fns.extend(find(locale["domain"], locale["dir"], languages, all=True))
+    _mo_files[key] = fns
     return fns
 
 
@@ -70,7 +83,10 @@ def translation(
     lang: str | None = None,
     user_lang: str | None = None,
 ):
-    mofiles = get_mo_files(conf, locales, lang, user_lang)
+    mofiles = tuple(get_mo_files(conf, locales, lang, user_lang))
+    if mofiles in _merged:
+        return _merged[mofiles]
+
     result = None
     for mofile in mofiles:
         key = (GNUTranslations, os.path.abspath(mofile))
@@ -84,6 +100,7 @@ def translation(
             result = t
         else:
             result.add_fallback(t)
+    _merged[mofiles] = result
     return result
 
 
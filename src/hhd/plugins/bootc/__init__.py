@@ -16,6 +16,8 @@ from hhd.plugins.conf import Config
 logger = logging.getLogger(__name__)
 
 REFRESH_HZ = 3
+# The running command is checked for completion at this interval
+LOADING_POLL_INTERVAL = 2
 PROGRESS_STAGES = {
     "pulling": (_("Downloading:"), 0, 80),
     "importing": (_("Importing:"), 80, 10),
@@ -680,6 +682,12 @@ class BootcPlugin(HHDPlugin):
                     self._init(conf)
                     self.proc = None
 
+    def next_wake(self):
+        # Poll the running command, the rest runs on configuration changes
+        if self.state in ("loading", "loading_cancellable", "loading_rebase"):
+            return time.monotonic() + LOADING_POLL_INTERVAL
+        return None
+
     def close(self):
         if self.proc:
             self.proc.send_signal(signal.SIGINT)
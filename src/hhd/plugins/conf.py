@@ -13,6 +13,10 @@ from typing import (
 Pytree = int | float | str | Sequence["Pytree"] | Mapping[str, "Pytree"]
 A = TypeVar("A")
 
+# Past this many changed paths, consider the whole tree changed. Bounds memory
+# for configs that are written to but never have their dirty paths consumed.
+MAX_DIRTY = 256
+
 
 def parse_conf(c: Pytree, out: MutableMapping | None = None):
     if not isinstance(c, MutableMapping):
@@ -85,28 +89,176 @@ def compare_dicts(a, b):
     return True
 
 
+def merge_tree(
+    old: Pytree,
+    new: Pytree,
+    dirty: MutableSequence[str] | None = None,
+    prefix: str = "",
+) -> tuple[Pytree, bool]:
+    """Merges the normalized tree `new` on top of `old` without modifying
+    either. Subtrees that do not change are shared with `old`, so only the
+    spine leading to a modified value is copied. Returns the merged tree and
+    whether it differs from `old`. The dotted paths of the changed nodes are
+    appended to `dirty`, if provided."""
+    if not isinstance(new, Mapping) or not isinstance(old, Mapping):
+        if type(old) is type(new) and old == new:
+            return old, False
+        if dirty is not None:
+            dirty.append(prefix)
+        return new, True
+
+    out = None
+    for k, v in new.items():
+        path = f"{prefix}.{k}" if prefix else k
+        if k in old:
+            n, changed = merge_tree(old[k], v, dirty, path)
+        else:
+            n, changed = v, True
+            if dirty is not None:
+                dirty.append(path)
+        if changed:
+            if out is None:
+                out = dict(old)
+            out[k] = n
+
+    if out is None:
+        return old, False
+    return out, True
+
+
+def remove_tree(old: Mapping, seq: Sequence[str]) -> Mapping:
+    """Returns a copy of `old` with the value under `seq` removed, copying
+    only the spine leading to it."""
+    out = dict(old)
+    if len(seq) == 1:
+        del out[seq[0]]
+    else:
+        out[seq[0]] = remove_tree(cast(Mapping, old[seq[0]]), seq[1:])
+    return out
+
+
+def diff_tree(
+    old: Pytree, new: Pytree, out: dict[str, Any], prefix: str = ""
+) -> dict[str, Any]:
+    """Adds the dotted paths that differ between `old` and `new` to `out`,
+    with their value in `new` (`None` for removed paths). Subtrees shared by
+    both trees are skipped without being walked."""
+    if old is new:
+        return out
+    if isinstance(old, Mapping) and isinstance(new, Mapping):
+        for k, v in new.items():
+            path = f"{prefix}.{k}" if prefix else k
+            if k in old:
+                diff_tree(old[k], v, out, path)
+            else:
+                out[path] = v
+        for k in old:
+            if k not in new:
+                out[f"{prefix}.{k}" if prefix else k] = None
+    elif not (type(old) is type(new) and old == new):
+        out[prefix] = new
+    return out
+
+
+def copy_tree(d: Pytree) -> Pytree:
+    if isinstance(d, (int, float, str, bool)) or d is None:
+        return d
+    return deepcopy(d)
+
+
 class Config:
+    """Thread-safe configuration tree.
+
+    The tree is persistent: nodes are never modified after being stored, so
+    reads (`conf["a.b"]`, `copy()`) return views that share their subtree with
+    the parent instead of copying it. Writes copy only the spine leading to the
+    modified value and bump `version` if it changed. Resolved paths are cached
+    in a flat index that is cleared whenever the tree changes.
+
+    The dotted paths changed since the last call to `pop_dirty()` are tracked,
+    so consumers such as `validate_config` can process only what changed."""
+
     def __init__(
         self, conf: Pytree | Sequence[Pytree] = [], readonly: bool = False
     ) -> None:
-        self._conf: Pytree | MutableMapping = {}
+        self._conf: Pytree | Mapping = {}
+        self._index: dict[Any, Pytree] = {}
         self._lock = Lock()
         self._updated = False
+        self._version = 0
+        self._dirty: list[str] | None = None
         self.readonly = readonly
         self.update(conf)
         self.updated = False
+        self._dirty = None
+
+    @staticmethod
+    def _view(d: Pytree) -> "Config":
+        c = Config.__new__(Config)
+        c._conf = d
+        c._index = {}
+        c._lock = Lock()
+        c._updated = False
+        c._version = 0
+        c._dirty = None
+        c.readonly = False
+        return c
+
+    def _set_root(self, root: Pytree, dirty: Sequence[str] | None = None):
+        # Lock should be held
+        self._conf = root
+        self._index = {}
+        self._version += 1
+        self._updated = True
+        if dirty is None:
+            self._dirty = None
+        elif self._dirty is not None:
+            self._dirty.extend(dirty)
+            if len(self._dirty) > MAX_DIRTY:
+                self._dirty = None
+
+    def _lookup(self, key: str | tuple[str, ...]) -> Pytree:
+        # Lock should be held
+        ikey = key if isinstance(key, (str, tuple)) else tuple(key)
+        try:
+            return self._index[ikey]
+        except KeyError:
+            pass
+
+        d = self._conf
+        for s in to_seq(key):
+            if not isinstance(d, Mapping):
+                raise TypeError(f"Config node '{s}' parent is not a mapping.")
+            d = d[s]
+        self._index[ikey] = d
+        return d
 
     def update(self, conf: Pytree | Sequence[Pytree]):
         with self._lock:
             conf = deepcopy(conf)
+            changed = False
+            dirty: list[str] | None = []
             if isinstance(conf, Sequence):
-                self._conf = parse_confs(conf, self._conf)
+                root = self._conf if isinstance(self._conf, Mapping) else {}
+                for c in conf:
+                    if isinstance(c, Mapping):
+                        if not isinstance(root, Mapping):
+                            root = {}
+                        root, ch = merge_tree(root, parse_conf(c), dirty)
+                        changed = changed or ch
+                    else:
+                        root = c
+                        changed = True
+                        dirty = None
+            elif isinstance(self._conf, Mapping):
+                root, changed = merge_tree(self._conf, parse_conf(conf), dirty)
             else:
-                if isinstance(self._conf, MutableMapping):
-                    parse_conf(conf, self._conf)
-                else:
-                    self._conf = conf
-        self.updated = True
+                root, changed = conf, True
+                dirty = None
+
+            if changed:
+                self._set_root(root, dirty)
+            self._updated = True
 
     def __eq__(self, __value: object) -> bool:
         if not isinstance(__value, Config):
@@ -116,6 +268,8 @@ class Config:
             return True
 
         with __value._lock, self._lock:
+            if __value._conf is self._conf:
+                return True
             return compare_dicts(__value._conf, self._conf)
 
     def __setitem__(self, key: str | tuple[str, ...], val):
@@ -130,49 +284,37 @@ class Config:
                 d = d[s]
 
             d[seq[-1]] = val
-            if isinstance(self._conf, MutableMapping):
-                init = deepcopy(self._conf)
-                parse_conf(cont, self._conf)
-                # FIXME: verify no regressions
-                if init != self._conf:
-                    self._updated = True
+            if isinstance(self._conf, Mapping):
+                dirty = []
+                root, changed = merge_tree(self._conf, parse_conf(cont), dirty)
+                if changed:
+                    self._set_root(root, dirty)
             else:
-                self._conf = cont
-                if self._conf != cont:
-                    self._updated = True
+                self._set_root(cont)
 
     def __contains__(self, key: str | tuple[str, ...]):
         with self._lock:
-            seq = to_seq(key)
-            d = self._conf
-            for s in seq:
-                if s not in d:
-                    return False
-                d = cast(Mapping, d)[s]
+            try:
+                self._lookup(key)
+            except (KeyError, TypeError):
+                return False
         return True
 
     def __getitem__(self, key: str | tuple[str, ...]) -> "Config":
         with self._lock:
-            assert isinstance(self._conf, MutableMapping)
-            seq = to_seq(key)
-            d = self._conf
-            for s in seq:
-                d = cast(Mapping, d)[s]
-            return Config([deepcopy(d)])
+            assert isinstance(self._conf, Mapping)
+            return Config._view(self._lookup(key))
 
     def __delitem__(self, key: str | tuple[str, ...]):
         with self._lock:
-            assert isinstance(self._conf, MutableMapping)
+            assert isinstance(self._conf, Mapping)
             seq = to_seq(key)
-            d = self._conf
-            for s in seq[:-1]:
-                d = cast(Mapping, d)[s]
-            del d[seq[-1]]
-        self.updated = True
+            self._set_root(remove_tree(self._conf, seq), [".".join(seq)])
 
     def get(self, key, default: A) -> A:
         try:
-            return self[key].to(type(default))
+            with self._lock:
+                return cast(A, copy_tree(self._lookup(key)))
         except KeyError:
             return default
         except TypeError:
@@ -190,12 +332,50 @@ class Config:
         return cast(t, self.conf)
 
     def copy(self):
-        return Config([self.conf])
+        with self._lock:
+            return Config._view(self._conf)
 
     @property
     def conf(self):
         with self._lock:
-            return deepcopy(self._conf)
+            return copy_tree(self._conf)
+
+    @property
+    def data(self):
+        """Returns the node without copying it. It is shared with the tree (and
+        its copies), so it must not be modified; use `conf` for a copy."""
+        with self._lock:
+            return self._conf
+
+    def diff(self, other: "Config") -> dict[str, Any]:
+        """Returns the dotted paths that changed from this config to `other`
+        with their new values (`None` if removed). The values are shared with
+        `other` and should not be modified. Cheap for copies of the same
+        config, since their unchanged subtrees are shared."""
+        if other is self:
+            return {}
+        with self._lock, other._lock:
+            return diff_tree(self._conf, other._conf, {})
+
+    def pop_dirty(self) -> Sequence[str] | None:
+        """Returns the dotted paths that changed since the previous call and
+        resets them. Returns `None` if the whole tree should be considered
+        changed (e.g., a new config or one replaced by a non-mapping)."""
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = []
+            return dirty
+
+    def mark_dirty(self):
+        """Marks the whole tree as changed for the next `pop_dirty()`."""
+        with self._lock:
+            self._dirty = None
+
+    @property
+    def version(self):
+        """Increases every time the contents of the config change."""
+        with self._lock:
+            return self._version
 
     @property
     def updated(self):
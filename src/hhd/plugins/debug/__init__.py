@@ -164,6 +164,12 @@ class DebugPlugin(HHDPlugin):
             self.t = Thread(target=prepare_hhd_dev, args=(self.error,))
             self.t.start()
 
+    def next_wake(self):
+        # Check for the downloads to finish
+        if self.t or self.fpaste_t:
+            return super().next_wake()
+        return None
+
     def close(self):
         if self.t:
             self.t.join()
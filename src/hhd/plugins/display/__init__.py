@@ -5,28 +5,39 @@ from hhd.plugins import (
     Context,
 )
 from time import sleep
+from threading import Event as TEvent, Thread
 from hhd.plugins import HHDSettings, load_relative_yaml
 import logging
 
+from hhd.controller.lib.sysfs import SysfsAttr, get_cache
 from hhd.plugins.conf import Config
 
 logger = logging.getLogger(__name__)
 BACKLIGHT_DIR = "/sys/class/backlight/"
+WATCH_TIMEOUT = 1
 
 
 def write_sysfs(dir: str, fn: str, val: Any):
-    with open(os.path.join(dir, fn), "w") as f:
-        f.write(str(val))
+    get_cache().write(os.path.join(dir, fn), val)
 
 
 def read_sysfs(dir: str, fn: str, default: str | None = None):
+    return get_cache().read(os.path.join(dir, fn), default)
+
+
+def watch_brightness(dir: str, emit, should_exit: TEvent):
+    # The backlight core notifies `actual_brightness` when the brightness
+    # changes (e.g., with the hotkeys), wake up the main loop to show it
+    attr = SysfsAttr(os.path.join(dir, "actual_brightness"), notify=True)
     try:
-        with open(os.path.join(dir, fn), "r") as f:
-            return f.read().strip()
+        while not should_exit.is_set():
+            attr.read()
+            if attr.changed(WATCH_TIMEOUT):
+                emit.wake()
     except Exception as e:
-        if default is not None:
-            return default
-        raise e
+        logger.warning(f"Stopped watching display brightness. Error:\n{e}")
+    finally:
+        attr.close()
 
 
 class DisplayPlugin(HHDPlugin):
@@ -37,6 +48,8 @@ class DisplayPlugin(HHDPlugin):
 
         self.display = None
         self.max_brightness = 255
+        self.t = None
+        self.should_exit = None
 
     def settings(self) -> HHDSettings:
         if self.display:
@@ -63,6 +76,12 @@ class DisplayPlugin(HHDPlugin):
 
         if self.display is None:
             logger.warning(f"Display with variable brightness not found. Exitting.")
+        else:
+            self.should_exit = TEvent()
+            self.t = Thread(
+                target=watch_brightness, args=(self.display, emit, self.should_exit)
+            )
+            self.t.start()
 
     def update(self, conf: Config):
         if not self.display:
@@ -120,8 +139,15 @@ class DisplayPlugin(HHDPlugin):
             # Set conf to avoid repeated updates
             conf["general.display.brightness"] = curr
 
+    def next_wake(self):
+        return None
+
     def close(self):
-        pass
+        if self.should_exit:
+            self.should_exit.set()
+        if self.t:
+            self.t.join()
+            self.t = None
 
 
 def autodetect(existing: Sequence[HHDPlugin]) -> Sequence[HHDPlugin]:
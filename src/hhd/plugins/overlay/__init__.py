@@ -1,5 +1,6 @@
 import logging
 import os
+import time
 from threading import Event as TEvent
 from threading import Thread
 from typing import Sequence
@@ -8,9 +9,10 @@ from hhd.plugins import Config, Context, Event, HHDPlugin, load_relative_yaml
 from hhd.utils import expanduser
 
 from ..plugin import open_steam_kbd
+from .base import OVERLAY_CHECK_INTERVAL
 from .const import get_system_info, get_touchscreen_quirk
 from .controllers import QamHandlerKeyboard, device_shortcut_loop
-from .steam import get_games
+from .steam import SteamIndex
 from .x11 import is_gamescope_running
 
 logger = logging.getLogger(__name__)
@@ -21,9 +23,11 @@ HHD_OVERLAY_DISABLE = os.environ.get("HHD_OVERLAY_DISABLE", "0") == "1"
 FORCE_GAME = os.environ.get("HHD_FORCE_GAME_ID", None)
 SUPPORTS_HALVING = os.environ.get("HHD_GS_STEAMUI_HALFHZ", "0") == "1"
 SUPPORTS_DPMS = os.environ.get("HHD_GS_DPMS", "0") == "1"
+# Not in the config dir, as changes there cause a config reload
+STEAM_INDEX_FN = "~/.cache/hhd/steam_games.json"
 
 
-def load_steam_games(ctx: Context, emit, burnt_ids: set):
+def load_steam_games(ctx: Context, emit, burnt_ids: set, index: SteamIndex):
     # Defer loading until we enter a game
     info = emit.info
     curr = info.get("game.id", None)
@@ -43,14 +47,19 @@ def load_steam_games(ctx: Context, emit, burnt_ids: set):
     burnt_ids.add(curr)
 
     try:
-        # Load the games
-        games, images = get_games(expanduser("~/.local/share/Steam/appcache/", ctx))
+        # Only parses the parts of the appcache that changed since the last
+        # load, which are persisted in the index
+        if not index.refresh():
+            return None, None
+        games, images = index.get_games()
         logger.info(f"Loaded info for {len(games)} steam games.")
 
         # Add correct game data after refreshing the database (e.g., the user
         # downloaded a new game)
-        if curr and curr in games:
-            emit.info["game.data"] = games[curr]
+        if curr:
+            data = index.get_game(curr)
+            if data:
+                emit.info["game.data"] = data
 
         return games, images
     except Exception as e:
@@ -79,6 +88,7 @@ class OverlayPlugin(HHDPlugin):
 
         self.images = None
         self.burnt_ids = set()
+        self.steam_index = None
 
     def open(
         self,
@@ -92,6 +102,11 @@ class OverlayPlugin(HHDPlugin):
 
             self.ovf = OverlayService(context, emit)
             self.ctx = context
+            self.steam_index = SteamIndex(
+                expanduser("~/.local/share/Steam/appcache/", context),
+                expanduser(STEAM_INDEX_FN, context),
+                context,
+            )
             self.has_executable = bool(find_overlay_exe(context))
 
             if bool(os.environ.get("HHD_QAM_KEYBOARD", None)):
@@ -148,8 +163,10 @@ class OverlayPlugin(HHDPlugin):
         self.emit.set_simple_qam(not self.has_executable)
 
         # Load game information
-        if self.ctx:
-            games, images = load_steam_games(self.ctx, self.emit, self.burnt_ids)
+        if self.ctx and self.steam_index:
+            games, images = load_steam_games(
+                self.ctx, self.emit, self.burnt_ids, self.steam_index
+            )
             if games and images:
                 self.emit.set_gamedata(games, images)
         if FORCE_GAME:
@@ -236,6 +253,12 @@ class OverlayPlugin(HHDPlugin):
             else:
                 logger.info("No shortcuts enabled, not starting shortcut loop.")
 
+    def next_wake(self):
+        # Game changes wake up the main loop, only the overlay is polled
+        if self.ovf and self.ovf.installed:
+            return time.monotonic() + OVERLAY_CHECK_INTERVAL
+        return None
+
     def notify(self, events: Sequence[Event]):
         if self.ovf:
             self.ovf.notify(events)
@@ -245,6 +245,8 @@ def loop_manage_overlay(
                     game_data = emit.get_gamedata(str(game))
                     name = game_data["name"] if game_data else "Unknown Title"
                     emit.info["game.data"] = game_data
+                    # Load the steam games for the new game
+                    emit.wake()
                     if is_steam:
                         logger.info(f"Switched to steam.")
                     else:
@@ -498,4 +500,4 @@ class OverlayService:
             # If steam does not suspend us the following breaks:
             # # Fire screen_off while the powerbutton event is happening
             # logger.info("Powerbutton event detected, transitioning to standby.")
-            # standby_transition("screen_off")
\ No newline at end of file
+            # standby_transition("screen_off")
@@ -13,6 +13,7 @@ from evdev import InputDevice
 
 from hhd.controller import Event as ControllerEvent
 from hhd.controller.lib.ioctl import EVIOCSMASK, EVIOCGRABCLEAN
+from hhd.controller.lib.udev import UeventMonitor
 from hhd.controller.physical.evdev import B, list_evs, to_map
 from hhd.controller.virtual.uinput.monkey import UInput, UInputMonkey
 
@@ -628,13 +629,28 @@ def device_shortcut_loop(
     intercept = False
     intercept_num = 0
     devs = {}
+
+    # Rescan devices on hotplug instead of polling
+    monitor = None
+    try:
+        monitor = UeventMonitor(("input",), scan=False)
+    except Exception as e:
+        logger.warning(f"Could not open uevent monitor, polling devices. Error:\n{e}")
+    rescan = True
+    rescan_until = 0
+
     while not should_exit or not should_exit.is_set():
-        if devs:
+        r = []
+        if devs or (monitor and not init):
             # Wait for events
+            fds = [d["dev"].fd for d in devs.values()]
+            if monitor:
+                fds.append(monitor.fileno())
+            timeout = REFRESH_INTERVAL
+            if not devs and time.perf_counter() > rescan_until:
+                timeout = MONITOR_INTERVAL
             try:
-                r, _, _ = select.select(
-                    [d["dev"].fd for d in devs.values()], [], [], REFRESH_INTERVAL
-                )
+                r, _, _ = select.select(fds, [], [], timeout)
             except Exception:
                 pass
         elif not init:
@@ -714,9 +730,21 @@ def device_shortcut_loop(
                     pass
 
         # Avoid spamming proc
-        curr = time.time()
-        if curr - last_check < MONITOR_INTERVAL:
-            continue
+        curr = time.perf_counter()
+        if monitor:
+            if monitor.fileno() in r:
+                for action, _ in monitor.process():
+                    if action == "add":
+                        # Permissions are applied by udev after the add event
+                        # so keep rescanning for a bit
+                        rescan_until = curr + MONITOR_INTERVAL
+            if not rescan and curr > rescan_until:
+                continue
+            rescan = False
+        else:
+            if curr - last_check < MONITOR_INTERVAL:
+                continue
+            last_check = curr
 
         # Add new devices
         log = ""
@@ -839,6 +867,9 @@ def device_shortcut_loop(
         if log:
             logger.info(f"Found new shortcut devices:{log}")
 
+    if monitor:
+        monitor.close()
+
 
 AXIS_LIMIT = 0.5
 
@@ -1,41 +1,189 @@
 # import os
 
 # def get_game_data(appcache: str):from hhd.plugins.overlay.steam import appcache
+import json
+import logging
 import os
 
-from .appcache import parse_appinfo
+from hhd.utils import fix_perms
 
-def get_games(appdir: str):
-    with open(os.path.join(appdir, "appinfo.vdf"), 'rb') as f:
-        games = {}
-        _, data = parse_appinfo(f)
-        for d in data:
+from .appcache import AppinfoReader
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+NAME_PATH = ("appinfo", "common", "name")
+
+
+class SteamIndex:
+    """Index of the names and images of the games in the steam appcache.
+
+    The index is kept in `fn` (if provided) and is keyed on the mtime and size
+    of `appinfo.vdf` and the mtime of `librarycache`. When `appinfo.vdf`
+    changes, its app sections are walked with `AppinfoReader` and only the
+    names of the apps with a different `changeNumber` are decoded."""
+
+    def __init__(self, appdir: str, fn: str | None = None, ctx=None) -> None:
+        self.appdir = appdir
+        self.libdir = os.path.join(appdir, "librarycache")
+        self.fn = fn
+        self.ctx = ctx
+
+        self.appinfo_key = None
+        self.libcache_key = None
+        # appid: [change_number, name]
+        self.apps: dict[str, list] = {}
+        # appid: {image type: file name}
+        self.images: dict[str, dict[str, str]] = {}
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        if not self.fn or not os.path.isfile(self.fn):
+            return
+        try:
+            with open(self.fn, "r") as f:
+                data = json.load(f)
+            if data.get("version", None) != INDEX_VERSION:
+                return
+            self.appinfo_key = data["appinfo"]
+            self.libcache_key = data["librarycache"]
+            self.apps = data["apps"]
+            self.images = data["images"]
+        except Exception as e:
+            logger.warning(f"Could not load steam game index, rebuilding. Error:\n{e}")
+            self.appinfo_key = self.libcache_key = None
+            self.apps = {}
+            self.images = {}
+
+    def save(self):
+        if not self.fn:
+            return
+        try:
+            # Create the missing parent dirs owned by the user
+            missing = []
+            d = os.path.dirname(self.fn)
+            while d and not os.path.isdir(d):
+                missing.append(d)
+                d = os.path.dirname(d)
+            for d in reversed(missing):
+                os.mkdir(d)
+                if self.ctx:
+                    fix_perms(d, self.ctx)
+
+            tmp = self.fn + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(
+                    {
+                        "version": INDEX_VERSION,
+                        "appinfo": self.appinfo_key,
+                        "librarycache": self.libcache_key,
+                        "apps": self.apps,
+                        "images": self.images,
+                    },
+                    f,
+                    separators=(",", ":"),
+                )
+            os.replace(tmp, self.fn)
+            if self.ctx:
+                fix_perms(self.fn, self.ctx)
+        except Exception as e:
+            logger.warning(f"Could not save steam game index. Error:\n{e}")
+
+    def _update_apps(self, fn: str):
+        old = self.apps
+        apps = {}
+        decoded = 0
+
+        with open(fn, "rb") as f, AppinfoReader(f) as r:
+            for app in r.apps():
+                appid = str(app["appid"])
+                prev = old.get(appid, None)
+                if prev and prev[0] == app["change_number"]:
+                    apps[appid] = prev
+                    continue
+
+                # Only decode the name of new or changed apps
+                decoded += 1
+                name = r.get(app, NAME_PATH)
+                apps[appid] = [app["change_number"], name]
+
+        self.apps = apps
+        logger.info(f"Updated steam game index ({decoded}/{len(apps)} apps decoded).")
+
+    def _update_images(self):
+        images = {}
+        for fn in os.listdir(self.libdir):
             try:
-                appid = str(d['appid'])
-                name = d['data']['appinfo']['common']['name']
-                games[appid] = {"name": name, "images": []}
-            except KeyError:
+                id_split = fn.index("_")
+                ext_split = fn.rindex(".")
+                appid = fn[:id_split]
+                itype = fn[id_split + 1 : ext_split]
+
+                if appid not in images:
+                    images[appid] = {}
+                images[appid][itype] = fn
+            except ValueError:
                 pass
-    
-    images = {}
-    libdir = os.path.join(appdir, "librarycache")
-    for fn in os.listdir(libdir):
-        try:
-            id_split = fn.index('_')
-            ext_split = fn.rindex('.')
-            appid = fn[:id_split]
-            itype = fn[id_split+1:ext_split]
+        self.images = images
 
-            if appid not in games:
-                continue
+    def refresh(self) -> bool:
+        """Updates the index if the appcache changed. Returns whether the
+        index changed since the last call (always true for the first one)."""
+        changed = False
+        if not self.loaded:
+            self.load()
+            changed = True
 
-            games[appid]["images"].append(itype)
+        fn = os.path.join(self.appdir, "appinfo.vdf")
+        st = os.stat(fn)
+        appinfo_key = [st.st_mtime_ns, st.st_size]
+        libcache_key = os.stat(self.libdir).st_mtime_ns
+
+        dirty = False
+        if appinfo_key != self.appinfo_key:
+            self._update_apps(fn)
+            self.appinfo_key = appinfo_key
+            dirty = True
+        if libcache_key != self.libcache_key:
+            self._update_images()
+            self.libcache_key = libcache_key
+            dirty = True
+
+        if dirty:
+            self.save()
+        return changed or dirty
+
+    def get_game(self, appid: str) -> dict | None:
+        app = self.apps.get(appid, None)
+        if not app or app[1] is None:
+            return None
+        return {"name": app[1], "images": list(self.images.get(appid, {}))}
+
+    def get_image(self, appid: str, itype: str) -> str | None:
+        if not self.apps.get(appid, None):
+            return None
+        fn = self.images.get(appid, {}).get(itype, None)
+        if not fn:
+            return None
+        return os.path.join(self.libdir, fn)
+
+    def get_games(self):
+        games = {}
+        images = {}
+        for appid, (_, name) in self.apps.items():
+            if name is None:
+                continue
+            imgs = self.images.get(appid, {})
+            games[appid] = {"name": name, "images": list(imgs)}
+            if imgs:
+                images[appid] = {
+                    k: os.path.join(self.libdir, v) for k, v in imgs.items()
+                }
+        return games, images
 
-            if appid not in images:
-                images[appid] = {}
 
-            images[appid][itype] = os.path.join(libdir, fn)
-        except ValueError:
-            pass
-    
-    return games, images
\ No newline at end of file
+def get_games(appdir: str, index_fn: str | None = None, ctx=None):
+    idx = SteamIndex(appdir, index_fn, ctx)
+    idx.refresh()
+    return idx.get_games()
@@ -44,6 +44,7 @@ Appache file parsing examples:
 
 """
 
+import mmap
 import struct
 from .vdf import binary_load
 
@@ -152,6 +153,209 @@ def parse_appinfo(fp, mapper=None):
             apps_iter()
             )
 
+class AppinfoReader(object):
+    """Lazy reader for appinfo.vdf, backed by a memory map
+
+    The key table is decoded in one pass and the app sections are found by
+    skipping over their bodies using their ``size`` field. Only the values
+    that are requested are decoded, by walking the binary VDF of an app and
+    skipping over the subtrees that are not on the requested key path.
+
+    .. code:: python
+
+        >>> with AppinfoReader(open('appinfo.vdf', 'rb')) as r:
+        ...     r.get(5, ('appinfo', 'common', 'name'))
+
+    :param fp: file-like object with a ``fileno()``
+    :raises: SyntaxError
+    """
+    _HEADER_V27 = struct.Struct('<IIIIQ20sI')
+    _HEADER_V28 = struct.Struct('<IIIIQ20sI20s')
+    _int32 = struct.Struct('<i')
+
+    def __init__(self, fp):
+        self.mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self.mm
+
+        magic = mm[:4]
+        if magic not in (b"'DV\x07", b"(DV\x07", b")DV\x07"):
+            self.close()
+            raise SyntaxError("Invalid magic, got %s" % repr(magic))
+
+        self.header = {
+            'magic': magic,
+            'universe': uint32.unpack_from(mm, 4)[0],
+        }
+        self.start = 8
+        self.key_table = None
+        self._key_ids = {}
+        if magic[0] >= 41:  # b')'
+            key_table_offset = int64.unpack_from(mm, 8)[0]
+            key_count = uint32.unpack_from(mm, key_table_offset)[0]
+            self.key_table = [
+                k.decode('utf-8', 'replace')
+                for k in mm[key_table_offset + 4:].split(b'\x00', key_count)[:key_count]
+            ]
+            self.start = 16
+
+        self.app_header = self._HEADER_V27 if magic == b"'DV\x07" else self._HEADER_V28
+        self._offsets = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+
+    def apps(self):
+        """Iterates over the app section headers, without decoding the bodies.
+
+        Each app has the fields of :func:`parse_appinfo`, except ``data``, and
+        ``offset``, the offset of its binary VDF.
+        """
+        mm = self.mm
+        st = self.app_header
+        pos = self.start
+        offsets = {}
+        while True:
+            appid = uint32.unpack_from(mm, pos)[0]
+            if appid == 0:
+                break
+
+            vals = st.unpack_from(mm, pos)
+            app = {
+                'appid': appid,
+                'size': vals[1],
+                'info_state': vals[2],
+                'last_updated': vals[3],
+                'access_token': vals[4],
+                'sha1': vals[5],
+                'change_number': vals[6],
+            }
+            if len(vals) > 7:
+                app['data_sha1'] = vals[7]
+            app['offset'] = pos + st.size
+            offsets[appid] = (app['offset'], vals[1])
+
+            yield app
+            # 'size' counts the bytes after itself
+            pos += 8 + vals[1]
+
+        self._offsets = offsets
+
+    def offset(self, appid):
+        """Returns the offset of the binary VDF of ``appid`` or ``None``"""
+        if self._offsets is None:
+            for _ in self.apps():
+                pass
+        v = self._offsets.get(appid, None)
+        return v[0] if v else None
+
+    def get(self, app, path, default=None):
+        """Decodes the value at ``path`` (a sequence of keys) from the binary
+        VDF of ``app``, an appid or an app from :meth:`apps`. Returns
+        ``default`` if the app or value is missing. If the value is a subtree,
+        it is decoded fully."""
+        ofs = app['offset'] if isinstance(app, dict) else self.offset(app)
+        if ofs is None:
+            return default
+        return self.get_at(ofs, path, default)
+
+    def _key_id(self, key):
+        if self.key_table is None:
+            return key
+        ids = self._key_ids.get(key, None)
+        if ids is None:
+            ids = self._key_ids[key] = frozenset(
+                i for i, k in enumerate(self.key_table) if k == key
+            )
+        return ids
+
+    def _read_key(self, pos):
+        if self.key_table is not None:
+            return self._int32.unpack_from(self.mm, pos)[0], pos + 4
+        end = self.mm.find(b'\x00', pos)
+        return self.mm[pos:end].decode('utf-8', 'replace'), end + 1
+
+    def _skip_value(self, t, pos):
+        if t == 1:  # BIN_STRING
+            return self.mm.find(b'\x00', pos) + 1
+        if t in (2, 3, 4, 6):  # BIN_INT32, BIN_FLOAT32, BIN_POINTER, BIN_COLOR
+            return pos + 4
+        if t in (7, 10):  # BIN_UINT64, BIN_INT64
+            return pos + 8
+        if t == 5:  # BIN_WIDESTRING
+            while self.mm[pos:pos + 2] != b'\x00\x00':
+                pos += 2
+            return pos + 2
+        raise SyntaxError("Unknown data type at offset %d: %s" % (pos - 1, repr(t)))
+
+    def _skip_subtree(self, pos):
+        depth = 1
+        mm = self.mm
+        while depth:
+            t = mm[pos]
+            pos += 1
+            if t in (8, 11):  # BIN_END, BIN_END_ALT
+                depth -= 1
+                continue
+            _, pos = self._read_key(pos)
+            if t == 0:  # BIN_NONE
+                depth += 1
+            else:
+                pos = self._skip_value(t, pos)
+        return pos
+
+    def get_at(self, pos, path, default=None):
+        """Same as :meth:`get` for the binary VDF at offset ``pos``"""
+        mm = self.mm
+        ids = [self._key_id(k) for k in path]
+        use_ids = self.key_table is not None
+        if use_ids and not all(ids):
+            # A key missing from the key table can not be in the file
+            return default
+        depth = 0
+        while depth < len(ids):
+            t = mm[pos]
+            pos += 1
+            if t in (8, 11):  # BIN_END, BIN_END_ALT
+                return default
+
+            key, pos = self._read_key(pos)
+            match = key in ids[depth] if use_ids else key == ids[depth]
+            if not match:
+                pos = self._skip_subtree(pos) if t == 0 else self._skip_value(t, pos)
+            elif depth + 1 < len(ids):
+                if t != 0:
+                    return default
+                depth += 1
+            elif t == 0:
+                mm.seek(pos)
+                return binary_load(mm, key_table=self.key_table, mapper=dict)
+            else:
+                return self._read_value(t, pos)
+        return default
+
+    def _read_value(self, t, pos):
+        mm = self.mm
+        if t == 1:
+            return mm[pos:mm.find(b'\x00', pos)].decode('utf-8', 'replace')
+        if t == 5:
+            end = self._skip_value(t, pos) - 2
+            return mm[pos:end].decode('utf-16')
+        if t in (2, 4, 6):
+            return self._int32.unpack_from(mm, pos)[0]
+        if t == 3:
+            return struct.unpack_from('<f', mm, pos)[0]
+        if t == 7:
+            return uint64.unpack_from(mm, pos)[0]
+        if t == 10:
+            return int64.unpack_from(mm, pos)[0]
+        raise SyntaxError("Unknown data type at offset %d: %s" % (pos - 1, repr(t)))
+
 def parse_packageinfo(fp, mapper=dict):
     """Parse packageinfo.vdf from the Steam appcache folder
 
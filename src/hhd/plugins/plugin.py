@@ -2,6 +2,7 @@ import getpass
 import logging
 import os
 import subprocess
+import time
 from typing import Any, Literal, Mapping, NamedTuple, Protocol, Sequence, TypedDict
 
 from hhd.controller import Axis, Button, Configuration, ControllerEmitter, SpecialEvent
@@ -13,6 +14,8 @@ logger = logging.getLogger(__name__)
 
 STEAM_PID = "~/.steam/steam.pid"
 STEAM_EXE = "~/.steam/root/ubuntu12_32/steam"
+# Plugins that do not declare when they need to update are polled
+UPDATE_INTERVAL = 2
 
 
 class Context(NamedTuple):
@@ -110,6 +113,10 @@ class Emitter(ControllerEmitter):
         with self.intercept_lock:
             return self.images.get(game, {}).get(icon, None)
 
+    def wake(self):
+        """Wakes up the main loop to update all plugins, without an event."""
+        pass
+
 
 class HHDPlugin:
     name: str
@@ -138,6 +145,12 @@ class HHDPlugin:
     def notify(self, events: Sequence[Event]):
         pass
 
+    def next_wake(self) -> float | None:
+        """Returns the time (`time.monotonic()`) by which `update()` should run
+        again, or None if the plugin only needs to update on events and
+        configuration changes. Called after every `update()`."""
+        return time.monotonic() + UPDATE_INTERVAL
+
     def close(self):
         pass
 
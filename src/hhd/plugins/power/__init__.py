@@ -3,6 +3,7 @@ from typing import Sequence
 import os
 import time
 
+from hhd.controller.lib.sysfs import get_cache
 from hhd.plugins import Config, Context, HHDPlugin, load_relative_yaml
 from .power import (
     get_windows_bootnum,
@@ -24,25 +25,23 @@ LAST_ATTEMPT_BAIL = 30
 
 
 def thermal_check(therm: dict[str, int], bat: str | None, last_attempt: float = 0, wakeup: bool = False):
+    sysfs = get_cache()
     found = False
     for path, temp in therm.items():
-        with open(path) as f:
-            curr = int(f.read())
-            if curr >= temp:
-                logger.warning(
-                    f"Thermal zone {path} reached {curr // 1000}C, hibernating."
-                )
-                found = True
+        curr = int(sysfs.read(path))
+        if curr >= temp:
+            logger.warning(
+                f"Thermal zone {path} reached {curr // 1000}C, hibernating."
+            )
+            found = True
 
     if bat and not found:
-        with open(bat + "/status") as f:
-            dc = "discharging" in bat.lower()
+        dc = "discharging" in bat.lower()
 
-        with open(bat + "/capacity") as f:
-            curr = int(f.read())
-            if dc and curr <= BATTERY_LOW_THRESHOLD:
-                logger.warning(f"Battery level reached {curr}%, hibernating.")
-                found = True
+        curr = int(sysfs.read(bat + "/capacity"))
+        if dc and curr <= BATTERY_LOW_THRESHOLD:
+            logger.warning(f"Battery level reached {curr}%, hibernating.")
+            found = True
 
     if not found:
         return False
@@ -206,6 +205,14 @@ class PowerPlugin(HHDPlugin):
                     self.therm = {}
                     self.bat = None
 
+    def next_wake(self):
+        if not self.check_thermal:
+            return None
+        t = max(
+            self.last_check + TEMP_CHECK_INTERVAL, self.init + TEMP_CHECK_INITIALIZE
+        )
+        return time.monotonic() + max(t - time.time(), 0)
+
     def notify(self, events: Sequence):
         for ev in events:
             if ev["type"] == "special" and ev.get("event", None) == "wakeup":
@@ -49,6 +49,9 @@ class PowerbuttondPlugin(HHDPlugin):
             self.stop()
             logger.info('Stopping Steam Powerbutton Handler.')
 
+    def next_wake(self):
+        return None
+
     def start(self):
         from .base import power_button_run
 
@@ -281,7 +281,7 @@ class RgbPlugin(HHDPlugin):
         # Get event info
         mode = rgb_conf["mode"].to(str)
         if mode in rgb_conf:
-            info = cast(dict, rgb_conf[mode].conf)
+            info = cast(dict, rgb_conf[mode].data)
         else:
             info = {}
         ev: Event | None = None
@@ -405,6 +405,24 @@ class RgbPlugin(HHDPlugin):
         if init:
             self.queue_leds = None
 
+    def next_wake(self):
+        if not self.enabled or self.controller:
+            return None
+
+        # Retry initializing or send the queued full command. Timers that
+        # are not in the future were not consumed by the last update.
+        if self.init:
+            t = self.init_last + RGB_SET_INTERVAL
+        elif self.queue_leds:
+            t = self.queue_leds
+        else:
+            return None
+
+        delay = t - time.perf_counter()
+        if delay <= 0:
+            return None
+        return time.monotonic() + delay
+
 
 def autodetect(existing: Sequence[HHDPlugin]) -> Sequence[HHDPlugin]:
     if len(existing):
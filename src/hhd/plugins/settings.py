@@ -2,16 +2,20 @@ import logging
 from functools import reduce
 from typing import (
     Any,
+    Callable,
     Literal,
     Mapping,
     MutableMapping,
     Sequence,
     TypedDict,
     cast,
+    NamedTuple,
     Protocol,
 )
+import os
 import time
 from copy import copy
+from threading import Condition, Thread
 
 from .conf import Config
 
@@ -546,20 +550,59 @@ def dump_settings(
     return merge_dicts({"version": None, **cast(Mapping, conf.conf)}, out)
 
 
-def save_state_yaml(fn: str, set: HHDSettings, conf: Config, shash=None):
+def dump_yaml(data, **kwargs) -> str:
+    """Dumps `data` with the libyaml emitter, if available, which is an order
+    of magnitude faster than the python one."""
     import yaml
 
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+    return yaml.dump(data, Dumper=dumper, sort_keys=False, **kwargs)
+
+
+def dump_state_yaml(set: HHDSettings, conf: Config):
+    return (
+        dump_yaml(dump_settings(set, conf, "default"))
+        + "\n"
+        + dump_comment(set, STATE_HEADER)
+    )
+
+
+def dump_profile_yaml(set: HHDSettings, conf: Config):
+    return (
+        dump_yaml(dump_settings(set, conf, "unset"), width=85)
+        + "\n"
+        + dump_comment(set, PROFILE_HEADER)
+    )
+
+
+def write_atomic(fn: str, data: str, perms: Callable[[str], Any] | None = None):
+    """Writes `data` to a temporary file next to `fn` and renames it over `fn`,
+    so readers never see a partially written file."""
+    tmp = os.path.join(os.path.dirname(fn), f".{os.path.basename(fn)}.tmp")
+    try:
+        with open(tmp, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if perms:
+            perms(tmp)
+        os.replace(tmp, fn)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        raise
+
+
+def save_state_yaml(fn: str, set: HHDSettings, conf: Config, shash=None):
     if shash is None:
         shash = get_settings_hash(set)
     if conf.get("version", None) == shash and not conf.updated:
         return False
 
     conf["version"] = shash
-    with open(fn, "w") as f:
-        yaml.safe_dump(dump_settings(set, conf, "default"), f, sort_keys=False)
-        f.write("\n")
-        f.write(dump_comment(set, STATE_HEADER))
-
+    write_atomic(fn, dump_state_yaml(set, conf))
     return True
 
 
@@ -600,8 +643,6 @@ def load_blacklist_yaml(fn: str):
 def save_profile_yaml(
     fn: str, set: HHDSettings, conf: Config | None = None, shash=None
 ):
-    import yaml
-
     if shash is None:
         shash = get_settings_hash(set)
     if conf is None:
@@ -610,13 +651,179 @@ def save_profile_yaml(
         return False
 
     conf["version"] = shash
-    with open(fn, "w") as f:
-        yaml.safe_dump(dump_settings(set, conf, "unset"), f, width=85, sort_keys=False)
-        f.write("\n")
-        f.write(dump_comment(set, PROFILE_HEADER))
+    write_atomic(fn, dump_profile_yaml(set, conf))
     return True
 
 
+WRITE_DELAY = 1
+
+
+def get_file_key(fn: str):
+    """Returns what identifies the contents of `fn` on disk (inode, mtime and
+    size), or None if it does not exist."""
+    try:
+        st = os.stat(fn)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def get_file_keys(dirs: Sequence[str]) -> dict[str, tuple]:
+    """Returns the keys of the files in `dirs`, skipping hidden files (e.g.,
+    the temporary files of writes) and subdirectories."""
+    out = {}
+    for d in dirs:
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.name.startswith(".") or not e.is_file():
+                        continue
+                    st = e.stat()
+                    out[e.path] = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+    return out
+
+
+class ConfigWriter:
+    """Saves the state and profiles on a background thread, so the main loop
+    does not block on serializing them and writing them to disk.
+
+    Saving takes a snapshot of the config, which is cheap since configs are
+    persistent, and queues it. The first save of a file is written after
+    `delay`; saves before that replace the snapshot, so bursts of changes
+    (e.g., dragging a slider) result in a single write. Files are written
+    atomically and only if their contents changed since the last write.
+
+    The key of every written file is kept, so that changes to the config
+    files can be told apart from the writes of the writer (see `wrote()`)."""
+
+    def __init__(
+        self, perms: Callable[[str], Any] | None = None, delay: float = WRITE_DELAY
+    ) -> None:
+        self.perms = perms
+        self.delay = delay
+        self.cond = Condition()
+        # fn: (time to write, dump function, settings, snapshot)
+        self.pending: dict[str, tuple[float, Callable, HHDSettings, Config]] = {}
+        self.written: dict[str, int] = {}
+        self.keys: dict[str, tuple | None] = {}
+        self.busy = False
+        self.should_exit = False
+        self.t = None
+
+    def save_state(self, fn: str, set: HHDSettings, conf: Config, shash=None):
+        """Queues writing the state, same checks as `save_state_yaml()`.
+        Returns True if a write was queued."""
+        return self._save(fn, dump_state_yaml, set, conf, shash)
+
+    def save_profile(self, fn: str, set: HHDSettings, conf: Config, shash=None):
+        return self._save(fn, dump_profile_yaml, set, conf, shash)
+
+    def _save(
+        self, fn: str, dump: Callable, set: HHDSettings, conf: Config, shash=None
+    ):
+        if shash is None:
+            shash = get_settings_hash(set)
+        if conf.get("version", None) == shash and not conf.updated:
+            return False
+
+        conf["version"] = shash
+        snapshot = conf.copy()
+        with self.cond:
+            due = self.pending[fn][0] if fn in self.pending else None
+            if due is None:
+                due = time.monotonic() + self.delay
+            self.pending[fn] = (due, dump, set, snapshot)
+            if not self.t:
+                self.t = Thread(target=self._loop)
+                self.t.start()
+            self.cond.notify_all()
+        return True
+
+    def cancel(self, fn: str | None = None):
+        """Drops the pending write of `fn` (e.g., a deleted profile) or of all
+        files, and waits for the current write to finish."""
+        with self.cond:
+            while self.busy:
+                self.cond.wait()
+            if fn:
+                self.pending.pop(fn, None)
+                self.written.pop(fn, None)
+                self.keys.pop(fn, None)
+            else:
+                self.pending = {}
+                self.written = {}
+
+    def flush(self):
+        """Writes the pending files now and waits for them."""
+        with self.cond:
+            for fn, (_, *args) in self.pending.items():
+                self.pending[fn] = (0, *args)
+            self.cond.notify_all()
+            while self.pending or self.busy:
+                self.cond.wait()
+
+    def wait(self):
+        """Waits for the current write to finish."""
+        with self.cond:
+            while self.busy:
+                self.cond.wait()
+
+    def wrote(self, fn: str, key: tuple | None) -> bool:
+        """Returns True if `key` (see `get_file_key()`) is the key of `fn` after
+        its last write by the writer."""
+        with self.cond:
+            return key is not None and self.keys.get(fn, None) == key
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while True:
+                    if self.should_exit and not self.pending:
+                        return
+                    curr = time.monotonic()
+                    due = [fn for fn, v in self.pending.items() if v[0] <= curr]
+                    if due:
+                        break
+                    if self.pending:
+                        wait = min(v[0] for v in self.pending.values()) - curr
+                        self.cond.wait(wait)
+                    else:
+                        self.cond.wait()
+                writes = [(fn, self.pending.pop(fn)) for fn in due]
+                self.busy = True
+
+            for fn, (_, dump, set, conf) in writes:
+                try:
+                    data = dump(set, conf)
+                    if self.written.get(fn, None) == hash(data):
+                        continue
+                    write_atomic(fn, data, self.perms)
+                    self.written[fn] = hash(data)
+                    key = get_file_key(fn)
+                    with self.cond:
+                        self.keys[fn] = key
+                except Exception as e:
+                    logger.error(f"Could not save '{fn}' with error:\n{e}")
+
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+    def close(self):
+        """Writes the pending files and stops the writer thread."""
+        with self.cond:
+            self.should_exit = True
+            for fn, (_, *args) in self.pending.items():
+                self.pending[fn] = (0, *args)
+            self.cond.notify_all()
+        if self.t:
+            self.t.join()
+            self.t = None
+        self.should_exit = False
+
+
 def strip_defaults(c):
     if c == "default" or c == "unset":
         return None
@@ -777,75 +984,141 @@ def standard_validator(tags, config, value):
 
     return False
 
+class OptionTable(NamedTuple):
+    settings: HHDSettings
+    options: Mapping[str, Setting | Mode]
+    prefixes: Mapping[str, Sequence[str]]
+
+
+_option_table: OptionTable | None = None
+
+
+def get_option_table(settings: HHDSettings) -> tuple[OptionTable, bool]:
+    """Returns the unravelled options of `settings` along with an index from
+    every dotted prefix to the options under it. The table is cached until
+    a different settings object is passed in, in which case the second return
+    value is `True`."""
+    global _option_table
+
+    if _option_table is not None and _option_table.settings is settings:
+        return _option_table, False
+
+    options = unravel_options(settings)
+    prefixes = {}
+    for k in options:
+        subs = k.split(".")
+        for i in range(1, len(subs) + 1):
+            prefixes.setdefault(".".join(subs[:i]), []).append(k)
+
+    _option_table = OptionTable(settings, options, prefixes)
+    return _option_table, True
+
+
+def get_dirty_options(table: OptionTable, dirty: Sequence[str]):
+    keys = {}
+    for p in dirty:
+        for k in table.prefixes.get(p, ()):
+            keys[k] = None
+
+        # Writing within a value (e.g., a color channel) affects its option
+        subs = p.split(".")
+        for i in range(len(subs) - 1, 0, -1):
+            parent = ".".join(subs[:i])
+            if parent in table.options:
+                keys[parent] = None
+                break
+    return keys
+
+
 def validate_config(
     conf: Config, settings: HHDSettings, validator: Validator, use_defaults: bool = True
 ):
-    options = unravel_options(settings)
+    """Validates the options of `conf` that changed since the last call.
+    All options are validated for new configs and after settings change."""
+    table, rebuilt = get_option_table(settings)
+    dirty = conf.pop_dirty()
+
+    if dirty is None or rebuilt:
+        keys = table.options
+    elif dirty:
+        keys = get_dirty_options(table, dirty)
+    else:
+        return
 
-    for k, d in options.items():
-        v = conf.get(k, None)
-        if d["type"] == "action":
-            default = False
-        else:
-            default = d["default"]
-        if v is None:
-            if use_defaults and default is not None:
-                conf[k] = default
-            continue
+    for k in keys:
+        validate_option(conf, k, table.options[k], validator, use_defaults)
 
-        match d["type"]:
-            case "mode":
-                if v not in d["modes"]:
-                    if use_defaults:
-                        conf[k] = default
-                    else:
-                        del conf[k]
-            case "bool" | "action":
-                if v not in (False, True):
-                    conf[k] = bool(v)
-            case "multiple" | "discrete":
-                if v not in d["options"]:
-                    if use_defaults:
-                        conf[k] = default
-                    else:
-                        del conf[k]
-            case "int" | "integer":
-                if not isinstance(v, int):
-                    conf[k] = int(v)
-                if v < d["min"]:
-                    conf[k] = d["min"]
-                if v > d["max"]:
-                    conf[k] = d["max"]
-            case "float":
-                if not isinstance(v, float):
-                    conf[k] = float(v)
-                if v < d["min"]:
-                    conf[k] = d["min"]
-                if v > d["max"]:
-                    conf[k] = d["max"]
-            case "color":
-                invalid = False
-
-                if not isinstance(v, Mapping):
-                    invalid = True
+
+def validate_option(
+    conf: Config,
+    k: str,
+    d: Setting | Mode,
+    validator: Validator,
+    use_defaults: bool = True,
+):
+    v = conf.get(k, None)
+    if d["type"] == "action":
+        default = False
+    else:
+        default = d["default"]
+    if v is None:
+        if use_defaults and default is not None:
+            conf[k] = default
+        return
+
+    match d["type"]:
+        case "mode":
+            if v not in d["modes"]:
+                if use_defaults:
+                    conf[k] = default
                 else:
-                    for c in ("red", "green", "blue"):
-                        if c not in v:
-                            invalid = True
-                        elif not (0 <= v[c] < 256):
-                            invalid = True
-
-                if invalid:
-                    if use_defaults:
-                        conf[k] = default
-                    else:
-                        del conf[k]
-            case "custom":
-                if not (
-                    validator(d["tags"], d["config"], v)
-                    or standard_validator(d["tags"], d["config"], v)
-                ):
-                    if use_defaults:
-                        conf[k] = default
-                    else:
-                        del conf[k]
+                    del conf[k]
+        case "bool" | "action":
+            if v not in (False, True):
+                conf[k] = bool(v)
+        case "multiple" | "discrete":
+            if v not in d["options"]:
+                if use_defaults:
+                    conf[k] = default
+                else:
+                    del conf[k]
+        case "int" | "integer":
+            if not isinstance(v, int):
+                conf[k] = int(v)
+            if v < d["min"]:
+                conf[k] = d["min"]
+            if v > d["max"]:
+                conf[k] = d["max"]
+        case "float":
+            if not isinstance(v, float):
+                conf[k] = float(v)
+            if v < d["min"]:
+                conf[k] = d["min"]
+            if v > d["max"]:
+                conf[k] = d["max"]
+        case "color":
+            invalid = False
+
+            if not isinstance(v, Mapping):
+                invalid = True
+            else:
+                for c in ("red", "green", "blue"):
+                    if c not in v:
+                        invalid = True
+                    elif not (0 <= v[c] < 256):
+                        invalid = True
+
+            if invalid:
+                if use_defaults:
+                    conf[k] = default
+                else:
+                    del conf[k]
+        case "custom":
+            if not (
+                validator(d["tags"], d["config"], v)
+                or standard_validator(d["tags"], d["config"], v)
+            ):
+                if use_defaults:
+                    conf[k] = default
+                else:
+                    del conf[k]
@@ -1,6 +1,7 @@
 import logging
 import os
 
+from hhd.controller.lib.sysfs import get_cache
 from hhd.plugins.plugin import (
     Context,
     expanduser,
@@ -133,11 +134,8 @@ def get_ac_status_fn() -> str | None:
 def get_ac_status(fn: str | None) -> bool | None:
     if fn is None:
         return None
-    if not os.path.exists(fn):
-        return None
     try:
-        with open(fn) as f:
-            return f.read().strip() != "Discharging"
+        return get_cache().read(fn) != "Discharging"
     except Exception as e:
         return None
 
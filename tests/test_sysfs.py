@@ -0,0 +1,55 @@
+import pytest
+
+from hhd.controller.lib import sysfs
+from hhd.controller.lib.sysfs import SysfsCache
+
+ATTR = "/class/power_supply/BAT0/capacity"
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """Fake sysfs tree of regular files, with `tmp_path` standing in for `/sys`."""
+    fn = tmp_path / ATTR.lstrip("/")
+    fn.parent.mkdir(parents=True)
+    fn.write_text("100\n")
+    cache = SysfsCache(root=str(tmp_path))
+    yield fn, cache
+    cache.close()
+
+
+def test_pread_rereads(tree):
+    fn, cache = tree
+    assert cache.read(ATTR) == "100"
+    fd = cache.attr(ATTR).fd
+
+    fn.write_text("99\n")
+    assert cache.read(ATTR) == "99"
+    # Re-read through the same fd
+    assert cache.attr(ATTR).fd == fd
+
+
+def test_ttl_expiry(tree, monkeypatch):
+    fn, cache = tree
+    curr = 1000.0
+    monkeypatch.setattr(sysfs.time, "monotonic", lambda: curr)
+
+    assert cache.read(ATTR, ttl=5) == "100"
+    fn.write_text("99\n")
+    curr += 4
+    assert cache.read(ATTR) == "100"
+    curr += 2
+    assert cache.read(ATTR) == "99"
+
+
+def test_write_then_read(tree):
+    fn, cache = tree
+    cache.write(ATTR, 7)
+    assert fn.read_text() == "7"
+    assert cache.read(ATTR) == "7"
+
+
+def test_missing_default(tree):
+    _, cache = tree
+    assert cache.read("/class/missing", default="0") == "0"
+    with pytest.raises(OSError):
+        cache.read("/class/missing")